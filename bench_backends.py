@@ -0,0 +1,65 @@
+# Ops/s of each counter_backends store with several processes incrementing one counter at once,
+# and a check that no increment is lost. memory only runs in one process (that's its limit).
+#
+# Usage: python bench_backends.py [--processes 4] [--ops 2000]
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from counter_backends import open_backend
+
+def worker(kind, data_dir, shm_name, ops, start):
+    backend = open_backend(kind, data_dir, shm_name)
+    counter = backend.counter('bench')
+    start.wait()
+    for _ in range(ops):
+        counter.apply('success_inc')
+    backend.close()
+
+def run(kind, processes, ops, data_dir, shm_name):
+    if kind == 'memory':
+        processes = 1
+        counter = open_backend(kind).counter('bench')
+        begin = time.perf_counter()
+        for _ in range(ops):
+            counter.apply('success_inc')
+        return processes, time.perf_counter() - begin, counter.successes
+    start = multiprocessing.Event()
+    procs = [multiprocessing.Process(target=worker, args=(kind, data_dir, shm_name, ops, start)) for _ in range(processes)]
+    for proc in procs:
+        proc.start()
+    time.sleep(0.5)
+    begin = time.perf_counter()
+    start.set()
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - begin
+    backend = open_backend(kind, data_dir, shm_name)
+    successes = backend.read('bench')[1]['successes']
+    backend.close()
+    return processes, elapsed, successes
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark counter state backends')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--ops', type=int, default=2000, help='increments per process')
+    args = parser.parse_args()
+    data_dir = tempfile.mkdtemp(prefix='bench_backends_')
+    shm_name = f'bench_backends_{os.getpid()}'
+    try:
+        for kind in ('memory', 'sqlite', 'shm'):
+            processes, elapsed, successes = run(kind, args.processes, args.ops, data_dir, shm_name)
+            total = processes * args.ops
+            print(f'{kind:>7}: {processes} process(es) x {args.ops} ops in {elapsed:.2f}s, '
+                  f'{total / elapsed:9,.0f} ops/s, lost {total - successes}')
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+        backend = open_backend('shm', shm_name=shm_name)
+        backend.close()
+        backend.unlink()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# Compares N single /op requests against one /batch of N ops on a local server.
+# Usage: python bench_batch.py [N] [rounds]
+import http.client
+import json
+import statistics
+import sys
+import threading
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import obs_counter_server
+
+class QuietHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+def start_server():
+    server = make_server('127.0.0.1', 0, obs_counter_server.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def post(conn, path, body=None):
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    conn.request('POST', path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = conn.getresponse()
+    return json.loads(response.read())
+
+def run_singles(conn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        result = post(conn, '/op/success_inc')
+    return time.perf_counter() - start, result
+
+def run_batch(conn, n):
+    start = time.perf_counter()
+    result = post(conn, '/batch', ['success_inc'] * n)
+    return time.perf_counter() - start, result
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    server = start_server()
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_port)
+    try:
+        for name, run in (('single', run_singles), ('batch', run_batch)):
+            times = []
+            versions = 0
+            for _ in range(rounds):
+                before = obs_counter_server.COUNTER.version
+                elapsed, _ = run(conn, n)
+                times.append(elapsed)
+                versions += obs_counter_server.COUNTER.version - before
+            print(f'{name:>6}: {n} ops x {rounds} rounds, '
+                  f'median {statistics.median(times) * 1000:.2f} ms/round, '
+                  f'{n * rounds / sum(times):,.0f} ops/s, '
+                  f'{versions / rounds:.0f} published versions/round')
+    finally:
+        conn.close()
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Floods counter_chat with fake_twitch_irc chat (mostly chatter, a few percent commands) and reports
+# whether it keeps up, how many counter versions the commands became, and how late a 60 Hz frame
+# timer in the same process (standing in for the Tk overlay) runs meanwhile.
+# Usage: python bench_chat.py [messages per second] [seconds]
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from bench_serving import free_port
+from counter_chat import ChatClient, CounterTarget
+from counter_core import Counter
+
+FRAME_SECONDS = 1 / 60
+FAKE_IRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_twitch_irc.py')
+
+def frame_timer(lateness, stop):
+    next_frame = time.perf_counter() + FRAME_SECONDS
+    while not stop.is_set():
+        time.sleep(max(0, next_frame - time.perf_counter()))
+        now = time.perf_counter()
+        lateness.append(now - next_frame)
+        next_frame = max(next_frame + FRAME_SECONDS, now)
+
+async def read_chat(port, counter):
+    client = ChatClient('test', CounterTarget(counter), server=f'127.0.0.1:{port}', tls=False, verbose=False)
+    for _ in range(50):
+        try:
+            start, cpu = time.perf_counter(), time.process_time()
+            await client.session()
+            return client, time.perf_counter() - start, time.process_time() - cpu
+        except ConnectionRefusedError:
+            await asyncio.sleep(0.1)
+    raise SystemExit('fake_twitch_irc.py did not start')
+
+def main():
+    rate = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    port = free_port()
+    irc = subprocess.Popen([sys.executable, FAKE_IRC, '--port', str(port), '--flood', str(rate),
+                            '--duration', str(seconds)], stdout=subprocess.DEVNULL)
+    counter = Counter()
+    lateness = []
+    stop = threading.Event()
+    timer = threading.Thread(target=frame_timer, args=(lateness, stop))
+    timer.start()
+    try:
+        client, elapsed, cpu = asyncio.run(read_chat(port, counter))
+    finally:
+        stop.set()
+        timer.join()
+        irc.wait()
+    lateness.sort()
+    counts = client.commands.counts
+    print(f'messages: {client.messages} read in {elapsed:.2f} s (sent at {rate:,}/s for {seconds:g} s), '
+          f'{cpu / client.messages * 1e6:.1f} us CPU each')
+    print(f'commands: {counts["accepted"]} accepted, {counts["denied"]} denied, '
+          f'{counts["duplicate"]} duplicate, {counts["limited"]} rate limited')
+    print(f'counter: {counter.successes}/{counter.attempts} after {counter.version} versions ({client.flushes} batches)')
+    print(f'60 Hz timer lateness: median {statistics.median(lateness) * 1000:.2f} ms, '
+          f'p99 {lateness[int(len(lateness) * 0.99)] * 1000:.2f} ms, max {lateness[-1] * 1000:.2f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Named counters in one obs_counter_server process:
+#   memory   bytes allocated per extra counter (tracemalloc), state included
+#   isolation one SSE display per counter on the asyncio server while one counter takes
+#             --ops increments; every other display should see nothing but its first frame
+#
+# Usage: python bench_counters.py [--counters 300] [--ops 2000]
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+import obs_counter_server
+from bench_serving import free_port, read_response
+
+def measure_memory(n):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(n):
+        hosted = obs_counter_server.get_counter(f'mem{i}')
+        with hosted.changed:
+            hosted.state_payload()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    for i in range(n):
+        del obs_counter_server.COUNTERS[f'mem{i}']
+    return used / n
+
+async def display(port, name, frames, opened):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET /c/{name}/events HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+    await reader.readuntil(b'\r\n\r\n')
+    opened.append(name)
+    try:
+        while True:
+            frame = await reader.readuntil(b'\n\n')
+            if frame.startswith(b'id: '):
+                frames[name] = frames.get(name, 0) + 1
+    except asyncio.CancelledError:
+        pass
+    finally:
+        writer.close()
+
+async def run_isolation(port, n, ops):
+    frames, opened = {}, []
+    names = [f'c{i}' for i in range(n)]
+    tasks = [asyncio.create_task(display(port, name, frames, opened)) for name in names]
+    while len(opened) < n:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.2)
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    start = time.perf_counter()
+    for _ in range(ops):
+        writer.write(b'POST /c/c0/op/success_inc HTTP/1.1\r\nHost: localhost\r\nContent-Length: 0\r\n\r\n')
+        await read_response(reader)
+    elapsed = time.perf_counter() - start
+    writer.close()
+    await asyncio.sleep(0.2)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks)
+    others = sum(count - 1 for name, count in frames.items() if name != 'c0')
+    return elapsed, frames.get('c0', 0) - 1, others
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark many named counters in one process')
+    parser.add_argument('--counters', type=int, default=300)
+    parser.add_argument('--ops', type=int, default=2000)
+    args = parser.parse_args()
+    print(f'memory: {measure_memory(args.counters):,.0f} bytes per counter')
+    port = free_port()
+    obs_counter_server.serve_in_background('127.0.0.1', port)
+    time.sleep(0.5)
+    elapsed, busy_frames, other_frames = asyncio.run(run_isolation(port, args.counters, args.ops))
+    print(f'isolation: {args.ops} ops on one of {args.counters} counters in {elapsed:.2f}s '
+          f'({args.ops / elapsed:,.0f} ops/s); busy display got {busy_frames} frames, '
+          f'the other {args.counters - 1} got {other_frames}')
+
+if __name__ == '__main__':
+    main()
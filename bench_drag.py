@@ -0,0 +1,88 @@
+# Drags the overlay with synthetic <B1-Motion> events at a high-polling-rate mouse's pace and
+# compares the old do_move (pointer query and window move on every event) with the coalesced one
+# (latest event position, applied at most once per frame).
+# Needs a display; on a headless machine run it under Xvfb:
+#   xvfb-run python bench_drag.py [events per second] [seconds]
+import os
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+import floating_counter_tkinter
+from floating_counter_tkinter import FloatingCounter
+
+# Events are injected in slices this many ms apart, like a mouse's reports reaching Tk
+INJECT_INTERVAL_MS = 2
+
+def legacy_do_move(app, event):
+    # do_move before coalescing
+    x = app.root.winfo_pointerx() - 20
+    y = app.root.winfo_pointery() - 20
+    app.root.geometry(f'+{x}+{y}')
+
+def drag(app, handler, rate, seconds):
+    # Returns (handler seconds, window moves, seconds from the last event until the window got there)
+    root = app.root
+    moves = []
+    geometry = root.geometry
+
+    def counted_geometry(spec=None):
+        if spec is not None:
+            moves.append(time.perf_counter())
+        return geometry(spec)
+    root.geometry = counted_geometry
+    handling = [0.0]
+
+    def timed_handler(event):
+        start = time.perf_counter()
+        handler(event)
+        handling[0] += time.perf_counter() - start
+    app.label.bind('<B1-Motion>', timed_handler)
+    x0, y0 = root.winfo_x(), root.winfo_y()
+    app.label.event_generate('<ButtonPress-1>', x=20, y=20, rootx=x0 + 20, rooty=y0 + 20)
+    total = int(rate * seconds)
+    sent = 0
+    last_sent = [None]
+    start = time.perf_counter()
+
+    def inject():
+        nonlocal sent
+        due = min(total, int((time.perf_counter() - start) * rate) + 1)
+        while sent < due:
+            # A slow diagonal sweep, one pixel per event
+            offset = sent % 400
+            app.label.event_generate('<B1-Motion>', x=20, y=20, rootx=x0 + 20 + offset, rooty=y0 + 20 + offset, when='tail')
+            sent += 1
+        if sent < total:
+            root.after(INJECT_INTERVAL_MS, inject)
+        else:
+            last_sent[0] = time.perf_counter()
+            root.after(100, root.quit)
+    root.after(0, inject)
+    root.mainloop()
+    del root.geometry
+    lag = moves[-1] - last_sent[0] if moves and moves[-1] > last_sent[0] else 0.0
+    return handling[0], len(moves), lag
+
+def main():
+    rate = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+    # Don't overwrite the position saved by real use
+    floating_counter_tkinter.POSITION_PATH = os.path.join(tempfile.mkdtemp(), 'position.json')
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f'No display available ({e}); run under xvfb-run')
+    app = FloatingCounter(root, 'Mounts Dropped:', 'Arial', 48, '#FF0000', True, '+', '|', '_', False, True)
+    root.update()
+    for name, handler in (('per event (before)', lambda event: legacy_do_move(app, event)),
+                          ('coalesced', app.do_move)):
+        handling, moves, lag = drag(app, handler, rate, seconds)
+        events = int(rate * seconds)
+        print(f'{name:>18}: {events} events in {seconds:g}s, {handling / events * 1e6:.1f} us handling each, '
+              f'{moves} window moves ({moves / seconds:.0f}/s), window {lag * 1000:.1f} ms behind the last event')
+    root.destroy()
+
+if __name__ == '__main__':
+    main()
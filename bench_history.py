@@ -0,0 +1,48 @@
+# Append rate and GET /history query cost of counter_history.HistoryRing at marathon scale:
+# fills a ring with --records ops, then times bucketed queries over the whole log and reports
+# the peak Python memory each query allocated (tracemalloc, measured in a second, untimed run).
+#
+# Usage: python bench_history.py [--records 2000000] [--file]
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from counter_history import HistoryRing
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the counter history ring')
+    parser.add_argument('--records', type=int, default=2_000_000)
+    parser.add_argument('--file', action='store_true', help='file-backed ring instead of anonymous memory')
+    parser.add_argument('--shared', action='store_true', help='with --file: take the lock file workers share on every append')
+    args = parser.parse_args()
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_history_'), 'bench.ring') if args.file else None
+    ring = HistoryRing(path, args.records, args.shared)
+    start = time.perf_counter()
+    for i in range(args.records):
+        ring.append(1, 1) if i % 3 else ring.append(0, 1)
+    elapsed = time.perf_counter() - start
+    print(f'append: {args.records:,} records in {elapsed:.2f}s ({args.records / elapsed:,.0f}/s)')
+    first, last = ring.bounds()
+    for buckets in (1, 60, 1000, 10000):
+        bucket = max(1, -(-(last - first) // buckets))
+        start = time.perf_counter()
+        result = ring.query(first, last, bucket)
+        elapsed = time.perf_counter() - start
+        # Separate run for memory: tracemalloc itself slows every allocation down
+        tracemalloc.start()
+        ring.query(first, last, bucket)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        attempts = sum(a for _, _, a in result)
+        print(f'query: {len(result):>5} buckets in {elapsed * 1000:8.2f} ms, peak {peak / 1024:7.1f} KiB, '
+              f'{attempts:,} attempts counted')
+    ring.close()
+    if path:
+        os.remove(path)
+        os.remove(path + '.lock')
+        os.rmdir(os.path.dirname(path))
+
+if __name__ == '__main__':
+    main()
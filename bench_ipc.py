@@ -0,0 +1,51 @@
+# Compares one op over HTTP (POST /op, keep-alive) with one op over the control socket (counter_ipc),
+# both answered by the same in-process asyncio server, plus pipelined socket ops.
+# Usage: python bench_ipc.py [ops]
+import http.client
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import obs_counter_server
+from bench_serving import free_port
+from counterctl import CounterClient
+
+def timed(send, n):
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        send()
+        times.append(time.perf_counter() - start)
+    return times
+
+def report(name, times):
+    times = sorted(times)
+    print(f'{name:>10}: median {statistics.median(times) * 1e6:7.1f} us, '
+          f'p99 {times[int(len(times) * 0.99)] * 1e6:7.1f} us, {len(times) / sum(times):,.0f} ops/s')
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    port = free_port()
+    obs_counter_server.serve_in_background(port=port)
+    address = os.path.join(tempfile.mkdtemp(), 'bench.sock')
+    obs_counter_server.serve_control(address)
+    time.sleep(0.5)
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+
+    def http_op():
+        conn.request('POST', '/op/success_inc')
+        conn.getresponse().read()
+
+    with CounterClient(address) as client:
+        report('http', timed(http_op, n))
+        report('socket', timed(lambda: client.command('success+'), n))
+        start = time.perf_counter()
+        client.send(*['success+'] * n)
+        elapsed = time.perf_counter() - start
+        print(f'{"pipelined":>10}: {elapsed / n * 1e6:7.1f} us/op, {n / elapsed:,.0f} ops/s')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
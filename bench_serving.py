@@ -0,0 +1,133 @@
+# Requests/s and latency of GET /state for each serving mode of obs_counter_server.
+# Each mode runs in its own subprocess on a free local port; the client is a single asyncio
+# process with --clients keep-alive connections hammering /state for --duration seconds while
+# --idle SSE streams sit open, which is what a scene full of overlays looks like.
+#
+# Usage: python bench_serving.py [--modes dev-debug dev async] [--clients 32] [--idle 200] [--duration 5]
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+MODES = {
+    # What `python obs_counter_server.py` used to run: Werkzeug with the debugger and reloader
+    'dev-debug': ['--serve', 'dev', '--debug'],
+    'dev': ['--serve', 'dev'],
+    'async': ['--serve', 'async'],
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(mode, port):
+    cmd = [sys.executable, 'obs_counter_server.py', '--in-memory', '--port', str(port)] + MODES[mode]
+    proc = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    stop_server(proc)
+    raise RuntimeError(f'{mode} server did not start')
+
+def stop_server(proc):
+    # The debug reloader forks a child, so take down the whole session
+    os.killpg(proc.pid, signal.SIGTERM)
+    proc.wait()
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    length, close = 0, head.startswith(b'HTTP/1.0')
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'connection':
+            close = value.strip().lower() == b'close'
+    await reader.readexactly(length)
+    return close
+
+async def poller(port, stop_at, latencies, errors):
+    request = b'GET /state HTTP/1.1\r\nHost: localhost\r\n\r\n'
+    conn = None
+    while time.perf_counter() < stop_at:
+        try:
+            if conn is None:
+                conn = await asyncio.open_connection('127.0.0.1', port)
+            reader, writer = conn
+            start = time.perf_counter()
+            writer.write(request)
+            close = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if close:
+                writer.close()
+                conn = None
+        except (OSError, asyncio.IncompleteReadError):
+            errors.append(1)
+            conn = None
+    if conn:
+        conn[1].close()
+
+async def idle_stream(port, opened):
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        await reader.readuntil(b'\r\n\r\n')
+        opened.append(1)
+        while await reader.read(4096):
+            pass
+    except (OSError, asyncio.IncompleteReadError, asyncio.CancelledError):
+        pass
+
+async def run_load(port, clients, idle, duration):
+    opened = []
+    streams = [asyncio.create_task(idle_stream(port, opened)) for _ in range(idle)]
+    await asyncio.sleep(min(2, 0.5 + idle / 500))
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(poller(port, start + duration, latencies, errors) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    for task in streams:
+        task.cancel()
+    await asyncio.gather(*streams, return_exceptions=True)
+    return latencies, len(errors), len(opened), elapsed
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark obs_counter_server serving modes')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--idle', type=int, default=200, help='idle /events streams held open during the run')
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+    print(f'{args.clients} polling clients, {args.idle} idle SSE streams, {args.duration:g}s per mode')
+    for mode in args.modes:
+        port = free_port()
+        proc = start_server(mode, port)
+        try:
+            latencies, errors, opened, elapsed = asyncio.run(run_load(port, args.clients, args.idle, args.duration))
+        finally:
+            stop_server(proc)
+        latencies.sort()
+        print(f'{mode:>10}: {len(latencies) / elapsed:8,.0f} req/s  '
+              f'p50 {statistics.median(latencies) * 1000 if latencies else float("nan"):6.2f} ms  '
+              f'p99 {percentile(latencies, 99) * 1000:6.2f} ms  '
+              f'errors {errors}  streams open {opened}/{args.idle}')
+
+if __name__ == '__main__':
+    main()
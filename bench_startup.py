@@ -0,0 +1,88 @@
+# Cold-start timings for floating_counter_tkinter, each run in a fresh interpreter:
+#   import            time to import the module
+#   direct            FloatingCounter built straight away, hotkeys off
+#   direct+hotkeys    same with global hotkeys on (pays for the pynput import)
+#   setup             setup window's first frame, then Run -> counter's first frame
+# "First frame" is when Tk has mapped and drawn the counter label.
+# Needs a display; on a headless machine run it under Xvfb:
+#   xvfb-run python bench_startup.py [runs]
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CHILD = r'''
+import json, sys, time
+start = time.perf_counter()
+import tkinter as tk
+import floating_counter_tkinter as fc
+timings = {'import': time.perf_counter() - start}
+path = sys.argv[1]
+
+def first_frame(root, widget):
+    root.update()
+    while not widget.winfo_ismapped():
+        root.update()
+    return time.perf_counter() - start
+
+def counter(root, hotkeys):
+    return fc.FloatingCounter(root, 'Mounts Dropped:', 'Arial', 48, '#FF0000', True, '+', '|', '_', hotkeys, True)
+
+if path == 'import':
+    pass
+elif path in ('direct', 'direct+hotkeys'):
+    root = tk.Tk()
+    app = counter(root, path == 'direct+hotkeys')
+    timings['first_frame'] = first_frame(root, app.label)
+    app.stop_hotkeys()
+    root.destroy()
+else:
+    # Drive launch_setup() as a user would: wait for the setup window, press Run, wait for the counter
+    created = []
+    real_init = fc.FloatingCounter.__init__
+    def init(self, *args, **kwargs):
+        real_init(self, *args, **kwargs)
+        created.append(self)
+    fc.FloatingCounter.__init__ = init
+    def mainloop(root, n=0):
+        if not created:
+            timings['setup_frame'] = first_frame(root, root.winfo_children()[0])
+            run = next(w for w in root.winfo_children() if isinstance(w, tk.Button) and w.cget('text') == 'Run')
+            run.invoke()
+        else:
+            app = created[0]
+            timings['first_frame'] = first_frame(root, app.label)
+            app.stop_hotkeys()
+            root.destroy()
+    tk.Tk.mainloop = mainloop
+    fc.launch_setup()
+print(json.dumps(timings))
+'''
+
+PATHS = ('import', 'direct', 'direct+hotkeys', 'setup')
+
+def run_child(path):
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', CHILD, path], cwd=os.path.dirname(os.path.abspath(__file__)),
+                         capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if out.returncode != 0:
+        sys.exit(f'{path} run failed:\n{out.stderr}')
+    timings = json.loads(out.stdout.strip().splitlines()[-1])
+    timings['process'] = wall
+    return timings
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        sys.exit('No display available; run under xvfb-run')
+    print(f'median of {runs} fresh processes (ms)')
+    for path in PATHS:
+        results = [run_child(path) for _ in range(runs)]
+        columns = {key: statistics.median(r[key] for r in results) * 1000 for key in results[0]}
+        print(f'{path:>15}: ' + '  '.join(f'{key} {value:7.1f}' for key, value in columns.items()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# Times 10k counter increments through FloatingCounter.update_label, against the old
+# behaviour of reconfiguring the label and rebuilding every button on each change.
+# Needs a display; on a headless machine run it under Xvfb:
+#   xvfb-run python bench_update_label.py [increments]
+import sys
+import time
+import tkinter as tk
+
+from floating_counter_tkinter import FloatingCounter
+
+def legacy_update_label(app):
+    # update_label before dirty tracking
+    app.label.config(text=app.get_display_text(), font=(app.font_family, app.font_size), fg=app.font_color)
+    app.create_buttons()
+
+def run(app, n, update):
+    app.successes = app.attempts = 0
+    app.root.update()
+    start = time.perf_counter()
+    for _ in range(n):
+        app.successes += 1
+        app.attempts += 1
+        update(app)
+        # Let Tk redraw, as the mainloop would between hotkey presses
+        app.root.update_idletasks()
+    return time.perf_counter() - start
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f'No display available ({e}); run under xvfb-run')
+    app = FloatingCounter(root, 'Mounts Dropped:', 'Arial', 48, '#FF0000', True, '+', '|', '_', False, True)
+    results = {}
+    for name, update in (('rebuild (before)', legacy_update_label), ('dirty tracking', FloatingCounter.update_label)):
+        results[name] = run(app, n, update)
+        print(f'{name:>16}: {n} increments in {results[name]:.3f}s, {results[name] / n * 1e6:.1f} us each')
+    before, after = results.values()
+    print(f'speedup: {before / after:.1f}x')
+    root.destroy()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+# Where the OBS counter server keeps counter state, chosen at startup (obs_counter_server --backend):
+#   memory  plain counter_core.Counter objects in this process (the default; one worker only)
+#   sqlite  one row per counter in an SQLite database in WAL mode
+#   shm     fixed-size slots in a multiprocessing.shared_memory segment
+# With sqlite or shm every worker process sees one count: each change is a read-modify-write
+# inside the store's cross-process transaction, and each worker polls the store's change token
+# to pull in changes made by the others (see obs_counter_server.sync_from_backend).
+import contextlib
+import json
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from multiprocessing import shared_memory
+
+from counter_core import Counter
+
+BACKENDS = ('memory', 'sqlite', 'shm')
+
+if os.name == 'nt':
+    import msvcrt
+
+    def lock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class StoredCounter(Counter):
+    # Counter whose state of record lives in a shared store; the attributes are this process's copy
+    __slots__ = ('store', 'name')
+
+    def __init__(self, store, name):
+        super().__init__()
+        self.store = store
+        self.name = name
+        version, state = store.read(name)
+        if state is not None:
+            self.load_state(state, version)
+
+    def _change(self, mutate, record):
+        with self.lock:
+            with self.store.transaction():
+                # Start from the stored state, which may include other workers' changes
+                version, state = self.store.load(self.name)
+                if state is not None:
+                    self.load_state(state, version)
+                before = self.to_dict()
+                mutate(self)
+                delta = (self.successes - before['successes'], self.attempts - before['attempts'])
+                try:
+                    self.store.save(self.name, version + 1, self.to_dict())
+                except Exception:
+                    self.load_state(before, version)
+                    raise
+                self.version = version + 1
+                self.delta = delta
+            self._notify(record)
+            return self.version
+
+    def refresh(self):
+        # Pulls in changes other processes made; subscribers see them as one {'sync': version} change
+        version, state = self.store.read(self.name)
+        with self.lock:
+            if state is None or version <= self.version:
+                return False
+            successes, attempts = self.successes, self.attempts
+            self.load_state(state, version)
+            self.delta = (self.successes - successes, self.attempts - attempts)
+            self._notify({'sync': version})
+            return True
+
+class MemoryBackend:
+    shared = False
+
+    def counter(self, name):
+        return Counter()
+
+    def names(self):
+        return []
+
+    def change_token(self):
+        return None
+
+    def close(self):
+        pass
+
+class SQLiteBackend:
+    shared = True
+
+    def __init__(self, path, synchronous='NORMAL'):
+        # synchronous=NORMAL in WAL mode survives a process crash; FULL also survives power loss
+        self.path = path
+        self.synchronous = synchronous
+        self._local = threading.local()
+        self.connection()
+
+    def connection(self):
+        # sqlite3 connections can't be shared between threads, so each thread gets its own
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters '
+                         '(name TEXT PRIMARY KEY, version INTEGER NOT NULL, state TEXT NOT NULL)')
+            self._local.conn = conn
+        return conn
+
+    def counter(self, name):
+        return StoredCounter(self, name)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent read-modify-writes from
+        # other workers wait their turn (up to the connect timeout) instead of failing on commit
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def load(self, name):
+        # Returns (version, state), or (0, None) for a counter that was never saved
+        row = self.connection().execute('SELECT version, state FROM counters WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return 0, None
+        return row[0], json.loads(row[1])
+
+    # WAL readers never block on the writer, so reads need no transaction
+    read = load
+
+    def save(self, name, version, state):
+        self.connection().execute('INSERT OR REPLACE INTO counters (name, version, state) VALUES (?, ?, ?)',
+                                  (name, version, json.dumps(state)))
+
+    def names(self):
+        return [row[0] for row in self.connection().execute('SELECT name FROM counters')]
+
+    def change_token(self):
+        # Moves whenever another connection commits
+        return self.connection().execute('PRAGMA data_version').fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+class SharedMemoryBackend:
+    # Segment layout: a 64-byte header (magic, change generation, slot count), then one 512-byte
+    # slot per counter: seqlock sequence, version, successes, attempts, settings length, name and
+    # the display settings as JSON. Writers serialize on a lock file; readers never block, they
+    # retry while a slot's sequence is odd (mid-write) or moved during the read.
+    shared = True
+    MAGIC = b'OBSCNT1\0'
+    HEADER = struct.Struct('<8sQI')
+    GENERATION = struct.Struct('<Q')
+    GENERATION_OFFSET = 8
+    HEADER_SIZE = 64
+    SETTINGS_SIZE = 414
+    SLOT = struct.Struct(f'<QqqqH64s{SETTINGS_SIZE}s')
+    SEQUENCE = struct.Struct('<Q')
+    NAME_OFFSET = 34
+
+    def __init__(self, name='obs_counter', slots=1024):
+        self._thread_lock = threading.Lock()
+        self._lock_path = os.path.join(tempfile.gettempdir(), f'{name}.lock')
+        self._lock_file = open(self._lock_path, 'a+b')
+        self._index = {}
+        with self.transaction():
+            try:
+                self.shm = shared_memory.SharedMemory(name, create=True, size=self.HEADER_SIZE + slots * self.SLOT.size)
+                self.HEADER.pack_into(self.shm.buf, 0, self.MAGIC, 0, slots)
+            except FileExistsError:
+                self.shm = shared_memory.SharedMemory(name)
+            magic, _, self.slots = self.HEADER.unpack_from(self.shm.buf, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f'shared memory segment {name!r} is not an OBS counter store')
+        if os.name != 'nt':
+            # The segment outlives any one worker, so don't let this process's resource tracker unlink it at exit
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+
+    def counter(self, name):
+        return StoredCounter(self, name)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # flock only excludes other processes, so threads of this one also take a plain lock
+        with self._thread_lock:
+            lock_file(self._lock_file)
+            try:
+                yield
+            finally:
+                unlock_file(self._lock_file)
+
+    def _offset(self, index):
+        return self.HEADER_SIZE + index * self.SLOT.size
+
+    def _slot_name(self, index):
+        start = self._offset(index) + self.NAME_OFFSET
+        return bytes(self.shm.buf[start:start + 64]).rstrip(b'\0').decode('utf-8')
+
+    def _find(self, name):
+        # Slots are handed out in order and never freed, so the first empty one ends the search
+        index = self._index.get(name)
+        if index is not None:
+            return index
+        for index in range(self.slots):
+            slot_name = self._slot_name(index)
+            if not slot_name:
+                return None
+            if slot_name == name:
+                self._index[name] = index
+                return index
+        return None
+
+    def read(self, name):
+        # Returns (version, state), or (0, None) for a counter that was never saved
+        index = self._find(name)
+        if index is None:
+            return 0, None
+        buf, offset = self.shm.buf, self._offset(index)
+        while True:
+            sequence, version, successes, attempts, length, _, settings = self.SLOT.unpack_from(buf, offset)
+            if sequence % 2 == 0 and self.SEQUENCE.unpack_from(buf, offset)[0] == sequence:
+                break
+            time.sleep(0)
+        state = json.loads(settings[:length])
+        state['successes'] = successes
+        state['attempts'] = attempts
+        return version, state
+
+    load = read
+
+    def save(self, name, version, state):
+        # Call inside transaction()
+        settings = {key: value for key, value in state.items() if key not in ('successes', 'attempts')}
+        encoded = json.dumps(settings, separators=(',', ':')).encode('utf-8')
+        if len(encoded) > self.SETTINGS_SIZE:
+            raise ValueError('counter settings are too long for the shared memory store')
+        try:
+            successes, attempts = int(state['successes']), int(state['attempts'])
+        except (TypeError, ValueError):
+            raise ValueError('successes and attempts must be integers')
+        index = self._find(name)
+        if index is None:
+            index = self._find_free()
+        buf, offset = self.shm.buf, self._offset(index)
+        sequence = self.SEQUENCE.unpack_from(buf, offset)[0]
+        # Odd while the slot is being written, so readers retry instead of seeing half an update
+        self.SEQUENCE.pack_into(buf, offset, sequence + 1)
+        self.SLOT.pack_into(buf, offset, sequence + 1, version, successes, attempts, len(encoded),
+                            name.encode('utf-8'), encoded)
+        self.SEQUENCE.pack_into(buf, offset, sequence + 2)
+        generation = self.GENERATION.unpack_from(buf, self.GENERATION_OFFSET)[0]
+        self.GENERATION.pack_into(buf, self.GENERATION_OFFSET, generation + 1)
+        self._index[name] = index
+
+    def _find_free(self):
+        for index in range(self.slots):
+            if not self._slot_name(index):
+                return index
+        raise ValueError(f'shared memory store is full ({self.slots} counters)')
+
+    def names(self):
+        names = []
+        for index in range(self.slots):
+            name = self._slot_name(index)
+            if not name:
+                break
+            names.append(name)
+        return names
+
+    def change_token(self):
+        # Bumped by every save, from any process
+        return self.GENERATION.unpack_from(self.shm.buf, self.GENERATION_OFFSET)[0]
+
+    def close(self):
+        self.shm.close()
+        self._lock_file.close()
+
+    def unlink(self):
+        # Deletes the segment and its lock file for good (benchmarks, tests); may follow close()
+        if os.name != 'nt':
+            # __init__ took it off the resource tracker, which would complain when unlink() takes it off again
+            from multiprocessing import resource_tracker
+            resource_tracker.register(self.shm._name, 'shared_memory')
+        self.shm.unlink()
+        try:
+            os.remove(self._lock_path)
+        except FileNotFoundError:
+            pass
+
+def open_backend(kind, data_dir='counter_data', shm_name='obs_counter', fsync='interval', max_counters=1024):
+    if kind == 'memory':
+        return MemoryBackend()
+    if kind == 'sqlite':
+        os.makedirs(data_dir, exist_ok=True)
+        return SQLiteBackend(os.path.join(data_dir, 'counters.db'), 'FULL' if fsync == 'always' else 'NORMAL')
+    if kind == 'shm':
+        return SharedMemoryBackend(shm_name, max_counters)
+    raise ValueError(f'backend must be one of {", ".join(BACKENDS)}')
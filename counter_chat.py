@@ -0,0 +1,390 @@
+# Twitch chat commands for the counter: reads a channel's chat over IRC (asyncio) and turns
+# !drop, !attempt and !undo from permitted users into counter ops, sent to the OBS server or the
+# Tk overlay through their control socket (counter_ipc), or applied to a Counter in this process.
+#
+# Chat is untrusted and can be fast, so every message goes through, in order:
+#   - a cheap check that it is a command at all (ordinary chat is skipped without parsing its tags)
+#   - message id dedupe (Twitch can repeat a message across reconnects)
+#   - the command's minimum role (everyone < subscriber < vip < moderator < broadcaster)
+#   - per-user dedupe: the same command from the same user within DEDUPE_SECONDS counts once
+#   - a per-user token bucket (RATE commands per second, bursts of BURST); the broadcaster is exempt
+# Accepted ops are coalesced: the first one starts a FLUSH_DELAY timer and everything accepted until
+# it fires is sent as one batch, so a chat flood becomes a few counter versions (and repaints) per second.
+#
+# Usage:
+#   python counter_chat.py --channel mychannel                 # the OBS server's default counter
+#   python counter_chat.py --channel mychannel --tk            # the Tk overlay
+#   python counter_chat.py --channel mychannel --permission '!attempt=vip' --rate 1 --burst 5
+#   python counter_chat.py --channel test --server 127.0.0.1:6667 --no-tls   # fake_twitch_irc.py
+# Reading chat needs no account; set TWITCH_OAUTH_TOKEN (and --nick) to log in as a user instead.
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import sys
+import time
+from collections import OrderedDict, deque
+
+from counter_ipc import SERVER_ADDRESS, TK_ADDRESS, execute, open_connection
+
+TWITCH_IRC = 'irc.chat.twitch.tv:6697'
+# Chat command -> op; 'undo' takes back the newest command applied from chat
+COMMANDS = {'!drop': 'success_inc', '!attempt': 'attempt_inc', '!undo': 'undo'}
+INVERSE_OPS = {'success_inc': 'success_and_attempt_dec', 'attempt_inc': 'attempt_dec'}
+# Without attempts, success_inc only added a success
+INVERSE_OPS_WITHOUT_ATTEMPTS = dict(INVERSE_OPS, success_inc='success_dec')
+ROLES = ('everyone', 'subscriber', 'vip', 'moderator', 'broadcaster')
+DEFAULT_PERMISSIONS = {'!drop': 'moderator', '!attempt': 'moderator', '!undo': 'moderator'}
+# Per-user token bucket: commands per second, and how many may come at once
+RATE = 0.5
+BURST = 3
+DEDUPE_SECONDS = 2.0
+# Seconds from the first op of a burst until the burst is applied
+FLUSH_DELAY = 0.05
+# Bounds on per-user and per-message state, so a flood of new names or ids can't grow it
+MAX_TRACKED_USERS = 10000
+SEEN_MESSAGE_IDS = 4096
+UNDO_DEPTH = 100
+RECONNECT_DELAYS = (1, 2, 4, 8, 16, 30)
+READ_SIZE = 64 * 1024
+# Anonymous read-only login
+ANONYMOUS_NICK = 'justinfan31337'
+
+TAG_ESCAPES = {':': ';', 's': ' ', '\\': '\\', 'r': '\r', 'n': '\n'}
+
+def unescape_tag(value):
+    if '\\' not in value:
+        return value
+    out = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            char = TAG_ESCAPES.get(next(chars, ''), '')
+        out.append(char)
+    return ''.join(out)
+
+def parse_tags(raw):
+    tags = {}
+    for item in raw.split(';'):
+        name, _, value = item.partition('=')
+        tags[name] = unescape_tag(value)
+    return tags
+
+def split_line(line):
+    # IRC line -> (raw tags, prefix, command, params, trailing parameter)
+    tags = prefix = ''
+    if line.startswith('@'):
+        tags, _, line = line[1:].partition(' ')
+    if line.startswith(':'):
+        prefix, _, line = line[1:].partition(' ')
+    line, _, trailing = line.partition(' :')
+    params = line.split()
+    return tags, prefix, params[0] if params else '', params[1:], trailing
+
+def role_of(tags):
+    badges = {badge.partition('/')[0] for badge in tags.get('badges', '').split(',')}
+    if 'broadcaster' in badges:
+        return 'broadcaster'
+    if 'moderator' in badges or tags.get('mod') == '1':
+        return 'moderator'
+    if 'vip' in badges or tags.get('vip') == '1':
+        return 'vip'
+    if 'subscriber' in badges or 'founder' in badges or tags.get('subscriber') == '1':
+        return 'subscriber'
+    return 'everyone'
+
+def batch_words(ops):
+    # ['success_inc', 'success_inc', 'attempt_inc'] -> ['success_inc*2', 'attempt_inc'], the
+    # counter_ipc batch syntax; runs of one op are merged, order is kept
+    words = []
+    previous, count = None, 0
+    for op in ops + [None]:
+        if op == previous:
+            count += 1
+            continue
+        if previous is not None:
+            words.append(f'{previous}*{count}' if count > 1 else previous)
+        previous, count = op, 1
+    return words
+
+class ChatCommands:
+    # Which chat messages become ops; no I/O, so it can be driven by any transport or a test
+    def __init__(self, permissions=None, rate=RATE, burst=BURST, dedupe_seconds=DEDUPE_SECONDS):
+        permissions = dict(DEFAULT_PERMISSIONS, **(permissions or {}))
+        self.ranks = {command: ROLES.index(role) for command, role in permissions.items()}
+        self.rate = rate
+        self.burst = burst
+        self.dedupe_seconds = dedupe_seconds
+        # user id -> [tokens, refilled at, last command, last command at], least recently used first
+        self.users = OrderedDict()
+        self.seen_ids = set()
+        self.seen_order = deque()
+        # Not yet sent: new ops, and undos with no pending op to cancel. Undos are matched with
+        # applied ops when the next batch is taken, once the batch before it has been answered, so
+        # they never take back an op that failed. Every waiting undo is older than every pending
+        # op, so sending the undos first keeps chat's order.
+        self.pending_ops = []
+        self.pending_undos = 0
+        # The inverses of ops the counter confirmed, newest last
+        self.applied = deque(maxlen=UNDO_DEPTH)
+        # Whether the counter tracks attempts when a batch is sent (the client asks the target), so
+        # an undone !drop takes back an attempt only if it added one
+        self.track_attempts = True
+        self.counts = dict.fromkeys(('accepted', 'denied', 'duplicate', 'limited'), 0)
+
+    def handle(self, tags, text, now):
+        # Returns the op queued for `text` (a command's first word), or None if it was refused
+        command = text.split(None, 1)[0].lower() if text else ''
+        op = COMMANDS.get(command)
+        if op is None:
+            return None
+        message_id = tags.get('id')
+        if message_id:
+            if message_id in self.seen_ids:
+                self.counts['duplicate'] += 1
+                return None
+            self.seen_ids.add(message_id)
+            self.seen_order.append(message_id)
+            if len(self.seen_order) > SEEN_MESSAGE_IDS:
+                self.seen_ids.discard(self.seen_order.popleft())
+        role = ROLES.index(role_of(tags))
+        if role < self.ranks.get(command, len(ROLES)):
+            self.counts['denied'] += 1
+            return None
+        user = tags.get('user-id') or tags.get('display-name', '').lower()
+        state = self.users.get(user)
+        if state is None:
+            state = self.users[user] = [self.burst, now, None, 0.0]
+            if len(self.users) > MAX_TRACKED_USERS:
+                self.users.popitem(last=False)
+        else:
+            self.users.move_to_end(user)
+        if command == state[2] and now - state[3] < self.dedupe_seconds:
+            self.counts['duplicate'] += 1
+            return None
+        if role < ROLES.index('broadcaster'):
+            tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+            if tokens < 1:
+                state[0] = tokens
+                self.counts['limited'] += 1
+                return None
+            state[0] = tokens - 1
+        state[2], state[3] = command, now
+        self.counts['accepted'] += 1
+        if op != 'undo':
+            self.pending_ops.append(op)
+        elif self.pending_ops:
+            # Not sent yet: just drop it
+            self.pending_ops.pop()
+        else:
+            self.pending_undos += 1
+        return op
+
+    def pending(self):
+        return bool(self.pending_undos or self.pending_ops)
+
+    def take(self):
+        # The next batch: (batch words, oldest first; new ops; inverses of the applied ops it takes
+        # back). Call done() with the answer before taking another.
+        undone = [self.applied.pop() for _ in range(min(self.pending_undos, len(self.applied)))]
+        ops = self.pending_ops
+        self.pending_undos = 0
+        self.pending_ops = []
+        return batch_words(undone) + batch_words(ops), ops, undone
+
+    def done(self, batch, ok):
+        # Only ops the counter applied can be undone later; a failed batch changed nothing, so
+        # its new ops are dropped and what it tried to take back stays undoable
+        _, ops, undone = batch
+        if ok:
+            inverse = INVERSE_OPS if self.track_attempts else INVERSE_OPS_WITHOUT_ATTEMPTS
+            self.applied.extend(inverse[op] for op in ops)
+        else:
+            self.applied.extend(reversed(undone))
+
+class SocketTarget:
+    # Sends batches to a control socket (counter_ipc), reconnecting after errors
+    def __init__(self, address=SERVER_ADDRESS, counter=None):
+        self.address = address
+        self.prefix = f'@{counter} ' if counter else ''
+        self.connection = None
+        self.lock = asyncio.Lock()
+
+    async def apply(self, words):
+        return await self.request(f'batch {" ".join(words)}')
+
+    async def track_attempts(self):
+        response = await self.request('get')
+        if not response.startswith('ok '):
+            return True
+        return json.loads(response[3:]).get('trackAttempts', True)
+
+    async def request(self, command):
+        async with self.lock:
+            try:
+                if self.connection is None:
+                    self.connection = await open_connection(self.address)
+                reader, writer = self.connection
+                writer.write(f'{self.prefix}{command}\n'.encode('utf-8'))
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError('control socket closed the connection')
+                return line.decode('utf-8').rstrip('\n')
+            except OSError as e:
+                if self.connection is not None:
+                    self.connection[1].close()
+                    self.connection = None
+                return f'err {self.address}: {e}'
+
+class CounterTarget:
+    # Applies batches to a counter_core.Counter in this process
+    def __init__(self, counter):
+        self.counter = counter
+
+    async def apply(self, words):
+        try:
+            return 'ok ' + execute(self.counter, 'batch', ' '.join(words))
+        except ValueError as e:
+            return f'err {e}'
+
+    async def track_attempts(self):
+        return self.counter.track_attempts
+
+class ChatClient:
+    def __init__(self, channel, target, commands=None, server=TWITCH_IRC, tls=True, nick=None, token=None, verbose=True):
+        self.channel = channel.lower().lstrip('#')
+        self.target = target
+        self.commands = commands or ChatCommands()
+        host, _, port = server.rpartition(':')
+        self.host, self.port = host, int(port)
+        self.tls = tls
+        self.nick = nick or ANONYMOUS_NICK
+        self.token = token
+        self.verbose = verbose
+        self.messages = 0
+        self.flushes = 0
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+
+    async def run(self):
+        # Stays connected: reconnects with backoff whenever the connection drops
+        failures = 0
+        while True:
+            try:
+                await self.session()
+                failures = 0
+            except (OSError, asyncio.IncompleteReadError) as e:
+                print(f'Chat connection error: {e}')
+            delay = RECONNECT_DELAYS[min(failures, len(RECONNECT_DELAYS) - 1)]
+            failures += 1
+            print(f'Reconnecting to chat in {delay} s')
+            await asyncio.sleep(delay)
+
+    async def session(self):
+        # One connection: logs in, joins and handles chat until the server closes it
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=ssl.create_default_context() if self.tls else None)
+        try:
+            login = ['CAP REQ :twitch.tv/tags twitch.tv/commands']
+            if self.token:
+                login.append(f'PASS oauth:{self.token.removeprefix("oauth:")}')
+            login += [f'NICK {self.nick}', f'JOIN #{self.channel}']
+            writer.write(''.join(line + '\r\n' for line in login).encode('utf-8'))
+            buffer = b''
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                lines = (buffer + data).split(b'\n')
+                buffer = lines.pop()
+                for line in lines:
+                    if not self.handle_line(line.rstrip(b'\r').decode('utf-8', 'replace'), writer):
+                        return
+                if self.commands.pending() and self._flush_task is None:
+                    self._flush_task = asyncio.ensure_future(self.flush_later())
+        finally:
+            writer.close()
+            await self.flush()
+
+    def handle_line(self, line, writer):
+        # Returns False when the server asks us to reconnect
+        raw_tags, rest = '', line
+        if line.startswith('@'):
+            raw_tags, _, rest = line[1:].partition(' ')
+        if rest.startswith(':'):
+            rest = rest.partition(' ')[2]
+        if rest.startswith('PRIVMSG '):
+            self.messages += 1
+            # Most chat isn't a command: look at the text before parsing the tags
+            text = rest.partition(' :')[2]
+            if text.startswith('!'):
+                self.commands.handle(parse_tags(raw_tags), text, time.monotonic())
+            return True
+        _, _, command, _, trailing = split_line(line)
+        if command == 'PING':
+            writer.write(f'PONG :{trailing}\r\n'.encode('utf-8'))
+        elif command == 'RECONNECT':
+            return False
+        elif command == 'NOTICE' and self.verbose:
+            print(f'Chat notice: {trailing}')
+        elif command == 'JOIN' and self.verbose:
+            print(f'Reading chat in #{self.channel}')
+        return True
+
+    async def flush_later(self):
+        await asyncio.sleep(FLUSH_DELAY)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        # One batch in flight at a time, so each is answered before the next is taken
+        async with self._flush_lock:
+            if not self.commands.pending():
+                return
+            self.commands.track_attempts = await self.target.track_attempts()
+            batch = self.commands.take()
+            words = batch[0]
+            if not words:
+                # Only undos, and nothing left to take back
+                return
+            response = await self.target.apply(words)
+            self.commands.done(batch, response.startswith('ok'))
+            self.flushes += 1
+            if self.verbose or response.startswith('err'):
+                print(f'Chat ops {" ".join(words)}: {response}')
+
+def parse_permission(value):
+    command, _, role = value.partition('=')
+    if command not in COMMANDS or role not in ROLES:
+        raise argparse.ArgumentTypeError(f'expected one of {", ".join(COMMANDS)} = one of {", ".join(ROLES)}')
+    return command, role
+
+def main():
+    parser = argparse.ArgumentParser(description='Count drops from Twitch chat commands (!drop, !attempt, !undo)')
+    parser.add_argument('--channel', required=True, help='Twitch channel whose chat is read')
+    parser.add_argument('--socket', help=f'control socket address (default {SERVER_ADDRESS}, or {TK_ADDRESS} with --tk)')
+    parser.add_argument('--tk', action='store_true', help="change the Tk overlay's counter instead of the server's")
+    parser.add_argument('--counter', help='named counter on the server (default: the default counter)')
+    parser.add_argument('--permission', type=parse_permission, action='append', default=[], metavar='COMMAND=ROLE',
+                        help=f'lowest role allowed to use a command (default: moderator); roles: {", ".join(ROLES)}')
+    parser.add_argument('--rate', type=float, default=RATE, help='commands per second allowed per user')
+    parser.add_argument('--burst', type=int, default=BURST, help='commands a user may send at once')
+    parser.add_argument('--dedupe-seconds', type=float, default=DEDUPE_SECONDS,
+                        help='a user repeating a command within this time counts once')
+    parser.add_argument('--server', default=TWITCH_IRC, help='IRC server host:port')
+    parser.add_argument('--no-tls', action='store_true', help='plain TCP, e.g. for fake_twitch_irc.py')
+    parser.add_argument('--nick', help='login name with TWITCH_OAUTH_TOKEN (default: anonymous, read only)')
+    parser.add_argument('--quiet', action='store_true', help='only print errors')
+    args = parser.parse_args()
+    target = SocketTarget(args.socket or (TK_ADDRESS if args.tk else SERVER_ADDRESS), args.counter)
+    commands = ChatCommands(dict(args.permission), args.rate, args.burst, args.dedupe_seconds)
+    client = ChatClient(args.channel, target, commands, args.server, not args.no_tls, args.nick,
+                        os.environ.get('TWITCH_OAUTH_TOKEN'), not args.quiet)
+    try:
+        asyncio.run(client.run())
+    except KeyboardInterrupt:
+        sys.exit()
+
+if __name__ == '__main__':
+    main()
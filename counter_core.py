@@ -0,0 +1,227 @@
+# Counter state and counting rules shared by the Tk overlay (floating_counter_tkinter) and the
+# OBS browser-source server (obs_counter_server). Both front ends change counts only through
+# Counter.apply/update/apply_batch, so the clamping rules live in one place, and when the two run
+# in the same process they can share one Counter and see each other's changes without HTTP.
+import re
+import threading
+
+# Wire (JSON) name -> attribute, in the order the server has always serialized them
+FIELDS = {
+    'successes': 'successes',
+    'attempts': 'attempts',
+    'trackAttempts': 'track_attempts',
+    'showButtons': 'show_buttons',
+    'label': 'label',
+    'fontFamily': 'font_family',
+    'fontSize': 'font_size',
+    'fontColor': 'font_color',
+}
+
+# Counter operations; decrements clamp at zero
+def op_success_inc(c):
+    c.successes += 1
+    if c.track_attempts:
+        c.attempts += 1
+
+def op_success_dec(c):
+    if c.successes > 0:
+        c.successes -= 1
+
+def op_success_and_attempt_dec(c):
+    if c.successes > 0:
+        c.successes -= 1
+    if c.attempts > 0:
+        c.attempts -= 1
+
+def op_attempt_inc(c):
+    c.attempts += 1
+
+def op_attempt_dec(c):
+    if c.attempts > 0:
+        c.attempts -= 1
+
+OPS = {
+    'success_inc': op_success_inc,
+    'success_dec': op_success_dec,
+    'success_and_attempt_dec': op_success_and_attempt_dec,
+    'attempt_inc': op_attempt_inc,
+    'attempt_dec': op_attempt_dec,
+}
+# Most times one batch item (POST /batch "count", control socket "op*N") may repeat its op
+MAX_BATCH = 10000
+
+# Field schema: each checker returns the value in its canonical type or raises ValueError
+FONT_SIZE_RANGE = (6, 400)
+MAX_LABEL_LENGTH = 100
+MAX_FONT_FAMILY_LENGTH = 64
+COLOR = re.compile(r'#[0-9A-Fa-f]{6}|#[0-9A-Fa-f]{3}|[A-Za-z]+')
+
+def integer(value):
+    # Form fields send numbers as strings (e.g. fontSize "48")
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError('must be an integer')
+    return value
+
+def check_count(value):
+    value = integer(value)
+    if value < 0:
+        raise ValueError('must not be negative')
+    return value
+
+def check_font_size(value):
+    value = integer(value)
+    if not FONT_SIZE_RANGE[0] <= value <= FONT_SIZE_RANGE[1]:
+        raise ValueError(f'must be between {FONT_SIZE_RANGE[0]} and {FONT_SIZE_RANGE[1]}')
+    return value
+
+def check_flag(value):
+    if not isinstance(value, bool):
+        raise ValueError('must be true or false')
+    return value
+
+def text_checker(max_length):
+    def check_text(value):
+        if not isinstance(value, str):
+            raise ValueError('must be a string')
+        if len(value) > max_length:
+            raise ValueError(f'must be at most {max_length} characters')
+        return value
+    return check_text
+
+def check_color(value):
+    if not isinstance(value, str) or not COLOR.fullmatch(value):
+        raise ValueError('must be a #rgb/#rrggbb color or a color name')
+    return value
+
+SCHEMA = {
+    'successes': check_count,
+    'attempts': check_count,
+    'trackAttempts': check_flag,
+    'showButtons': check_flag,
+    'label': text_checker(MAX_LABEL_LENGTH),
+    'fontFamily': text_checker(MAX_FONT_FAMILY_LENGTH),
+    'fontSize': check_font_size,
+    'fontColor': check_color,
+}
+
+def validate_changes(changes):
+    # Returns a copy of `changes` (wire names) with every value in its canonical type;
+    # raises ValueError for unknown fields or bad values
+    unknown = set(changes) - set(FIELDS)
+    if unknown:
+        raise ValueError(f'unknown fields: {", ".join(sorted(unknown))}')
+    valid = {}
+    for name, value in changes.items():
+        try:
+            valid[name] = SCHEMA[name](value)
+        except ValueError as e:
+            raise ValueError(f'{name} {e}')
+    return valid
+
+class Counter:
+    __slots__ = ('successes', 'attempts', 'track_attempts', 'show_buttons', 'label',
+                 'font_family', 'font_size', 'font_color', 'version', 'delta', 'lock', '_subscribers')
+
+    def __init__(self, label='Mounts Dropped:', font_family='Arial', font_size=48, font_color='#FF0000',
+                 track_attempts=True, show_buttons=True, successes=0, attempts=0):
+        self.successes = successes
+        self.attempts = attempts
+        self.track_attempts = track_attempts
+        self.show_buttons = show_buttons
+        self.label = label
+        self.font_family = font_family
+        self.font_size = font_size
+        self.font_color = font_color
+        # Bumped once per apply/update/apply_batch call
+        self.version = 0
+        # (successes, attempts) change made by the latest apply/update/apply_batch
+        self.delta = (0, 0)
+        # Reentrant so subscribers (called with it held) may read the counter freely
+        self.lock = threading.RLock()
+        self._subscribers = ()
+
+    def subscribe(self, callback):
+        # callback(counter, record) runs after every change, on the changing thread, with
+        # `lock` held; `record` describes the change ({'op': name}, {'set': {...}} or a batch)
+        with self.lock:
+            self._subscribers += (callback,)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self._subscribers = tuple(s for s in self._subscribers if s != callback)
+
+    def _notify(self, record):
+        for callback in self._subscribers:
+            callback(self, record)
+
+    def _change(self, mutate, record):
+        # Every change goes through here: mutate(self), one version bump, then the subscribers.
+        # Storage-backed counters (counter_backends) override it to run inside their store's transaction.
+        with self.lock:
+            successes, attempts = self.successes, self.attempts
+            mutate(self)
+            self.delta = (self.successes - successes, self.attempts - attempts)
+            self.version += 1
+            self._notify(record)
+            return self.version
+
+    def load_state(self, state, version):
+        # Replaces the fields (wire names) and version wholesale, without notifying
+        for name, value in state.items():
+            if name in FIELDS:
+                setattr(self, FIELDS[name], value)
+        self.version = version
+
+    def apply(self, op):
+        # Returns the new version; raises KeyError for an unknown op
+        return self._change(OPS[op], {'op': op})
+
+    def update(self, changes):
+        # `changes` uses wire names, e.g. {'label': 'Shinies:', 'fontSize': 40}
+        changes = validate_changes(changes)
+        return self._change(lambda c: c.load_state(changes, c.version), {'set': changes})
+
+    def patch(self, changes):
+        # Sets just the fields that differ (PATCH /state, the control socket's set). Returns (version,
+        # fields that changed); a patch that changes nothing doesn't bump the version, so displays
+        # don't repaint for it
+        changes = validate_changes(changes)
+        with self.lock:
+            refresh = getattr(self, 'refresh', None)
+            if refresh is not None:
+                # Compare with the shared store, not a copy another worker may have moved on from
+                refresh()
+            changed = {name: value for name, value in changes.items() if getattr(self, FIELDS[name]) != value}
+            if not changed:
+                return self.version, changed
+            return self.update(changed), changed
+
+    def apply_batch(self, steps, record):
+        # `steps` are op names and change dicts, applied in order under one lock with one version
+        # bump; everything is validated before anything is applied
+        steps = [validate_changes(step) if isinstance(step, dict) else step for step in steps]
+        for step in steps:
+            if not isinstance(step, dict) and step not in OPS:
+                raise ValueError(f'unknown op: {step!r}')
+
+        def mutate(c):
+            for step in steps:
+                if isinstance(step, dict):
+                    c.load_state(step, c.version)
+                else:
+                    OPS[step](c)
+        return self._change(mutate, record)
+
+    def display_text(self):
+        # The line every front end draws
+        if self.track_attempts:
+            return f'{self.label} {self.successes}/{self.attempts}'
+        return f'{self.label} {self.successes}'
+
+    def to_dict(self):
+        return {name: getattr(self, attr) for name, attr in FIELDS.items()}
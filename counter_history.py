@@ -0,0 +1,159 @@
+# Per-counter op history in a fixed-size, memory-mapped ring of packed records.
+#
+# A record is RECORD = (timestamp ns, successes total, attempts total), where the totals are the
+# running sums of what ops added to (or, for undos, took from) the counter since its log began.
+# The count for any time range is then the difference of two records, each found by binary
+# search on the timestamps, so a query costs O(buckets * log n) however long the stream ran and
+# never copies the log into Python objects. Timestamps are wall-clock but never go backwards
+# within one log. Once the ring is full the oldest records are overwritten.
+import contextlib
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+from counter_backends import lock_file, unlock_file
+
+MAGIC = b'OBSHIST1'
+# magic, capacity in records, records ever written
+HEADER = struct.Struct('<8sQQ')
+WRITTEN = struct.Struct('<Q')
+WRITTEN_OFFSET = 16
+HEADER_SIZE = 64
+RECORD = struct.Struct('<qqq')
+TIMESTAMP = struct.Struct('<q')
+DEFAULT_CAPACITY = 1 << 20
+MAX_BUCKETS = 10000
+# Python 3.13+ can map a file without keeping a duplicate of its descriptor open
+MAP_OPTIONS = {'trackfd': False} if sys.version_info >= (3, 13) and os.name != 'nt' else {}
+
+class HistoryRing:
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY, shared=False):
+        # path=None keeps the ring in anonymous memory; a `shared` file-backed ring may be used by
+        # several processes (server workers), which serialize appends on a lock file. Only the map
+        # (and a shared ring's lock file) stays open, so many counters' rings fit the fd limit.
+        self._lock = threading.Lock()
+        self._lock_file = None
+        size = HEADER_SIZE + capacity * RECORD.size
+        if path is None:
+            self._map = mmap.mmap(-1, size)
+            HEADER.pack_into(self._map, 0, MAGIC, capacity, 0)
+        else:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            if shared:
+                self._lock_file = open(path + '.lock', 'a+b')
+            with self._locked(), open(path, 'a+b') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    # Sparse on most filesystems: disk is only used as the ring fills
+                    f.truncate(size)
+                    self._map = mmap.mmap(f.fileno(), size, **MAP_OPTIONS)
+                    HEADER.pack_into(self._map, 0, MAGIC, capacity, 0)
+                else:
+                    self._map = mmap.mmap(f.fileno(), 0, **MAP_OPTIONS)
+        magic, self.capacity, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a counter history file')
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            if self._lock_file is None:
+                yield
+                return
+            lock_file(self._lock_file)
+            try:
+                yield
+            finally:
+                unlock_file(self._lock_file)
+
+    def _offset(self, index):
+        return HEADER_SIZE + (index % self.capacity) * RECORD.size
+
+    def _written(self):
+        return WRITTEN.unpack_from(self._map, WRITTEN_OFFSET)[0]
+
+    def _timestamp(self, index):
+        return TIMESTAMP.unpack_from(self._map, self._offset(index))[0]
+
+    def append(self, successes, attempts):
+        # Records one change of successes/attempts (either may be negative for an undo)
+        with self._locked():
+            written = self._written()
+            now = time.time_ns()
+            if written:
+                last, successes_total, attempts_total = RECORD.unpack_from(self._map, self._offset(written - 1))
+                now = max(now, last)
+            else:
+                successes_total = attempts_total = 0
+            RECORD.pack_into(self._map, self._offset(written), now, successes_total + successes, attempts_total + attempts)
+            # Bumped last, so readers never see a half-written record
+            WRITTEN.pack_into(self._map, WRITTEN_OFFSET, written + 1)
+
+    def span(self):
+        # (first, end) absolute indexes of the records still in the ring
+        written = self._written()
+        return max(0, written - self.capacity), written
+
+    def bounds(self):
+        # (oldest, newest) timestamp in ns, or None while the log is empty
+        first, end = self.span()
+        if first == end:
+            return None
+        return self._timestamp(first), self._timestamp(end - 1)
+
+    def _seek(self, timestamp, lo, hi):
+        # First index in [lo, hi) whose timestamp is >= `timestamp` (hi if none). Gallops forward
+        # from lo before bisecting, since consecutive bucket boundaries are usually close together.
+        unpack, data, capacity, size = TIMESTAMP.unpack_from, self._map, self.capacity, RECORD.size
+        bound, step = lo, 1
+        while bound < hi and unpack(data, HEADER_SIZE + (bound % capacity) * size)[0] < timestamp:
+            lo = bound + 1
+            bound += step
+            step *= 2
+        hi = min(hi, bound)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if unpack(data, HEADER_SIZE + (mid % capacity) * size)[0] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _totals_before(self, index, first):
+        # Running totals just before record `index`
+        if index == first:
+            if first == 0:
+                return 0, 0
+            # Anything older was overwritten; count from the oldest surviving record
+            index += 1
+        _, successes, attempts = RECORD.unpack_from(self._map, self._offset(index - 1))
+        return successes, attempts
+
+    def query(self, start, end, bucket):
+        # Net successes/attempts per `bucket` ns from `start` to `end` (inclusive):
+        # [(bucket start, successes, attempts), ...]
+        if bucket <= 0 or end < start:
+            raise ValueError('need bucket > 0 and from <= to')
+        count = -(-(end - start) // bucket) or 1
+        if count > MAX_BUCKETS:
+            raise ValueError(f'at most {MAX_BUCKETS} buckets per query')
+        first, last = self.span()
+        index = self._seek(start, first, last)
+        previous = self._totals_before(index, first)
+        buckets = []
+        for i in range(count):
+            bucket_start = start + i * bucket
+            boundary = end + 1 if i == count - 1 else bucket_start + bucket
+            index = self._seek(boundary, index, last)
+            totals = self._totals_before(index, first)
+            buckets.append((bucket_start, totals[0] - previous[0], totals[1] - previous[1]))
+            previous = totals
+        return buckets
+
+    def close(self):
+        self._map.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
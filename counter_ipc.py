@@ -0,0 +1,212 @@
+# Local control channel for counters: a Unix domain socket (TCP on localhost on Windows) that takes
+# one command per line, used by counterctl.py, stream deck scripts and game log watchers. The OBS
+# server and the Tk overlay each listen on one. Changes go through the same Counter calls as the
+# HTTP API (apply / apply_batch / update), so they are journaled, logged and pushed to displays alike.
+#
+# Request:  [@<counter>] <command>            (UTF-8, one per line; blank lines are ignored)
+#   success+ success- attempt+ attempt- undo  one op (undo takes back a success and its attempt);
+#                                             the op names (success_inc, ...) work too
+#   batch <op>[*<n>] ...                      several ops as one change: one version, one repaint
+#   set <json object>                         change fields, like PATCH /state
+#   get                                       the counter's state as JSON
+#   ping
+# Response: one line per request, in order, so clients may pipeline:
+#   ok <version> <successes> <attempts>       after success+ ... undo, batch and set
+#   ok <json>                                 for get
+#   ok pong
+#   err <message>
+import asyncio
+import atexit
+import errno
+import json
+import os
+import socket
+import tempfile
+import threading
+
+from counter_core import MAX_BATCH, OPS
+
+OP_ALIASES = {
+    'success+': 'success_inc',
+    'success-': 'success_dec',
+    'attempt+': 'attempt_inc',
+    'attempt-': 'attempt_dec',
+    'undo': 'success_and_attempt_dec',
+}
+MAX_LINE_BYTES = 64 * 1024
+# Written responses are flushed to the socket once this much is waiting
+DRAIN_THRESHOLD = 64 * 1024
+
+def default_address(name, port):
+    if not hasattr(socket, 'AF_UNIX') or os.name == 'nt':
+        return f'tcp:127.0.0.1:{port}'
+    return os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(), f'{name}.sock')
+
+SERVER_ADDRESS = default_address('obs_counter', 5002)
+TK_ADDRESS = default_address('floating_counter', 5003)
+
+def tcp_address(address):
+    # 'tcp:host:port' -> (host, port), or None for a socket path
+    if not address.startswith('tcp:'):
+        return None
+    host, _, port = address[len('tcp:'):].rpartition(':')
+    return host, int(port)
+
+def connect(address, timeout=None):
+    tcp = tcp_address(address)
+    if tcp is not None:
+        sock = socket.create_connection(tcp, timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+async def open_connection(address):
+    # asyncio (reader, writer) to a control socket
+    tcp = tcp_address(address)
+    if tcp is not None:
+        return await asyncio.open_connection(*tcp)
+    return await asyncio.open_unix_connection(address)
+
+def parse_op(word):
+    op = OP_ALIASES.get(word, word)
+    if op not in OPS:
+        raise ValueError(f'unknown op: {word}')
+    return op
+
+def parse_batch_words(words):
+    # "success+ attempt+*3" -> /batch items ({"op", "count"}, journaled and replayed like /batch)
+    # and the ops they expand to
+    items, steps = [], []
+    for word in words:
+        word, _, count = word.partition('*')
+        op = parse_op(word)
+        if count:
+            if not count.isdigit() or not 1 <= int(count) <= MAX_BATCH:
+                raise ValueError(f'bad count: {count} (1 to {MAX_BATCH})')
+            count = int(count)
+        else:
+            count = 1
+        items.append({'op': op, 'count': count})
+        steps.extend([op] * count)
+    return items, steps
+
+def execute(counter, command, rest):
+    # Runs one command on a counter_core.Counter; returns the response text after "ok "
+    if command == 'get':
+        with counter.lock:
+            return json.dumps(dict(counter.to_dict(), version=counter.version))
+    if command == 'ping':
+        return 'pong'
+    with counter.lock:
+        if command == 'batch':
+            items, steps = parse_batch_words(rest.split())
+            if not steps:
+                raise ValueError('empty batch')
+            counter.apply_batch(steps, {'batch': items})
+        elif command == 'set':
+            try:
+                changes = json.loads(rest)
+            except ValueError:
+                raise ValueError('set needs a JSON object')
+            if not isinstance(changes, dict):
+                raise ValueError('set needs a JSON object')
+            counter.patch(changes)
+        else:
+            if rest:
+                raise ValueError(f'{command} takes no arguments')
+            counter.apply(parse_op(command))
+        return f'{counter.version} {counter.successes} {counter.attempts}'
+
+class ControlServer:
+    def __init__(self, lookup, address=SERVER_ADDRESS):
+        # lookup(name) returns the Counter called `name` (None for the default one) or None
+        self.lookup = lookup
+        self.address = address
+        self.loop = None
+        self.server = None
+
+    def start(self):
+        # Binds right away (raising OSError if the address is taken), then serves on a daemon thread
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(self.listen())
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        atexit.register(self.close)
+        return self
+
+    async def listen(self):
+        tcp = tcp_address(self.address)
+        if tcp is not None:
+            return await asyncio.start_server(self.handle, *tcp, limit=MAX_LINE_BYTES)
+        remove_stale_socket(self.address)
+        server = await asyncio.start_unix_server(self.handle, self.address, limit=MAX_LINE_BYTES)
+        # Only this user may drive the counter
+        os.chmod(self.address, 0o600)
+        return server
+
+    def close(self):
+        if self.server is None:
+            return
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.server = None
+        if tcp_address(self.address) is None:
+            try:
+                os.remove(self.address)
+            except OSError:
+                pass
+
+    def respond(self, line):
+        text = line.decode('utf-8', 'replace').strip()
+        if not text:
+            return None
+        name = None
+        if text.startswith('@'):
+            name, _, text = text[1:].partition(' ')
+        command, _, rest = text.strip().partition(' ')
+        counter = self.lookup(name)
+        if counter is None:
+            return f'err unknown counter: {name}'
+        try:
+            return 'ok ' + execute(counter, command, rest.strip())
+        except ValueError as e:
+            return f'err {e}'
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(b'err line too long\n')
+                    break
+                if not line:
+                    break
+                response = self.respond(line)
+                if response is None:
+                    continue
+                writer.write(response.encode('utf-8') + b'\n')
+                # Pipelined commands are answered as they come; only wait when the client stops reading
+                if writer.transport.get_write_buffer_size() > DRAIN_THRESHOLD:
+                    await writer.drain()
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+def remove_stale_socket(path):
+    # A socket file left by a process that exited without cleaning up is removed; a live one is kept
+    if not os.path.exists(path):
+        return
+    try:
+        connect(path, timeout=1).close()
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(path)
+        return
+    raise OSError(errno.EADDRINUSE, f'{path} is in use by another process')
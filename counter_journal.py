@@ -0,0 +1,175 @@
+# Append-only journal + snapshot persistence for the OBS counter server.
+#
+# Every state change is appended as one line: "<crc32 hex> <json record>\n", where the
+# record carries the state version it produced. A snapshot of the full state is written
+# every `snapshot_every` records (and on shutdown), after which the journal is truncated.
+# Recovery loads the snapshot and replays only journal records newer than it; a torn or
+# corrupt tail (e.g. power loss mid-write) is cut off at the last intact record.
+import json
+import os
+import threading
+import time
+import zlib
+
+from counter_metrics import REGISTRY
+
+FSYNC_POLICIES = ('always', 'interval', 'shutdown')
+
+JOURNAL_WRITES = REGISTRY.histogram('obs_counter_journal_write_seconds',
+                                    'Time to append one journal record, including its fsync with --fsync always').labels()
+JOURNAL_FSYNCS = REGISTRY.histogram('obs_counter_journal_fsync_seconds', 'Duration of journal fsyncs').labels()
+
+def timed_fsync(fd):
+    start = time.perf_counter()
+    os.fsync(fd)
+    JOURNAL_FSYNCS.observe(time.perf_counter() - start)
+
+class IntervalFlusher:
+    # One background thread fsyncing every 'interval' journal that shares its interval, so a
+    # process with hundreds of journals (one per named counter) doesn't run hundreds of threads
+    _flushers = {}
+    _flushers_lock = threading.Lock()
+
+    @classmethod
+    def for_interval(cls, interval):
+        with cls._flushers_lock:
+            flusher = cls._flushers.get(interval)
+            if flusher is None:
+                flusher = cls._flushers[interval] = cls(interval)
+            return flusher
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._journals = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def add(self, journal):
+        with self._lock:
+            self._journals.add(journal)
+
+    def remove(self, journal):
+        with self._lock:
+            self._journals.discard(journal)
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                journals = list(self._journals)
+            for journal in journals:
+                journal.sync()
+
+class CounterJournal:
+    def __init__(self, directory, fsync='interval', fsync_interval_ms=50, snapshot_every=1000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'fsync must be one of {", ".join(FSYNC_POLICIES)}')
+        self.directory = directory
+        self.journal_path = os.path.join(directory, 'journal.log')
+        self.snapshot_path = os.path.join(directory, 'snapshot.json')
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._fd = None
+        self._dirty = False
+        self._since_snapshot = 0
+        self._flusher = None
+
+    def recover(self):
+        # Returns (snapshot state or None, snapshot version, [(version, record), ...] to replay)
+        os.makedirs(self.directory, exist_ok=True)
+        state, version = None, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            state, version = snapshot['state'], snapshot['version']
+        records = []
+        good_end = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb') as f:
+                data = f.read()
+            last_version = version
+            for line in data.splitlines(keepends=True):
+                entry = self._decode(line)
+                if entry is None:
+                    break
+                good_end += len(line)
+                # Records already folded into the snapshot (crash between snapshot and truncate)
+                if entry['v'] <= last_version:
+                    continue
+                records.append((entry['v'], entry['r']))
+                last_version = entry['v']
+            if good_end < len(data):
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(good_end)
+                    os.fsync(f.fileno())
+        self._open()
+        return state, version, records
+
+    def _decode(self, line):
+        if not line.endswith(b'\n'):
+            return None
+        crc, _, payload = line.rstrip(b'\n').partition(b' ')
+        try:
+            if int(crc, 16) != zlib.crc32(payload):
+                return None
+            entry = json.loads(payload)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict) or not isinstance(entry.get('v'), int) or 'r' not in entry:
+            return None
+        return entry
+
+    def _open(self):
+        # Unbuffered: each record is one write() so a process crash never loses an acknowledged op;
+        # the fsync policy only decides when it is forced to disk
+        self._fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if self.fsync == 'interval':
+            self._flusher = IntervalFlusher.for_interval(self.fsync_interval)
+            self._flusher.add(self)
+
+    def append(self, version, record):
+        # Returns True when a snapshot is due
+        payload = json.dumps({'v': version, 'r': record}, separators=(',', ':')).encode('utf-8')
+        line = b'%08x %s\n' % (zlib.crc32(payload), payload)
+        with self._lock:
+            start = time.perf_counter()
+            os.write(self._fd, line)
+            if self.fsync == 'always':
+                timed_fsync(self._fd)
+            else:
+                self._dirty = True
+            JOURNAL_WRITES.observe(time.perf_counter() - start)
+            self._since_snapshot += 1
+            return self._since_snapshot >= self.snapshot_every
+
+    def snapshot(self, state, version):
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'state': state}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        with self._lock:
+            os.ftruncate(self._fd, 0)
+            timed_fsync(self._fd)
+            self._dirty = False
+            self._since_snapshot = 0
+
+    def sync(self):
+        with self._lock:
+            if self._dirty and self._fd is not None:
+                timed_fsync(self._fd)
+                self._dirty = False
+
+    def close(self):
+        if self._flusher:
+            self._flusher.remove(self)
+            self._flusher = None
+        self.sync()
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
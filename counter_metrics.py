@@ -0,0 +1,169 @@
+# Always-on metrics for the OBS counter, served by obs_counter_server as GET /metrics in the
+# Prometheus text format. Metrics are registered once at import, histograms have fixed buckets
+# allocated up front, and recording is one lock plus a few number updates, so they stay on in
+# production. The text is only built when /metrics is scraped.
+import bisect
+import threading
+import time
+
+# Seconds; HTTP handlers and journal writes
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+# Seconds; Tk frames (16 ms is one frame at 60 Hz)
+FRAME_BUCKETS = (0.0005, 0.001, 0.002, 0.004, 0.008, 0.016, 0.033, 0.05, 0.1, 0.25, 0.5, 1)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class Value:
+    # A counter or gauge sample
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def samples(self, name, labels):
+        yield f'{name}{labels} {self.value}'
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count', 'lock')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # One slot per bucket plus +Inf, not cumulative; summed up when scraped
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        # bisect_left: a value equal to a bound belongs to that bucket (Prometheus' le is inclusive)
+        i = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, name, labels):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        prefix = labels[:-1] + ',' if labels else '{'
+        cumulative = 0
+        for bound, n in zip(self.bounds + ('+Inf',), counts):
+            cumulative += n
+            yield f'{name}_bucket{prefix}le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{labels} {total}'
+        yield f'{name}_count{labels} {count}'
+
+class RateMeter:
+    # Events per second over the last `window` whole seconds, kept in a fixed ring of per-second counts
+    __slots__ = ('window', 'counts', 'seconds', 'lock')
+
+    def __init__(self, window=10):
+        self.window = window
+        self.counts = [0] * window
+        self.seconds = [-1] * window
+        self.lock = threading.Lock()
+
+    def add(self, amount=1):
+        now = int(time.monotonic())
+        i = now % self.window
+        with self.lock:
+            if self.seconds[i] != now:
+                self.seconds[i] = now
+                self.counts[i] = 0
+            self.counts[i] += amount
+
+    def rate(self):
+        # The current second is still filling up, so only the window - 1 complete ones count
+        now = int(time.monotonic())
+        with self.lock:
+            total = sum(n for n, second in zip(self.counts, self.seconds) if now - self.window < second < now)
+        return total / (self.window - 1)
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + '}'
+
+class Family:
+    # One metric name with a child per label combination, created on its first use
+    def __init__(self, name, kind, description, labelnames, make):
+        self.name = name
+        self.kind = kind
+        self.description = description
+        self.labelnames = labelnames
+        self._make = make
+        self._children = {}
+        self._lock = threading.Lock()
+        if not labelnames:
+            self._children[()] = make()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._make()
+        return child
+
+    def samples(self):
+        for values, child in sorted(self._children.items()):
+            yield from child.samples(self.name, format_labels(self.labelnames, values))
+
+class Callback:
+    # A gauge read at scrape time: read() yields (label values, value)
+    def __init__(self, name, description, labelnames, read):
+        self.name = name
+        self.kind = 'gauge'
+        self.description = description
+        self.labelnames = labelnames
+        self._read = read
+
+    def samples(self):
+        for values, value in self._read():
+            yield f'{self.name}{format_labels(self.labelnames, values)} {value}'
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        # Registering a name twice returns the first one, so modules and objects can declare theirs freely
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, description, labelnames=()):
+        return self._register(Family(name, 'counter', description, labelnames, Value))
+
+    def gauge(self, name, description, labelnames=()):
+        return self._register(Family(name, 'gauge', description, labelnames, Value))
+
+    def histogram(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Family(name, 'histogram', description, labelnames, lambda: Histogram(buckets)))
+
+    def callback(self, name, description, read, labelnames=()):
+        return self._register(Callback(name, description, labelnames, read))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
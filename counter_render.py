@@ -0,0 +1,154 @@
+# Server-side counter images (obs_counter_server's /render.png and /render.svg), so OBS can show
+# the counter with an Image or Media Source instead of a browser source. Text is drawn on a truly
+# transparent background (no white keyed out), in the counter's font, size and color.
+#
+# Frames are kept in an LRU cache keyed by what they show (format, text, font, size, color), so
+# a frame is drawn once per new count or style and every display polling it gets the cached
+# bytes; going back to an earlier count (an undo) is a cache hit too.
+import io
+import os
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+FRAME_CACHE_SIZE = 128
+# Used when the counter's color is a name the renderer doesn't know (browsers ignore those too)
+FALLBACK_COLOR = '#FF0000'
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+# Average glyph width in em, for sizing SVGs when Pillow can't measure the text
+AVERAGE_CHAR_WIDTH = 0.6
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+class RenderUnavailable(Exception):
+    pass
+
+def font_directories():
+    home = os.path.expanduser('~')
+    if sys.platform == 'win32':
+        return [os.path.join(os.environ.get('WINDIR', r'C:\Windows'), 'Fonts'),
+                os.path.join(os.environ.get('LOCALAPPDATA', home), 'Microsoft', 'Windows', 'Fonts')]
+    if sys.platform == 'darwin':
+        return ['/System/Library/Fonts', '/Library/Fonts', os.path.join(home, 'Library', 'Fonts')]
+    return ['/usr/share/fonts', '/usr/local/share/fonts', os.path.join(home, '.fonts'),
+            os.path.join(home, '.local', 'share', 'fonts')]
+
+def pillow():
+    # Pillow is optional (pip install pillow) and only imported once an image is drawn
+    try:
+        from PIL import Image, ImageColor, ImageDraw, ImageFont
+    except ImportError:
+        return None
+    return Image, ImageColor, ImageDraw, ImageFont
+
+_font_files = None
+_font_files_lock = threading.Lock()
+
+def font_files():
+    # Family name (lower case) -> font file, read from every installed font once, on first use
+    global _font_files
+    with _font_files_lock:
+        if _font_files is not None:
+            return _font_files
+        ImageFont = pillow()[3]
+        found = {}
+        for directory in font_directories():
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    if not name.lower().endswith(FONT_EXTENSIONS):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        family, style = ImageFont.truetype(path, 12).getname()
+                    except OSError:
+                        continue
+                    # Prefer the upright regular face of each family
+                    rank = 0 if style in ('Regular', 'Book', 'Normal', 'Roman') else 1
+                    key = family.lower()
+                    if key not in found or rank < found[key][0]:
+                        found[key] = (rank, path)
+        _font_files = {family: path for family, (_, path) in found.items()}
+        return _font_files
+
+@lru_cache(maxsize=32)
+def load_font(family, size):
+    ImageFont = pillow()[3]
+    path = font_files().get(family.lower())
+    if path is not None:
+        return ImageFont.truetype(path, size)
+    # Unknown family: Pillow's bundled font, like a browser falling back to its default
+    return ImageFont.load_default(size)
+
+def text_size(text, family, size):
+    # (width, height) of `text` in pixels, measured when Pillow is there, estimated otherwise
+    if pillow() is None:
+        return int(len(text) * size * AVERAGE_CHAR_WIDTH) + 1, int(size * 1.25) + 1
+    left, top, right, bottom = load_font(family, size).getbbox(text)
+    return right - left, bottom - top
+
+def escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+def padding(size):
+    return max(2, size // 8)
+
+def render_svg(text, family, size, color):
+    width, height = text_size(text, family, size)
+    pad = padding(size)
+    width += 2 * pad
+    height = max(height, int(size * 1.25)) + 2 * pad
+    svg = (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+           f'<text x="50%" y="50%" text-anchor="middle" dominant-baseline="central" '
+           f'font-family="{escape(family)}" font-size="{size}" fill="{escape(color)}">{escape(text)}</text></svg>')
+    return svg.encode('utf-8')
+
+def render_png(text, family, size, color):
+    modules = pillow()
+    if modules is None:
+        raise RenderUnavailable('PNG rendering needs Pillow (pip install pillow)')
+    Image, ImageColor, ImageDraw, _ = modules
+    try:
+        fill = ImageColor.getrgb(color)
+    except ValueError:
+        fill = ImageColor.getrgb(FALLBACK_COLOR)
+    font = load_font(family, size)
+    left, top, right, bottom = font.getbbox(text)
+    pad = padding(size)
+    image = Image.new('RGBA', (right - left + 2 * pad, bottom - top + 2 * pad), (0, 0, 0, 0))
+    ImageDraw.Draw(image).text((pad - left, pad - top), text, font=font, fill=fill)
+    out = io.BytesIO()
+    image.save(out, 'PNG')
+    return out.getvalue()
+
+RENDERERS = {'png': render_png, 'svg': render_svg}
+
+class FrameCache:
+    # LRU of rendered frames: key -> (body, ETag)
+    def __init__(self, size=FRAME_CACHE_SIZE):
+        self.size = size
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, render):
+        # Returns ((body, ETag), hit). Rendering happens outside the lock, so one slow frame never
+        # holds up requests for cached ones; two requests racing on a new frame both draw it.
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                return frame, True
+        body = render()
+        frame = (body, f'"{zlib.crc32(body):08x}-{len(body):x}"')
+        with self._lock:
+            self._frames[key] = frame
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.size:
+                self._frames.popitem(last=False)
+        return frame, False
+
+FRAMES = FrameCache()
+
+def render(kind, text, family, size, color):
+    # Returns ((body, ETag), cache hit); raises RenderUnavailable for PNG without Pillow
+    return FRAMES.get((kind, text, family, size, color), lambda: RENDERERS[kind](text, family, size, color))
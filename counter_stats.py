@@ -0,0 +1,254 @@
+# Drop-rate statistics for a counter_core.Counter, kept up to date from each change's
+# (successes, attempts) delta in bounded time however large it is, never by rescanning history:
+#   - the overall rate and the rate over the last WINDOWS attempts
+#   - the current dry streak (failed attempts since the last success) and the longest one
+#   - a 95% Wilson score interval (closed form, cheap)
+#   - a 95% Clopper-Pearson interval, which needs beta quantiles: only computed when a snapshot
+#     asks for it, cached per (successes, attempts)
+# Snapshots are cached per counter version, so any number of displays polling /state cost one
+# computation per change.
+import math
+from collections import deque
+from functools import lru_cache
+
+# Rolling windows, in attempts
+WINDOWS = (20, 100)
+CONFIDENCE = 0.95
+Z = 1.959963984540054
+# Closed dry streaks remembered so that undoing a success restores the streak it ended
+UNDO_DEPTH = 1000
+
+def wilson_interval(successes, attempts, z=Z):
+    if attempts <= 0:
+        return None
+    p = min(max(successes / attempts, 0.0), 1.0)
+    z2 = z * z
+    denominator = 1 + z2 / attempts
+    centre = (p + z2 / (2 * attempts)) / denominator
+    half = z * math.sqrt(p * (1 - p) / attempts + z2 / (4 * attempts * attempts)) / denominator
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+def _beta_continued_fraction(a, b, x):
+    # Lentz's method for the incomplete beta continued fraction (Numerical Recipes betacf)
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 10000):
+        m2 = 2 * m
+        for numerator in (m * (b - m) * x / ((a + m2 - 1) * (a + m2)),
+                          -(a + m) * (a + b + m) * x / ((a + m2) * (a + m2 + 1))):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1) < 1e-14:
+            break
+    return h
+
+def regularized_beta(a, b, x):
+    # I_x(a, b), the beta distribution's CDF
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    log_front = math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x)
+    if x < (a + 1) / (a + b + 2):
+        return math.exp(log_front) * _beta_continued_fraction(a, b, x) / a
+    return 1 - math.exp(log_front) * _beta_continued_fraction(b, a, 1 - x) / b
+
+def beta_quantile(q, a, b):
+    # Bisection on the CDF; ~50 halvings reach double precision
+    lo, hi = 0.0, 1.0
+    for _ in range(52):
+        mid = (lo + hi) / 2
+        if regularized_beta(a, b, mid) < q:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+@lru_cache(maxsize=256)
+def clopper_pearson_interval(successes, attempts, confidence=CONFIDENCE):
+    if attempts <= 0:
+        return None
+    successes = min(max(successes, 0), attempts)
+    alpha = 1 - confidence
+    lower = 0.0 if successes == 0 else beta_quantile(alpha / 2, successes, attempts - successes + 1)
+    upper = 1.0 if successes >= attempts else beta_quantile(1 - alpha / 2, successes + 1, attempts - successes)
+    return lower, upper
+
+class RollingRate:
+    # Success rate over the last `size` attempts
+    __slots__ = ('outcomes', 'successes')
+
+    def __init__(self, size):
+        self.outcomes = deque(maxlen=size)
+        self.successes = 0
+
+    def push(self, outcome):
+        if len(self.outcomes) == self.outcomes.maxlen:
+            self.successes -= self.outcomes[0]
+        self.outcomes.append(outcome)
+        self.successes += outcome
+
+    def _latest(self, outcome):
+        # Index of the newest `outcome` in the window (bounded by its size, not by history), or None
+        for i in range(len(self.outcomes) - 1, -1, -1):
+            if self.outcomes[i] == outcome:
+                return i
+        return None
+
+    def remove(self, outcome):
+        i = self._latest(outcome)
+        if i is not None:
+            del self.outcomes[i]
+            self.successes -= outcome
+
+    def demote(self):
+        # The newest success was taken back, its attempt kept
+        i = self._latest(1)
+        if i is not None:
+            self.outcomes[i] = 0
+            self.successes -= 1
+
+    def to_dict(self):
+        attempts = len(self.outcomes)
+        return {
+            'size': self.outcomes.maxlen,
+            'attempts': attempts,
+            'successes': self.successes,
+            'rate': round(self.successes / attempts, 6) if attempts else None,
+        }
+
+def interval(bounds):
+    return [round(bounds[0], 6), round(bounds[1], 6)] if bounds else None
+
+class DropStats:
+    __slots__ = ('counter', 'windows', 'dry_streak', '_longest_closed', '_closed', '_snapshot')
+
+    def __init__(self, counter):
+        # Starts from the counter's current totals; streaks and windows fill in as ops arrive.
+        # Feed it every change with update(), or subscribe it: counter.subscribe(stats.update)
+        self.counter = counter
+        self.windows = [RollingRate(size) for size in WINDOWS]
+        self.dry_streak = 0
+        self._longest_closed = 0
+        # (streak, longest before it) for each streak a success closed, newest last
+        self._closed = deque(maxlen=UNDO_DEPTH)
+        self._snapshot = (None, None)
+
+    @property
+    def longest_dry_streak(self):
+        return max(self._longest_closed, self.dry_streak)
+
+    def update(self, counter, record):
+        successes, attempts = counter.delta
+        if 'set' in record or 'sync' in record or any(isinstance(item, dict) and 'set' in item
+                                                      for item in record.get('batch', ())):
+            # Counts edited by hand (e.g. reset to 0/0) or by another worker: what the streaks and
+            # windows describe is gone
+            if (successes, attempts) != (0, 0):
+                self.reset()
+            return
+        if attempts > 0:
+            # A batch doesn't say in which order its attempts went; count the misses first
+            wins = max(0, min(successes, attempts))
+            self._push_misses(attempts - wins)
+            self._push_wins(wins)
+        elif attempts < 0:
+            # Undos take back the newest matching attempts
+            wins = max(0, min(-successes, -attempts))
+            self._remove_successes(wins)
+            self._remove_misses(-attempts - wins)
+        elif successes < 0 and counter.track_attempts:
+            self._demote(-successes)
+
+    def reset(self):
+        for window in self.windows:
+            window.outcomes.clear()
+            window.successes = 0
+        self.dry_streak = self._longest_closed = 0
+        self._closed.clear()
+
+    # Each of these takes `count` attempts at once and loops at most max(WINDOWS) times per window
+    # and UNDO_DEPTH times over the closed streaks; the rest is arithmetic
+    def _each_window(self, method, count, *args):
+        for window in self.windows:
+            for _ in range(min(count, window.outcomes.maxlen)):
+                method(window, *args)
+
+    def _push_misses(self, count):
+        self._each_window(RollingRate.push, count, 0)
+        self.dry_streak += count
+
+    def _push_wins(self, count):
+        if count <= 0:
+            return
+        self._each_window(RollingRate.push, count, 1)
+        # The first success closes the current streak, the others close empty ones
+        self._closed.append((self.dry_streak, self._longest_closed))
+        self._longest_closed = max(self._longest_closed, self.dry_streak)
+        self.dry_streak = 0
+        self._closed.extend([(0, self._longest_closed)] * min(count - 1, UNDO_DEPTH))
+
+    def _remove_misses(self, count):
+        self._each_window(RollingRate.remove, count, 0)
+        taken = min(count, self.dry_streak)
+        self.dry_streak -= taken
+        count -= taken
+        if count <= 0:
+            return
+        # The rest were in the newest streaks successes closed; successes in a row after them closed empty ones
+        empty = 0
+        longest = 0
+        while self._closed:
+            streak, longest = self._closed.pop()
+            taken = min(count, streak)
+            count -= taken
+            if count <= 0 and streak > 0:
+                self._closed.append((streak - taken, longest))
+                longest = max(longest, streak - taken)
+                break
+            empty += 1
+        else:
+            longest = 0
+        self._closed.extend([(0, longest)] * empty)
+        self._longest_closed = longest
+
+    def _remove_successes(self, count):
+        # Without the newest successes, the streaks they closed run on into the current one
+        self._each_window(RollingRate.remove, count, 1)
+        for _ in range(min(count, len(self._closed))):
+            streak, self._longest_closed = self._closed.pop()
+            self.dry_streak += streak
+
+    def _demote(self, count):
+        # The newest successes become misses: the streaks around them join, plus those attempts
+        self._each_window(RollingRate.demote, count)
+        for _ in range(min(count, len(self._closed))):
+            streak, self._longest_closed = self._closed.pop()
+            self.dry_streak += streak + 1
+
+    def snapshot(self):
+        # Call with the counter's lock held; computed at most once per counter version
+        counter = self.counter
+        if self._snapshot[0] == counter.version:
+            return self._snapshot[1]
+        successes, attempts = counter.successes, counter.attempts
+        if counter.track_attempts:
+            stats = {
+                'rate': round(successes / attempts, 6) if attempts > 0 else None,
+                'windows': [window.to_dict() for window in self.windows],
+                'dryStreak': self.dry_streak,
+                'longestDryStreak': self.longest_dry_streak,
+                'confidence': CONFIDENCE,
+                'wilson': interval(wilson_interval(successes, attempts)),
+                'clopperPearson': interval(clopper_pearson_interval(successes, attempts)),
+            }
+        else:
+            # Without attempts there is nothing to take a rate of
+            stats = {'rate': None}
+        self._snapshot = (counter.version, stats)
+        return stats
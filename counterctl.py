@@ -0,0 +1,84 @@
+# Command-line client for the counter's control socket (counter_ipc), for stream decks, macros
+# and game log watchers. One connection per run; commands given together are pipelined over it.
+#
+#   python counterctl.py success+                        one op on the OBS server's counter
+#   python counterctl.py attempt+ attempt+ success+      three ops, three versions
+#   python counterctl.py batch attempt+*4 success+       five ops as one change
+#   python counterctl.py set '{"label": "Shinies:"}'
+#   python counterctl.py --counter shinies get
+#   python counterctl.py --tk undo                       the Tk overlay instead of the server
+#   tail -f game.log | grep --line-buffered "Mount dropped" | sed -u 's/.*/success+/' | python counterctl.py -
+#
+# Prints each response line ("ok <version> <successes> <attempts>", "err ..."); exits 1 if any was an error.
+import argparse
+import sys
+
+from counter_ipc import SERVER_ADDRESS, TK_ADDRESS, connect
+
+# Commands that take the rest of the command line as their arguments
+WHOLE_LINE_COMMANDS = ('batch', 'set')
+
+class CounterClient:
+    # A persistent connection; keep one around to send many commands without reconnecting
+    def __init__(self, address=SERVER_ADDRESS, counter=None, timeout=5):
+        self.sock = connect(address, timeout)
+        self.responses = self.sock.makefile('rb')
+        self.prefix = f'@{counter} ' if counter else ''
+
+    def send(self, *commands):
+        # Sends every command in one write, then reads their responses, in order
+        self.sock.sendall(''.join(f'{self.prefix}{command}\n' for command in commands).encode('utf-8'))
+        responses = []
+        for _ in commands:
+            line = self.responses.readline()
+            if not line:
+                raise ConnectionError('control socket closed the connection')
+            responses.append(line.decode('utf-8').rstrip('\n'))
+        return responses
+
+    def command(self, command):
+        return self.send(command)[0]
+
+    def close(self):
+        self.responses.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def commands_from_args(words):
+    if words and words[0] in WHOLE_LINE_COMMANDS:
+        return [' '.join(words)]
+    return words
+
+def main():
+    parser = argparse.ArgumentParser(description='Send ops to the OBS counter server or the Tk overlay')
+    parser.add_argument('--socket', help=f'control socket address (default {SERVER_ADDRESS}, or {TK_ADDRESS} with --tk)')
+    parser.add_argument('--tk', action='store_true', help="control the Tk overlay's counter instead of the server's")
+    parser.add_argument('--counter', help='named counter on the server (default: the default counter)')
+    parser.add_argument('commands', nargs='*', metavar='command',
+                        help="success+ success- attempt+ attempt- undo, batch OP[*N]..., set JSON, get, ping; "
+                             "'-' or nothing reads one command per line from stdin")
+    args = parser.parse_args()
+    address = args.socket or (TK_ADDRESS if args.tk else SERVER_ADDRESS)
+    try:
+        client = CounterClient(address, args.counter)
+    except OSError as e:
+        sys.exit(f'Cannot connect to {address}: {e}')
+    failed = False
+    with client:
+        if args.commands and args.commands != ['-']:
+            responses = client.send(*commands_from_args(args.commands))
+        else:
+            # One at a time, answered as each line arrives, over the one connection
+            responses = (client.command(line.strip()) for line in sys.stdin if line.strip())
+        for response in responses:
+            print(response, flush=True)
+            failed = failed or response.startswith('err')
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
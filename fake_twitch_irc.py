@@ -0,0 +1,168 @@
+# A local stand-in for Twitch chat's IRC server, for trying counter_chat.py offline and for
+# bench_chat.py. It accepts any login, answers PING and JOIN, and sends chat lines with Twitch's
+# tags (badges, user-id, id, ...) to every joined client.
+#
+#   python fake_twitch_irc.py --port 6667
+#   python counter_chat.py --channel test --server 127.0.0.1:6667 --no-tls
+# then type chat into the fake server, one message per line as "<user> <role> <text>":
+#   alice moderator !drop
+#   bob everyone !drop
+# or flood it: python fake_twitch_irc.py --port 6667 --flood 10000 --duration 10
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+
+ROLE_BADGES = {
+    'everyone': '',
+    'subscriber': 'subscriber/12',
+    'vip': 'vip/1',
+    'moderator': 'moderator/1',
+    'broadcaster': 'broadcaster/1',
+}
+CHATTER = ('gg', 'LUL', 'no way', 'Pog', 'what drop rate is that?', 'first', 'KEKW', 'how many runs so far')
+# Flood mix: (weight, role, text)
+FLOOD_MIX = ((90, 'everyone', None), (4, 'everyone', '!drop'), (3, 'moderator', '!attempt'),
+             (2, 'moderator', '!drop'), (1, 'moderator', '!undo'))
+# Flood lines are sent in slices this many seconds apart
+FLOOD_TICK = 0.01
+
+def escape_tag(value):
+    return value.replace('\\', '\\\\').replace(';', '\\:').replace(' ', '\\s')
+
+class FakeTwitchIrc:
+    def __init__(self, channel='test'):
+        self.channel = channel
+        self.clients = set()
+        self.joined = asyncio.Event()
+        self.server = None
+        self.handlers = set()
+        self._ids = itertools.count(1)
+
+    async def start(self, host='127.0.0.1', port=0):
+        # Returns the port listened on
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        self.handlers.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command, _, rest = line.decode('utf-8', 'replace').strip().partition(' ')
+                if command == 'CAP':
+                    writer.write(f':tmi.twitch.tv CAP * ACK {rest.partition(" ")[2]}\r\n'.encode())
+                elif command == 'NICK':
+                    writer.write(f':tmi.twitch.tv 001 {rest} :Welcome, GLHF!\r\n'.encode())
+                elif command == 'PING':
+                    writer.write(f':tmi.twitch.tv PONG tmi.twitch.tv {rest}\r\n'.encode())
+                elif command == 'JOIN':
+                    writer.write(f':justinfan!justinfan@justinfan.tmi.twitch.tv JOIN {rest}\r\n'.encode())
+                    self.clients.add(writer)
+                    self.joined.set()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(writer)
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def privmsg(self, user, role, text, message_id=None):
+        user_id = sum(map(ord, user)) * 7919 % 1000000
+        tags = {
+            'badges': ROLE_BADGES[role],
+            'display-name': user,
+            'id': message_id or f'{next(self._ids):08x}-fake',
+            'mod': '1' if role == 'moderator' else '0',
+            'subscriber': '1' if role == 'subscriber' else '0',
+            'tmi-sent-ts': str(int(time.time() * 1000)),
+            'user-id': str(user_id),
+        }
+        raw = ';'.join(f'{name}={escape_tag(value)}' for name, value in tags.items())
+        return f'@{raw} :{user}!{user}@{user}.tmi.twitch.tv PRIVMSG #{self.channel} :{text}\r\n'
+
+    async def send(self, lines):
+        data = ''.join(lines).encode('utf-8')
+        for writer in list(self.clients):
+            writer.write(data)
+        for writer in list(self.clients):
+            try:
+                await writer.drain()
+            except ConnectionError:
+                self.clients.discard(writer)
+
+    def flood_lines(self, count, users=2000, mods=5, seed=1):
+        # `count` chat lines: mostly chatter, some commands, from many viewers and a few mods
+        rng = random.Random(seed)
+        weights = [weight for weight, _, _ in FLOOD_MIX]
+        lines = []
+        for kind in rng.choices(FLOOD_MIX, weights, k=count):
+            _, role, text = kind
+            user = f'mod{rng.randrange(mods)}' if role == 'moderator' else f'viewer{rng.randrange(users)}'
+            lines.append(self.privmsg(user, role, text or rng.choice(CHATTER)))
+        return lines
+
+    async def flood(self, rate, duration, seed=1):
+        # Sends `rate` messages per second for `duration` seconds, paced in FLOOD_TICK slices;
+        # returns how many were sent
+        lines = self.flood_lines(int(rate * duration), seed=seed)
+        per_tick = max(1, int(rate * FLOOD_TICK))
+        start = time.perf_counter()
+        for i in range(0, len(lines), per_tick):
+            await self.send(lines[i:i + per_tick])
+            delay = start + (i + per_tick) / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        return len(lines)
+
+    async def close(self):
+        # Disconnects every client and waits until their handlers are done
+        for writer in list(self.clients):
+            writer.close()
+        self.server.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+async def type_chat(irc):
+    # "<user> <role> <text>" lines from stdin become chat messages
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            return
+        user, role, text = (line.strip().split(None, 2) + ['', ''])[:3]
+        if role not in ROLE_BADGES or not text:
+            print(f'Expected "<user> <{"|".join(ROLE_BADGES)}> <text>"')
+            continue
+        await irc.send([irc.privmsg(user, role, text)])
+
+async def serve(args):
+    irc = FakeTwitchIrc(args.channel)
+    port = await irc.start(args.host, args.port)
+    print(f'Fake Twitch chat for #{args.channel} on {args.host}:{port}')
+    if args.flood:
+        await irc.joined.wait()
+        sent = await irc.flood(args.flood, args.duration)
+        print(f'Sent {sent} messages')
+    else:
+        await type_chat(irc)
+    await irc.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for Twitch chat (IRC)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6667)
+    parser.add_argument('--channel', default='test')
+    parser.add_argument('--flood', type=int, default=0, metavar='RATE',
+                        help='once a client joins, send RATE random messages per second, then exit')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of --flood')
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,244 @@
 import tkinter as tk
-from tkinter import font, colorchooser
-import threading
-from pynput import keyboard as pynput_keyboard  # For global hotkeys
+from tkinter import font
+import json
+import os
+import queue
+import time
+from counter_core import FIELDS, Counter, validate_changes
+from counter_render import font_directories
+from counter_stats import DropStats
+# pynput (global hotkeys) and tkinter.colorchooser are imported where they are first used,
+# so neither is paid for at startup unless that feature is on
+
+# Counter changes are drawn at most once per frame (~60 Hz), however fast they arrive
+FRAME_INTERVAL_MS = 16
+
+# pynput key names of modifiers, folded to the names used in chords like 'ctrl+shift+f9'
+MODIFIER_KEYS = {
+    'ctrl': 'ctrl', 'ctrl_l': 'ctrl', 'ctrl_r': 'ctrl', 'control': 'ctrl',
+    'shift': 'shift', 'shift_l': 'shift', 'shift_r': 'shift',
+    'alt': 'alt', 'alt_l': 'alt', 'alt_r': 'alt', 'alt_gr': 'alt',
+    'cmd': 'cmd', 'cmd_l': 'cmd', 'cmd_r': 'cmd', 'win': 'cmd',
+}
+# Dispatch table entry for a modifier key: track it as held instead of running an op
+MODIFIER = object()
+
+def hotkey_id(key):
+    # One hashable id per key: pynput Key members by name, characters as typed
+    name = getattr(key, 'name', None)
+    if name is not None:
+        return MODIFIER_KEYS.get(name, name)
+    char = getattr(key, 'char', None)
+    if char is not None and char.isprintable():
+        return char
+    # With Ctrl held a letter arrives as a control character; fall back to its virtual key code
+    vk = getattr(key, 'vk', None)
+    if vk is not None and (0x30 <= vk <= 0x39 or 0x41 <= vk <= 0x5a or 0x61 <= vk <= 0x7a):
+        return chr(vk).lower()
+    return vk
+
+def parse_hotkey(key_str):
+    # '+', 'f9' -> (None, key): fires whatever modifiers are held, as plain keys always have
+    # 'ctrl+shift+f9', 'ctrl++' -> (frozenset({'ctrl', 'shift'}), 'f9'): only with exactly those held
+    if not key_str:
+        return None
+    if len(key_str) == 1:
+        return None, key_str
+    if key_str.endswith('++'):
+        head, key = key_str[:-2], '+'
+    else:
+        head, _, key = key_str.rpartition('+')
+    modifiers = [MODIFIER_KEYS.get(m.strip().lower()) for m in head.split('+')] if head else [None]
+    if None in modifiers or not key:
+        return None, key_str.lower()
+    return frozenset(modifiers), key if len(key) == 1 else key.strip().lower()
+
+# Per-user files: the font family cache and where the overlay was last dragged to
+APP_DIR = os.path.join(
+    os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache'), 'floating_counter')
+FONT_CACHE_PATH = os.path.join(APP_DIR, 'font_families.json')
+POSITION_PATH = os.path.join(APP_DIR, 'position.json')
+
+def write_json(path, data):
+    # Best effort and atomic: a crash mid-write leaves the old file
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+def load_position():
+    # (x, y) the overlay was last dragged to, or None
+    try:
+        with open(POSITION_PATH, encoding='utf-8') as f:
+            position = json.load(f)
+        return int(position['x']), int(position['y'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def save_position(x, y):
+    write_json(POSITION_PATH, {'x': x, 'y': y})
+
+# Font families are enumerated once per process, and cached on disk between runs
+_font_families = None
+
+def font_fingerprint():
+    # Installing or removing a font changes the mtime/entry count of its directory
+    fingerprint = [tk.TkVersion]
+    for directory in font_directories():
+        dirs = [directory]
+        try:
+            dirs += sorted(entry.path for entry in os.scandir(directory) if entry.is_dir())
+        except OSError:
+            continue
+        for path in dirs:
+            try:
+                fingerprint.append([path, os.stat(path).st_mtime_ns, len(os.listdir(path))])
+            except OSError:
+                pass
+    return fingerprint
+
+def get_font_families(root):
+    global _font_families
+    if _font_families is not None:
+        return _font_families
+    fingerprint = font_fingerprint()
+    try:
+        with open(FONT_CACHE_PATH, encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached['fingerprint'] == fingerprint:
+            _font_families = cached['families']
+            return _font_families
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    # '@' families are Windows' vertical-text variants, not useful for a counter
+    _font_families = sorted({f for f in font.families(root) if not f.startswith('@')}, key=str.lower)
+    write_json(FONT_CACHE_PATH, {'fingerprint': fingerprint, 'families': _font_families})
+    return _font_families
+
+class FontPicker(tk.Frame):
+    # Filterable font list. Only `rows` entries ever exist in the Listbox: scrolling and
+    # filtering swap which slice of the family list they show, so 1000+ fonts open instantly.
+    def __init__(self, master, variable, rows=6):
+        super().__init__(master)
+        self.variable = variable
+        self.rows = rows
+        self.families = get_font_families(master)
+        self.lowered = [f.lower() for f in self.families]
+        self.matches = self.families
+        self.offset = 0
+
+        tk.Label(self, textvariable=self.variable, fg='#555555').grid(row=0, column=0, columnspan=2)
+        self.filter_var = tk.StringVar()
+        filter_entry = tk.Entry(self, textvariable=self.filter_var)
+        filter_entry.grid(row=1, column=0, columnspan=2, sticky='ew')
+        self.listbox = tk.Listbox(self, height=rows, width=30, exportselection=False, activestyle='none')
+        self.listbox.grid(row=2, column=0, sticky='nsew')
+        self.scrollbar = tk.Scrollbar(self, orient='vertical', command=self.on_scroll)
+        self.scrollbar.grid(row=2, column=1, sticky='ns')
+
+        self.filter_var.trace_add('write', lambda *args: self.apply_filter())
+        self.listbox.bind('<<ListboxSelect>>', self.on_select)
+        self.listbox.bind('<MouseWheel>', lambda e: self.scroll_to(self.offset - e.delta // 120))
+        self.listbox.bind('<Button-4>', lambda e: self.scroll_to(self.offset - 1))
+        self.listbox.bind('<Button-5>', lambda e: self.scroll_to(self.offset + 1))
+
+        # Start scrolled to the current font
+        current = self.variable.get()
+        self.scroll_to(self.families.index(current) if current in self.families else 0)
+
+    def apply_filter(self):
+        needle = self.filter_var.get().strip().lower()
+        if needle:
+            self.matches = [f for f, low in zip(self.families, self.lowered) if needle in low]
+        else:
+            self.matches = self.families
+        self.scroll_to(0)
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * len(self.matches)))
+        else:
+            self.scroll_to(self.offset + int(amount) * (self.rows if unit == 'pages' else 1))
+
+    def scroll_to(self, offset):
+        self.offset = max(0, min(offset, len(self.matches) - self.rows))
+        visible = self.matches[self.offset:self.offset + self.rows]
+        self.listbox.delete(0, tk.END)
+        if visible:
+            self.listbox.insert(tk.END, *visible)
+        current = self.variable.get()
+        if current in visible:
+            self.listbox.selection_set(visible.index(current))
+        total = max(1, len(self.matches))
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.rows) / total))
+
+    def on_select(self, event=None):
+        selection = self.listbox.curselection()
+        if selection:
+            self.variable.set(self.listbox.get(selection[0]))
+
+def counter_property(wire):
+    # FloatingCounter attribute backed by the shared Counter's field `wire`
+    attr = FIELDS[wire]
+    return property(lambda self: getattr(self.counter, attr),
+                    lambda self, value: self.counter.update({wire: value}))
 
 class FloatingCounter:
-    def __init__(self, root, label_text, font_family, font_size, font_color, track_attempts, key_inc_success, key_inc_attempt, key_dec_success, enable_hotkeys, show_buttons):
+    # Counts and display settings live on self.counter (counter_core.Counter)
+    successes = counter_property('successes')
+    attempts = counter_property('attempts')
+    label_text = counter_property('label')
+    font_family = counter_property('fontFamily')
+    font_size = counter_property('fontSize')
+    font_color = counter_property('fontColor')
+    track_attempts = counter_property('trackAttempts')
+    show_buttons = counter_property('showButtons')
+
+    def __init__(self, root, label_text, font_family, font_size, font_color, track_attempts, key_inc_success, key_inc_attempt, key_dec_success, enable_hotkeys, show_buttons, counter=None, show_stats=False):
         self.root = root
         self.root.overrideredirect(True)  # Remove window borders
         self.root.attributes('-topmost', True)
-        self.root.attributes('-transparentcolor', 'white')  # Make white transparent
+        try:
+            self.root.attributes('-transparentcolor', 'white')  # Make white transparent
+        except tk.TclError:
+            pass  # Windows only; elsewhere (e.g. X11 under Xvfb) the background just stays white
         self.root.configure(bg='white')
-        self.successes = 0
-        self.attempts = 0
-        self.label_text = label_text
-        self.font_family = font_family
-        self.font_size = font_size
-        self.font_color = font_color
-        self.track_attempts = track_attempts
+        position = load_position()
+        if position is not None:
+            self.root.geometry('+%d+%d' % position)
+        # Pass a shared Counter (e.g. obs_counter_server.COUNTER) to drive the browser overlay too;
+        # its counts are kept, the setup choices replace its label and style
+        self._redraw_pending = False
+        settings = {'label': label_text, 'fontFamily': font_family, 'fontSize': font_size,
+                    'fontColor': font_color, 'trackAttempts': track_attempts, 'showButtons': show_buttons}
+        if counter is None:
+            counter = Counter()
+        self.counter = counter
+        self.counter.update(settings)
+        # Drop-rate stats for the optional overlay lines; subscribed first so a redraw never sees them stale
+        self.show_stats = show_stats
+        self.stats = DropStats(self.counter)
+        self.counter.subscribe(self.stats.update)
+        self.counter.subscribe(self.on_counter_change)
         self.key_inc_success = key_inc_success
         self.key_inc_attempt = key_inc_attempt
         self.key_dec_success = key_dec_success
         self.enable_hotkeys = enable_hotkeys
-        self.show_buttons = show_buttons
 
         # Main frame for label and buttons
         self.frame = tk.Frame(root, bg='white')
         self.frame.pack(padx=20, pady=20)
 
         # Counter label
+        self._shown_text = self.get_display_text()
+        self._shown_style = (self.font_family, self.font_size, self.font_color)
         self.label = tk.Label(
             self.frame,
-            text=self.get_display_text(),
+            text=self._shown_text,
             font=(self.font_family, self.font_size),
             fg=self.font_color,
             bg='white'
@@ -38,6 +246,8 @@ class FloatingCounter:
         self.label.grid(row=0, column=0, columnspan=4, pady=(0, 2))
 
         # On-screen buttons
+        self.buttons = []
+        self._buttons_key = None
         self.create_buttons()
 
         # Bind hotkeys
@@ -47,115 +257,248 @@ class FloatingCounter:
         # Drag window
         self.label.bind('<ButtonPress-1>', self.start_move)
         self.label.bind('<B1-Motion>', self.do_move)
-        self._offsetx = 0
-        self._offsety = 0
+        self.label.bind('<ButtonRelease-1>', self.stop_move)
+        # Pointer position inside the window while dragging, and where the next frame moves the window to
+        self._drag_offset = (0, 0)
+        self._move_to = None
+        self._dragged = False
 
         self.settings_window = None
 
-        # Start global hotkey listener in a thread if enabled
-        self.listener_thread = None
+        # Ops from the hotkey thread; only the Tk thread touches counts and widgets
+        self.pending_ops = queue.SimpleQueue()
+        self.root.after(FRAME_INTERVAL_MS, self.process_frame)
+
+        # Start global hotkey listener if enabled
+        self.hotkey_listener = None
+        self.hotkey_table = {}
+        self._held_modifiers = frozenset()
+        # Histograms set by enable_metrics(); None means not instrumented
+        self.repaint_latency = None
+        self.update_label_time = None
+        self._hotkey_at = None
+        self._repaint_from = None
+        # counter_ipc.ControlServer once start_control() is called
+        self.control = None
         if self.enable_hotkeys:
-            self.listener_thread = threading.Thread(target=self.listen_hotkeys, daemon=True)
-            self.listener_thread.start()
+            self.start_hotkeys()
 
     def get_display_text(self):
-        if self.track_attempts:
-            return f"{self.label_text} {self.successes}/{self.attempts}"
-        else:
-            return f"{self.label_text} {self.successes}"
+        text = self.counter.display_text()
+        if self.track_attempts and self.show_stats:
+            text += '\n' + self.get_stats_text()
+        return text
+
+    def get_stats_text(self):
+        with self.counter.lock:
+            stats = self.stats.snapshot()
+        streak = f"dry {stats['dryStreak']} (longest {stats['longestDryStreak']})"
+        if stats['rate'] is None:
+            return streak
+        low, high = stats['wilson']
+        return f"{stats['rate']:.2%} (95% CI {low:.2%}\u2013{high:.2%}) \u00b7 {streak}"
+
+    def get_buttons_key(self):
+        # Everything the on-screen buttons depend on; they are only rebuilt when this changes
+        min_font_size = 10
+        return (self.show_buttons, self.track_attempts, self.font_family, max(min_font_size, self.font_size // 3))
 
     def create_buttons(self):
         # Remove old buttons if they exist
-        for widget in self.frame.grid_slaves():
-            if int(widget.grid_info()['row']) == 1:
-                widget.destroy()
+        for button in self.buttons:
+            button.destroy()
+        self.buttons = []
+        self._buttons_key = self.get_buttons_key()
         if not self.show_buttons:
             return
         # Button font and sizing
-        min_font_size = 10
         min_width = 8
         min_ipadx = 4
         min_ipady = 2
-        btn_font_size = max(min_font_size, self.font_size // 3)
+        btn_font_size = self._buttons_key[3]
         btn_font = (self.font_family, btn_font_size)
         btn_width = max(min_width, len('Success +'))
         # Success buttons
-        tk.Button(self.frame, text='Success +', width=btn_width, font=btn_font, fg='#176117', command=self.increment_success_and_attempt if self.track_attempts else self.increment_success_only).grid(row=1, column=0, padx=2, pady=(0, 2), ipadx=min_ipadx, ipady=min_ipady)
-        tk.Button(self.frame, text='Success -', width=btn_width, font=btn_font, command=self.decrement_success_only).grid(row=1, column=1, padx=2, pady=(0, 2), ipadx=min_ipadx, ipady=min_ipady)
+        self.buttons.append(tk.Button(self.frame, text='Success +', width=btn_width, font=btn_font, fg='#176117', command=self.increment_success_and_attempt if self.track_attempts else self.increment_success_only))
+        self.buttons.append(tk.Button(self.frame, text='Success -', width=btn_width, font=btn_font, command=self.decrement_success_only))
         # Attempt buttons (if enabled)
         if self.track_attempts:
-            tk.Button(self.frame, text='Attempt +', width=btn_width, font=btn_font, fg='#a11a1a', command=self.increment_attempt_only).grid(row=1, column=2, padx=2, pady=(0, 2), ipadx=min_ipadx, ipady=min_ipady)
-            tk.Button(self.frame, text='Attempt -', width=btn_width, font=btn_font, command=self.decrement_attempt_only).grid(row=1, column=3, padx=2, pady=(0, 2), ipadx=min_ipadx, ipady=min_ipady)
-
-    def listen_hotkeys(self):
-        def get_key(key_str):
-            if not key_str:
-                return None
-            if len(key_str) == 1:
-                return pynput_keyboard.KeyCode.from_char(key_str)
-            try:
-                return getattr(pynput_keyboard.Key, key_str)
-            except AttributeError:
-                return pynput_keyboard.KeyCode.from_char(key_str)
-        inc_success_key = get_key(self.key_inc_success)
-        inc_attempt_key = get_key(self.key_inc_attempt) if self.track_attempts else None
-        dec_success_key = get_key(self.key_dec_success)
-        def on_press(key):
-            try:
-                if key == inc_success_key:
-                    if self.track_attempts:
-                        self.increment_success_and_attempt()
-                    else:
-                        self.increment_success_only()
-                elif self.track_attempts and key == inc_attempt_key:
-                    self.increment_attempt_only()
-                elif key == dec_success_key:
-                    if self.track_attempts:
-                        self.decrement_success_and_attempt()
-                    else:
-                        self.decrement_success_only()
-            except Exception as e:
-                print(f"Hotkey error: {e}")
-        with pynput_keyboard.Listener(on_press=on_press) as listener:
-            listener.join()
+            self.buttons.append(tk.Button(self.frame, text='Attempt +', width=btn_width, font=btn_font, fg='#a11a1a', command=self.increment_attempt_only))
+            self.buttons.append(tk.Button(self.frame, text='Attempt -', width=btn_width, font=btn_font, command=self.decrement_attempt_only))
+        for column, button in enumerate(self.buttons):
+            button.grid(row=1, column=column, padx=2, pady=(0, 2), ipadx=min_ipadx, ipady=min_ipady)
 
+    def compile_hotkeys(self):
+        # {key id: {modifiers or None: op}}; earlier bindings win if two share a key
+        if self.track_attempts:
+            bindings = [
+                (self.key_inc_success, self.increment_success_and_attempt),
+                (self.key_inc_attempt, self.increment_attempt_only),
+                (self.key_dec_success, self.decrement_success_and_attempt),
+            ]
+        else:
+            bindings = [
+                (self.key_inc_success, self.increment_success_only),
+                (self.key_dec_success, self.decrement_success_only),
+            ]
+        table = {name: MODIFIER for name in set(MODIFIER_KEYS.values())}
+        for key_str, op in bindings:
+            parsed = parse_hotkey(key_str)
+            if parsed is None:
+                continue
+            modifiers, key = parsed
+            # Shift turns a chord's letter upper case, so register both
+            keys = {key.lower(), key.upper()} if modifiers and len(key) == 1 else {key}
+            for k in keys:
+                if table.get(k) is not MODIFIER:
+                    table.setdefault(k, {}).setdefault(modifiers, op)
+        return table
+
+    def start_hotkeys(self):
+        # Swap in the current bindings; a running listener picks them up on its next keystroke
+        self.hotkey_table = self.compile_hotkeys()
+        if self.hotkey_listener is None or not self.hotkey_listener.is_alive():
+            try:
+                from pynput import keyboard as pynput_keyboard  # For global hotkeys
+            except ImportError as e:
+                print(f"Global hotkeys unavailable: {e}")
+                return
+            self.hotkey_listener = pynput_keyboard.Listener(on_press=self.on_hotkey_press, on_release=self.on_hotkey_release)
+            self.hotkey_listener.daemon = True
+            self.hotkey_listener.start()
+
+    def stop_hotkeys(self):
+        self.hotkey_table = {}
+        if self.hotkey_listener is not None:
+            self.hotkey_listener.stop()
+            self.hotkey_listener = None
+
+    def on_hotkey_press(self, key):
+        # Runs on the pynput thread for every keystroke system-wide, so keys we don't use cost one lookup.
+        # Matching ops are queued for the Tk thread instead of touching widgets here.
+        try:
+            key_id = hotkey_id(key)
+            entry = self.hotkey_table.get(key_id)
+            if entry is None:
+                return
+            if entry is MODIFIER:
+                self._held_modifiers = self._held_modifiers | {key_id}
+                return
+            op = entry.get(self._held_modifiers) or entry.get(None)
+            if op is not None:
+                # Earliest press not drawn yet; set before queueing so the frame applying the op sees it
+                if self.repaint_latency is not None and self._hotkey_at is None:
+                    self._hotkey_at = time.perf_counter()
+                self.pending_ops.put(op)
+        except Exception as e:
+            print(f"Hotkey error: {e}")
+
+    def on_hotkey_release(self, key):
+        key_id = hotkey_id(key)
+        if key_id in self._held_modifiers:
+            self._held_modifiers = self._held_modifiers - {key_id}
+
+    # Counting rules live in counter_core; success_inc also counts an attempt when tracking attempts
     def increment_success_and_attempt(self, event=None):
-        self.successes += 1
-        self.attempts += 1
-        self.update_label()
+        self.counter.apply('success_inc')
 
     def increment_attempt_only(self, event=None):
-        self.attempts += 1
-        self.update_label()
+        self.counter.apply('attempt_inc')
 
     def decrement_success_and_attempt(self, event=None):
-        if self.successes > 0:
-            self.successes -= 1
-        if self.attempts > 0:
-            self.attempts -= 1
-        self.update_label()
+        self.counter.apply('success_and_attempt_dec')
 
     def increment_success_only(self, event=None):
-        self.successes += 1
-        self.update_label()
+        self.counter.apply('success_inc')
 
     def decrement_success_only(self, event=None):
-        if self.successes > 0:
-            self.successes -= 1
-        self.update_label()
+        self.counter.apply('success_dec')
 
     def decrement_attempt_only(self, event=None):
-        if self.attempts > 0:
-            self.attempts -= 1
-        self.update_label()
+        self.counter.apply('attempt_dec')
+
+    def on_counter_change(self, counter, record):
+        # Counter subscriber; may run on another thread (e.g. the browser-source server), so it
+        # only flags the next frame, which redraws once no matter how many changes came in
+        self._redraw_pending = True
+
+    def request_redraw(self):
+        self._redraw_pending = True
+
+    def process_frame(self):
+        # Follow a drag, apply every op queued since the last frame, then draw at most once
+        if self._move_to is not None:
+            self.apply_move()
+        while True:
+            try:
+                op = self.pending_ops.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                op()
+            except Exception as e:
+                print(f"Hotkey error: {e}")
+        hotkey_at, self._hotkey_at = self._hotkey_at, None
+        if self._redraw_pending:
+            self._redraw_pending = False
+            if self.update_label_time is None:
+                self.update_label()
+            else:
+                start = time.perf_counter()
+                self.update_label()
+                self.update_label_time.observe(time.perf_counter() - start)
+        if hotkey_at is not None:
+            # Tk repaints from idle callbacks, and this one is queued after the label's
+            self._repaint_from = hotkey_at
+            self.root.after_idle(self.record_repaint)
+        self.root.after(FRAME_INTERVAL_MS, self.process_frame)
+
+    def enable_metrics(self, registry=None):
+        # Optional instrumentation, cheap enough to leave on: hotkey-to-repaint latency and
+        # update_label duration as counter_metrics histograms, which GET /metrics includes
+        # when the browser source is served from this process
+        from counter_metrics import FRAME_BUCKETS, REGISTRY
+        registry = registry or REGISTRY
+        self.repaint_latency = registry.histogram(
+            'obs_counter_tk_hotkey_repaint_seconds', 'Time from a global hotkey press until the overlay repainted',
+            buckets=FRAME_BUCKETS).labels()
+        self.update_label_time = registry.histogram(
+            'obs_counter_tk_update_label_seconds', 'Duration of FloatingCounter.update_label',
+            buckets=FRAME_BUCKETS).labels()
+        return self.repaint_latency, self.update_label_time
+
+    def start_control(self, address=None):
+        # Local control socket for counterctl.py and scripts (counter_ipc, imported only when used).
+        # Its ops are applied on the socket's thread, like the browser-source server's: the Counter
+        # locks, and this window redraws on the next frame.
+        from counter_ipc import TK_ADDRESS, ControlServer
+        address = address or TK_ADDRESS
+        try:
+            self.control = ControlServer(self.control_lookup, address).start()
+        except OSError as e:
+            print(f"Control socket {address} not started: {e}")
+        return self.control
+
+    def control_lookup(self, name):
+        # Only the overlay's own counter, as the default one
+        return self.counter if name in (None, 'default') else None
+
+    def record_repaint(self):
+        self.repaint_latency.observe(time.perf_counter() - self._repaint_from)
 
     def update_label(self):
-        self.label.config(
-            text=self.get_display_text(),
-            font=(self.font_family, self.font_size),
-            fg=self.font_color
-        )
-        self.create_buttons()
+        # Only reconfigure what changed: a count change is a single text update,
+        # fonts/colors and the buttons are touched only when their settings change
+        text = self.get_display_text()
+        if text != self._shown_text:
+            self.label.config(text=text)
+            self._shown_text = text
+        style = (self.font_family, self.font_size, self.font_color)
+        if style != self._shown_style:
+            self.label.config(font=(self.font_family, self.font_size), fg=self.font_color)
+            self._shown_style = style
+        if self.get_buttons_key() != self._buttons_key:
+            self.create_buttons()
 
     def toggle_settings(self, event=None):
         if self.settings_window and tk.Toplevel.winfo_exists(self.settings_window):
@@ -178,10 +521,9 @@ class FloatingCounter:
 
         # Font family
         tk.Label(self.settings_window, text='Font Family:').pack()
-        font_families = list(font.families())
         self.font_var = tk.StringVar(value=self.font_family)
-        font_menu = tk.OptionMenu(self.settings_window, self.font_var, *font_families)
-        font_menu.pack()
+        font_picker = FontPicker(self.settings_window, self.font_var)
+        font_picker.pack()
 
         # Font size
         tk.Label(self.settings_window, text='Font Size:').pack()
@@ -209,6 +551,11 @@ class FloatingCounter:
         buttons_check = tk.Checkbutton(self.settings_window, text='Show on-screen buttons', variable=self.show_buttons_var)
         buttons_check.pack(pady=5)
 
+        # Drop-rate stats checkbox
+        self.show_stats_var = tk.BooleanVar(value=self.show_stats)
+        stats_check = tk.Checkbutton(self.settings_window, text='Show drop-rate stats (with attempts)', variable=self.show_stats_var)
+        stats_check.pack(pady=5)
+
         # Hotkey fields (dynamically shown/hidden)
         self.hotkey_frame = tk.Frame(self.settings_window)
         self.hotkey_frame.pack(pady=5)
@@ -217,6 +564,7 @@ class FloatingCounter:
         # Note about Shift
         tk.Label(self.settings_window, text='If no hotkeys are selected, buttons will appear on screen to manage the counting.').pack(pady=(10, 0))
         tk.Label(self.settings_window, text='Note: +, _, and | require holding Shift').pack(pady=(0, 0))
+        tk.Label(self.settings_window, text='Chords like ctrl+shift+f9 are supported').pack(pady=(0, 0))
 
         # Apply button
         apply_btn = tk.Button(self.settings_window, text='Apply', command=self.apply_settings)
@@ -252,48 +600,74 @@ class FloatingCounter:
         self.create_hotkey_fields_settings()
 
     def choose_color(self):
+        from tkinter import colorchooser
         color = colorchooser.askcolor(initialcolor=self.font_color)[1]
         if color:
             self.font_color = color
 
     def apply_settings(self):
-        self.label_text = self.label_var.get()
-        self.font_family = self.font_var.get()
-        self.font_size = self.size_var.get()
-        self.track_attempts = self.track_attempts_var.get()
+        # One Counter update, so a shared overlay sees a single change
+        try:
+            self.counter.update({
+                'label': self.label_var.get(),
+                'fontFamily': self.font_var.get(),
+                'fontSize': self.size_var.get(),
+                'trackAttempts': self.track_attempts_var.get(),
+                'showButtons': self.show_buttons_var.get(),
+            })
+        except (ValueError, tk.TclError) as e:
+            # Keep the settings window open so the value can be fixed
+            print(f"Invalid settings: {e}")
+            return
         self.enable_hotkeys = self.enable_hotkeys_var.get()
-        self.show_buttons = self.show_buttons_var.get()
+        self.show_stats = self.show_stats_var.get()
         self.key_inc_success = self.key_inc_success_var.get()
         if self.track_attempts:
             self.key_inc_attempt = self.key_inc_attempt_var.get()
         else:
             self.key_inc_attempt = ''
         self.key_dec_success = self.key_dec_success_var.get()
-        # Rebind hotkeys if enabled
+        # Rebind hotkeys in place, keeping exactly one listener
         if self.enable_hotkeys:
-            if not self.listener_thread or not self.listener_thread.is_alive():
-                self.listener_thread = threading.Thread(target=self.listen_hotkeys, daemon=True)
-                self.listener_thread.start()
+            self.start_hotkeys()
+        else:
+            self.stop_hotkeys()
         self.update_label()
         if self.settings_window:
             self.settings_window.destroy()
             self.settings_window = None
 
     def start_move(self, event):
-        self._offsetx = event.x
-        self._offsety = event.y
+        # The one window position lookup of a drag; motion events then carry all we need
+        self._drag_offset = (event.x_root - self.root.winfo_x(), event.y_root - self.root.winfo_y())
+        self._dragged = False
 
     def do_move(self, event):
-        x = self.root.winfo_pointerx() - self._offsetx
-        y = self.root.winfo_pointery() - self._offsety
-        self.root.geometry(f'+{x}+{y}')
+        # Mice can report motion 1000+ times a second: only the latest position is kept, and
+        # process_frame moves the window there at most once per frame
+        self._move_to = (event.x_root - self._drag_offset[0], event.y_root - self._drag_offset[1])
+        self._dragged = True
+
+    def stop_move(self, event):
+        # Land exactly where the button was released, and start there next time
+        if not self._dragged:
+            return
+        self.do_move(event)
+        save_position(*self.apply_move())
+        self._dragged = False
+
+    def apply_move(self):
+        position, self._move_to = self._move_to, None
+        if position is not None:
+            self.root.geometry('+%d+%d' % position)
+        return position
 
 # Note: The white border around the text is due to Tkinter's transparency and anti-aliasing. This is a known limitation and is difficult to avoid.
 
 def launch_setup():
     setup = tk.Tk()
     setup.title('Floating Counter Setup')
-    setup.geometry('400x620')
+    setup.geometry('400x840')
     setup.attributes('-topmost', True)
 
     # Label text
@@ -304,10 +678,9 @@ def launch_setup():
 
     # Font family
     tk.Label(setup, text='Font Family:').pack(pady=(10, 0))
-    font_families = list(font.families())
     font_var = tk.StringVar(value='Arial')
-    font_menu = tk.OptionMenu(setup, font_var, *font_families)
-    font_menu.pack()
+    font_picker = FontPicker(setup, font_var)
+    font_picker.pack()
 
     # Font size
     tk.Label(setup, text='Font Size:').pack(pady=(10, 0))
@@ -319,6 +692,7 @@ def launch_setup():
     tk.Label(setup, text='Font Color:').pack(pady=(10, 0))
     color_var = tk.StringVar(value='#FF0000')
     def choose_color():
+        from tkinter import colorchooser
         color = colorchooser.askcolor(initialcolor=color_var.get())[1]
         if color:
             color_var.set(color)
@@ -340,6 +714,16 @@ def launch_setup():
     buttons_check = tk.Checkbutton(setup, text='Show on-screen buttons', variable=show_buttons_var)
     buttons_check.pack(pady=5)
 
+    # Drop-rate stats checkbox
+    show_stats_var = tk.BooleanVar(value=False)
+    stats_check = tk.Checkbutton(setup, text='Show drop-rate stats (with attempts)', variable=show_stats_var)
+    stats_check.pack(pady=5)
+
+    # Browser source checkbox
+    serve_overlay_var = tk.BooleanVar(value=False)
+    serve_check = tk.Checkbutton(setup, text='Also serve the OBS browser source (port 5000)', variable=serve_overlay_var)
+    serve_check.pack(pady=5)
+
     # Hotkey fields (dynamically shown/hidden)
     hotkey_frame = tk.Frame(setup)
     hotkey_frame.pack(pady=5)
@@ -347,6 +731,7 @@ def launch_setup():
     # Note about Shift
     tk.Label(setup, text='If no hotkeys are selected, buttons will appear on screen to manage the counting.').pack(pady=(10, 0))
     tk.Label(setup, text='Note: +, _, and | require holding Shift').pack(pady=(0, 0))
+    tk.Label(setup, text='Chords like ctrl+shift+f9 are supported').pack(pady=(0, 0))
 
     def update_hotkey_fields():
         for widget in hotkey_frame.winfo_children():
@@ -381,21 +766,44 @@ def launch_setup():
     update_hotkey_fields()
 
     def run_counter():
+        # Checked before anything starts, so a bad value leaves the setup window open to fix it
+        try:
+            settings = validate_changes({
+                'label': label_var.get(),
+                'fontFamily': font_var.get(),
+                'fontSize': size_var.get(),
+                'fontColor': color_var.get(),
+            })
+        except (ValueError, tk.TclError) as e:
+            print(f"Invalid settings: {e}")
+            return
+        counter = None
+        if serve_overlay_var.get():
+            # Same process, same Counter: hotkeys and the web control page update each other directly
+            import obs_counter_server
+            obs_counter_server.serve_in_background()
+            counter = obs_counter_server.COUNTER
         setup.destroy()
         root = tk.Tk()
         app = FloatingCounter(
             root,
-            label_var.get(),
-            font_var.get(),
-            size_var.get(),
-            color_var.get(),
+            settings['label'],
+            settings['fontFamily'],
+            settings['fontSize'],
+            settings['fontColor'],
             track_attempts_var.get(),
             key_inc_success_var.get(),
             key_inc_attempt_var.get(),
             key_dec_success_var.get(),
             enable_hotkeys_var.get(),
-            show_buttons_var.get()
+            show_buttons_var.get(),
+            counter,
+            show_stats_var.get()
         )
+        if counter is not None:
+            # Served alongside: report the overlay's own latency on /metrics too
+            app.enable_metrics()
+        app.start_control()
         root.mainloop()
 
     run_btn = tk.Button(setup, text='Run', command=run_counter)
@@ -0,0 +1,259 @@
+# Load harness for obs_counter_server: N display clients plus M controllers against one server.
+#
+# Displays follow the count the way the overlay page does (SSE stream, ?since= long-poll, or
+# the old 200 ms interval poll); controllers send POST /op/success_inc as fast as they can or at
+# --rate ops/s each. Everything runs in one asyncio client process on the same clock, so the
+# op -> display delay is measured directly: each acknowledged op's version is matched with the
+# moment a display first saw that version (or a later one).
+#
+# Usage:
+#   python loadtest_obs_server.py --displays 12 --controllers 2 --duration 10
+#   python loadtest_obs_server.py --serve dev --display-mode poll --json results.json
+#   python loadtest_obs_server.py --target 127.0.0.1:5000   # an already running server
+import argparse
+import asyncio
+import bisect
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from bench_serving import MODES, free_port, percentile, start_server, stop_server
+
+async def http_request(conn, method, path, body=b''):
+    reader, writer = conn
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length), b'connection: close' in head.lower() or head.startswith(b'HTTP/1.0')
+
+class Client:
+    # Keep-alive connection that transparently reconnects when the server closes it
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.conn = None
+
+    async def request(self, method, path, body=b''):
+        if self.conn is None:
+            self.conn = await asyncio.open_connection(self.host, self.port)
+        try:
+            status, data, close = await http_request(self.conn, method, path, body)
+        except (OSError, asyncio.IncompleteReadError):
+            self.close()
+            raise
+        if close:
+            self.close()
+        return status, data
+
+    def close(self):
+        if self.conn:
+            self.conn[1].close()
+            self.conn = None
+
+class Stats:
+    def __init__(self):
+        self.op_latencies = []
+        self.op_versions = []      # (version, send time) for every acknowledged op
+        self.display_seen = []     # per display: [(version, receive time), ...]
+        self.display_reads = 0
+        self.errors = 0
+
+async def controller(host, port, stop_at, rate, stats):
+    client = Client(host, port)
+    interval = 1 / rate if rate else 0
+    next_at = time.perf_counter()
+    while time.perf_counter() < stop_at:
+        if interval:
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        start = time.perf_counter()
+        try:
+            status, body = await client.request('POST', '/op/success_inc')
+        except (OSError, asyncio.IncompleteReadError):
+            stats.errors += 1
+            continue
+        if status != 200:
+            stats.errors += 1
+            continue
+        stats.op_latencies.append(time.perf_counter() - start)
+        stats.op_versions.append((json.loads(body)['version'], start))
+    client.close()
+
+async def sse_display(host, port, seen, stats):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    await reader.readuntil(b'\r\n\r\n')
+    try:
+        while True:
+            frame = await reader.readuntil(b'\n\n')
+            now = time.perf_counter()
+            for line in frame.split(b'\n'):
+                if line.startswith(b'id: '):
+                    seen.append((int(line[4:]), now))
+                    stats.display_reads += 1
+    finally:
+        writer.close()
+
+async def long_poll_display(host, port, seen, stats):
+    client = Client(host, port)
+    version = -1
+    try:
+        while True:
+            status, body = await client.request('GET', f'/state?since={version}')
+            stats.display_reads += 1
+            if status == 200:
+                version = json.loads(body)['version']
+                seen.append((version, time.perf_counter()))
+    finally:
+        client.close()
+
+async def interval_poll_display(host, port, seen, stats):
+    # What /display did before the event stream: GET /state every 200 ms
+    client = Client(host, port)
+    try:
+        while True:
+            status, body = await client.request('GET', '/state')
+            stats.display_reads += 1
+            if status == 200:
+                seen.append((json.loads(body)['version'], time.perf_counter()))
+            await asyncio.sleep(0.2)
+    finally:
+        client.close()
+
+DISPLAY_MODES = {'sse': sse_display, 'longpoll': long_poll_display, 'poll': interval_poll_display}
+
+async def guarded(display, host, port, seen, stats):
+    try:
+        await display(host, port, seen, stats)
+    except asyncio.CancelledError:
+        pass
+    except (OSError, asyncio.IncompleteReadError):
+        stats.errors += 1
+
+async def read_successes(host, port):
+    client = Client(host, port)
+    try:
+        status, body = await client.request('GET', '/state')
+        return json.loads(body)['successes']
+    finally:
+        client.close()
+
+async def run(args, host, port):
+    stats = Stats()
+    before = await read_successes(host, port)
+    displays = []
+    for _ in range(args.displays):
+        seen = []
+        stats.display_seen.append(seen)
+        displays.append(asyncio.create_task(guarded(DISPLAY_MODES[args.display_mode], host, port, seen, stats)))
+    await asyncio.sleep(args.warmup)
+    start = time.perf_counter()
+    await asyncio.gather(*(controller(host, port, start + args.duration, args.rate, stats)
+                           for _ in range(args.controllers)))
+    elapsed = time.perf_counter() - start
+    # Give displays a moment to catch up on the last op before counting misses
+    await asyncio.sleep(args.settle)
+    for task in displays:
+        task.cancel()
+    await asyncio.gather(*displays)
+    after = await read_successes(host, port)
+    return stats, elapsed, after - before
+
+def delivery_delays(stats):
+    # For each display, the delay from sending an op to first seeing its version or a newer one
+    delays, missed = [], 0
+    for seen in stats.display_seen:
+        versions = [version for version, _ in seen]
+        for version, sent_at in stats.op_versions:
+            i = bisect.bisect_left(versions, version)
+            if i == len(versions):
+                missed += 1
+                continue
+            delays.append(max(0.0, seen[i][1] - sent_at))
+    return delays, missed
+
+def summarize(values):
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test obs_counter_server')
+    parser.add_argument('--serve', choices=MODES, default='async', help='serving mode to start')
+    parser.add_argument('--target', help='host:port of an already running server (skips starting one)')
+    parser.add_argument('--displays', type=int, default=12)
+    parser.add_argument('--display-mode', choices=DISPLAY_MODES, default='sse')
+    parser.add_argument('--controllers', type=int, default=2)
+    parser.add_argument('--rate', type=float, default=0, help='ops/s per controller (0 = as fast as possible)')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=1)
+    parser.add_argument('--settle', type=float, default=0.5)
+    parser.add_argument('--json', help="write machine-readable results here ('-' for stdout)")
+    args = parser.parse_args()
+
+    proc = None
+    if args.target:
+        host, _, port = args.target.rpartition(':')
+        port = int(port)
+    else:
+        host, port = '127.0.0.1', free_port()
+        proc = start_server(args.serve, port)
+    try:
+        stats, elapsed, counted = asyncio.run(run(args, host, port))
+    finally:
+        if proc:
+            stop_server(proc)
+
+    acked = len(stats.op_versions)
+    delays, missed = delivery_delays(stats)
+    results = {
+        'config': {k: v for k, v in vars(args).items() if k != 'json'},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'revision': git_revision()},
+        'elapsed_s': round(elapsed, 3),
+        'ops': {'acked': acked, 'per_s': round(acked / elapsed, 1), 'latency': summarize(stats.op_latencies)},
+        'displays': {
+            'reads': stats.display_reads,
+            'reads_per_s': round(stats.display_reads / (elapsed + args.warmup + args.settle), 1),
+            'delivery_delay': summarize(delays),
+            'ops_not_seen': missed,
+        },
+        'lost_updates': acked - counted,
+        'errors': stats.errors,
+    }
+    ops, lat, delay = results['ops'], results['ops']['latency'], results['displays']['delivery_delay']
+    print(f'{args.controllers} controllers, {args.displays} {args.display_mode} displays, {elapsed:.1f}s')
+    print(f'  ops:      {ops["acked"]} acked, {ops["per_s"]:,} ops/s, '
+          f'latency p50 {lat.get("p50_ms")} / p95 {lat.get("p95_ms")} / p99 {lat.get("p99_ms")} ms')
+    print(f'  displays: {results["displays"]["reads_per_s"]:,} reads/s, op->display p50 {delay.get("p50_ms")} / '
+          f'p95 {delay.get("p95_ms")} / p99 {delay.get("p99_ms")} ms, {missed} op views missed')
+    print(f'  lost updates: {results["lost_updates"]}, errors: {stats.errors}')
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
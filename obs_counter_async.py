@@ -0,0 +1,368 @@
+# Production serving mode for the OBS counter: a single-threaded asyncio HTTP/1.1 server.
+#
+# It serves the same routes as the Flask app in obs_counter_server (/, /display, /state,
+# /op/<name>, /batch, /events, /history, /render.png|svg, each also under /c/<counter>/, /counters and /metrics) on top of the same
+# HostedCounter methods, but every connection is a coroutine instead of a thread, so thousands of
+# idle SSE streams and ?since= long-polls cost a few KB each. State changes made from any thread
+# wake that counter's waiters through obs_counter_server.CHANGE_LISTENERS.
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs, urlsplit
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+# Methods of each per-counter route; /render.<kind> and /op/<name> are matched by prefix
+ROUTE_METHODS = {
+    '/state': ('GET', 'POST', 'PATCH'), '/batch': ('POST',), '/history': ('GET',), '/events': ('GET',),
+    '/render.': ('GET',), '/op/': ('POST',),
+}
+
+REASONS = {
+    200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error', 501: 'Not Implemented',
+}
+
+class ChangeNotifier:
+    # Per-counter broadcast wakeup: a change sets that counter's Event (if anyone is waiting on it)
+    # and the next waiter installs a fresh one, so changes to one counter never wake another's waiters
+    def __init__(self, loop):
+        self._loop = loop
+        self._events = {}
+
+    def on_change(self, name, version):
+        self._loop.call_soon_threadsafe(self._fire, name)
+
+    def _fire(self, name):
+        event = self._events.pop(name, None)
+        if event is not None:
+            event.set()
+
+    async def wait(self, name, timeout):
+        event = self._events.get(name)
+        if event is None:
+            event = self._events[name] = asyncio.Event()
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+class Request:
+    def __init__(self, method, target, version, headers, body):
+        self.method = method
+        url = urlsplit(target)
+        self.path = url.path
+        self.args = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.version = version
+        self.headers = headers
+        self.body = body
+        # Status of the response sent, for /metrics
+        self.status = None
+
+    def json(self):
+        return json.loads(self.body or b'null')
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+def int_arg(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class AsyncCounterServer:
+    def __init__(self, server):
+        # `server` is the obs_counter_server module that owns the state
+        self.server = server
+        self.notifier = None
+
+    async def start(self, host, port, reuse_port=False):
+        self.notifier = ChangeNotifier(asyncio.get_running_loop())
+        self.server.CHANGE_LISTENERS.append(self.notifier.on_change)
+        return await asyncio.start_server(self.handle_connection, host, port,
+                                          limit=MAX_HEADER_BYTES, backlog=1024, reuse_port=reuse_port or None)
+
+    def stop(self):
+        if self.notifier and self.notifier.on_change in self.server.CHANGE_LISTENERS:
+            self.server.CHANGE_LISTENERS.remove(self.notifier.on_change)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                if isinstance(request, int):
+                    await self.send(writer, request, b'', keep_alive=False)
+                    break
+                started = time.perf_counter()
+                try:
+                    keep_alive = await self.dispatch(request, reader, writer)
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    print(f'Error handling {request.method} {request.path}: {e!r}')
+                    await self.send(writer, 500, b'', keep_alive=False)
+                    request.status = 500
+                    keep_alive = False
+                self.server.observe_request(request.path, request.method, request.status,
+                                            time.perf_counter() - started, 'since' in request.args)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        # Returns a Request, None on a cleanly closed connection, or an error status
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            return None if not e.partial.strip() else 400
+        except asyncio.LimitOverrunError:
+            return 400
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            return 400
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int_arg(headers.get('content-length', 0))
+        if length is None or length < 0:
+            return 400
+        if length > MAX_BODY_BYTES:
+            return 413
+        body = await reader.readexactly(length) if length else b''
+        return Request(method, target, version, headers, body)
+
+    async def send(self, writer, status, body, content_type=None, headers=(), keep_alive=True, head=False):
+        # With `head`, the headers (Content-Length included) are those of `body` but the body isn't sent
+        lines = [f'HTTP/1.1 {status} {REASONS.get(status, "")}']
+        if content_type:
+            lines.append(f'Content-Type: {content_type}')
+        lines.extend(f'{name}: {value}' for name, value in headers)
+        if status != 304:
+            lines.append(f'Content-Length: {len(body)}')
+        if not keep_alive:
+            lines.append('Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (b'' if head else body))
+        await writer.drain()
+
+    async def respond(self, writer, request, status, body, content_type=None, headers=()):
+        # send() for a parsed request: honours its keep-alive and HEAD and notes the status for /metrics
+        request.status = status
+        await self.send(writer, status, body, content_type, headers, keep_alive=request.keep_alive,
+                        head=request.method == 'HEAD')
+        return request.keep_alive
+
+    async def send_json(self, writer, request, status, obj):
+        return await self.respond(writer, request, status, json.dumps(obj).encode('utf-8'), 'application/json')
+
+    async def dispatch(self, request, reader, writer):
+        path, method = request.path, request.method
+        # HEAD is GET without the body (respond() drops it), as in Flask
+        if method == 'HEAD':
+            method = 'GET'
+        if path == '/counters':
+            if method != 'GET':
+                return await self.send_json(writer, request, 405, {'success': False})
+            body = self.server.counters_payload().encode('utf-8')
+            return await self.respond(writer, request, 200, body, 'application/json', [('Cache-Control', 'no-cache')])
+        if path == '/metrics':
+            if method != 'GET':
+                return await self.send_json(writer, request, 405, {'success': False})
+            body = self.server.REGISTRY.render().encode('utf-8')
+            return await self.respond(writer, request, 200, body, self.server.METRICS_CONTENT_TYPE, [('Cache-Control', 'no-cache')])
+        # /c/<name>/state is /state on counter <name>
+        name = self.server.DEFAULT_COUNTER
+        if path.startswith('/c/'):
+            name, _, rest = path[len('/c/'):].partition('/')
+            path = '/' + rest
+        # Match the route before looking the counter up, since that creates it
+        methods = self.route_methods(path)
+        if methods is None:
+            return await self.send_json(writer, request, 404, {'success': False, 'error': 'not found'})
+        if method not in methods:
+            return await self.send_json(writer, request, 405, {'success': False})
+        hosted = self.server.get_counter(name)
+        if hosted is None:
+            return await self.send_json(writer, request, 404, {'success': False, 'error': 'unknown counter'})
+        if path in self.server.PAGES:
+            status, body, headers = self.server.serve_page(
+                path, request.headers.get('accept-encoding'), request.headers.get('if-none-match'))
+            return await self.respond(writer, request, status, body, 'text/html; charset=utf-8', headers)
+        if path == '/state':
+            if method == 'POST':
+                return await self.post_state(hosted, request, writer)
+            if method == 'PATCH':
+                return await self.patch_state(hosted, request, writer)
+            return await self.get_state(hosted, request, writer)
+        if path.startswith('/render.'):
+            return await self.send_render(hosted, request, writer, path[len('/render.'):])
+        if path.startswith('/op/'):
+            try:
+                version, successes, attempts = hosted.apply_op(path[len('/op/'):])
+            except KeyError:
+                return await self.send_json(writer, request, 404, {'success': False, 'error': 'unknown op'})
+            return await self.send_json(writer, request, 200, {
+                'success': True, 'version': version, 'successes': successes, 'attempts': attempts})
+        if path == '/batch':
+            return await self.post_batch(hosted, request, writer)
+        if path == '/history':
+            try:
+                args = self.server.history_args(request.args)
+                # Reading thousands of buckets takes tens of ms; keep the loop serving meanwhile
+                report = await asyncio.get_running_loop().run_in_executor(None, hosted.history_report, *args)
+            except ValueError as e:
+                return await self.send_json(writer, request, 400, {'success': False, 'error': str(e)})
+            return await self.send_json(writer, request, 200, report)
+        # /events
+        if request.method == 'HEAD':
+            return await self.respond(writer, request, 200, b'', 'text/event-stream; charset=utf-8', [('Cache-Control', 'no-cache')])
+        await self.stream_events(hosted, request, reader, writer)
+        return False
+
+    def route_methods(self, path):
+        # Methods allowed on a per-counter path (after any /c/<name> prefix), or None if no route serves it
+        if path in self.server.PAGES:
+            return ('GET',)
+        if path.startswith('/render.'):
+            return ROUTE_METHODS['/render.'] if path[len('/render.'):] in self.server.RENDER_CONTENT_TYPES else None
+        if path.startswith('/op/'):
+            return ROUTE_METHODS['/op/'] if len(path) > len('/op/') and '/' not in path[len('/op/'):] else None
+        return ROUTE_METHODS.get(path)
+
+    async def post_state(self, hosted, request, writer):
+        try:
+            changes = request.json()
+        except ValueError:
+            changes = None
+        if not isinstance(changes, dict):
+            return await self.send_json(writer, request, 400, {'success': False, 'error': 'expected a JSON object'})
+        try:
+            version = hosted.apply_changes(changes)
+        except ValueError as e:
+            return await self.send_json(writer, request, 400, {'success': False, 'error': str(e)})
+        return await self.send_json(writer, request, 200, {'success': True, 'version': version})
+
+    async def patch_state(self, hosted, request, writer):
+        try:
+            changes = request.json()
+        except ValueError:
+            changes = None
+        try:
+            version, changed = hosted.patch_changes(changes)
+        except ValueError as e:
+            return await self.send_json(writer, request, 400, {'success': False, 'error': str(e)})
+        return await self.send_json(writer, request, 200, {'success': True, 'version': version, 'changed': sorted(changed)})
+
+    async def send_render(self, hosted, request, writer, kind):
+        try:
+            # The first PNG scans every installed font and drawing takes ms, so it runs off the loop
+            body, etag = await asyncio.get_running_loop().run_in_executor(None, hosted.render, kind)
+        except self.server.RenderUnavailable as e:
+            return await self.send_json(writer, request, 501, {'success': False, 'error': str(e)})
+        headers = [('ETag', etag), ('Cache-Control', 'no-cache')]
+        if self.server.etag_matches(request.headers.get('if-none-match'), {etag}):
+            return await self.respond(writer, request, 304, b'', headers=headers)
+        return await self.respond(writer, request, 200, body, self.server.RENDER_CONTENT_TYPES[kind], headers)
+
+    async def post_batch(self, hosted, request, writer):
+        try:
+            body = request.json()
+        except ValueError:
+            body = None
+        items = body.get('ops') if isinstance(body, dict) else body
+        try:
+            version, successes, attempts = hosted.apply_batch(items)
+        except ValueError as e:
+            return await self.send_json(writer, request, 400, {'success': False, 'error': str(e)})
+        return await self.send_json(writer, request, 200, {
+            'success': True, 'version': version, 'successes': successes, 'attempts': attempts})
+
+    def snapshot(self, hosted):
+        with hosted.changed:
+            return hosted.state_payload()
+
+    def event_frame(self, hosted, seen, patches):
+        with hosted.changed:
+            return hosted.event_frame(seen, patches)
+
+    async def get_state(self, hosted, request, writer):
+        server = self.server
+        # ?since=N long-polls until the version differs from N, like the Flask view
+        since = int_arg(request.args.get('since'))
+        if since is not None:
+            timeout = server.long_poll_timeout(request.args.get('timeout'))
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            server.LONG_POLLS.inc()
+            try:
+                while hosted.counter.version == since and loop.time() < deadline:
+                    await self.notifier.wait(hosted.name, deadline - loop.time())
+            finally:
+                server.LONG_POLLS.dec()
+        version, body = self.snapshot(hosted)
+        etag = f'"{version}"'
+        headers = [('ETag', etag), ('Cache-Control', 'no-cache')]
+        if version == since or server.etag_matches(request.headers.get('if-none-match'), {etag}):
+            return await self.respond(writer, request, 304, b'', headers=headers)
+        return await self.respond(writer, request, 200, body.encode('utf-8'), 'application/json', headers)
+
+    async def stream_events(self, hosted, request, reader, writer):
+        server = self.server
+        seen = int_arg(request.headers.get('last-event-id'))
+        patches = request.args.get('patch') == '1'
+        request.status = 200
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: text/event-stream; charset=utf-8\r\n'
+                     b'Cache-Control: no-cache\r\n'
+                     b'X-Accel-Buffering: no\r\n'
+                     b'Connection: close\r\n\r\n'
+                     b'retry: 1000\n\n')
+        await writer.drain()
+        server.EVENT_STREAMS.inc()
+        try:
+            while True:
+                if hosted.counter.version == seen:
+                    await self.notifier.wait(hosted.name, server.HEARTBEAT_INTERVAL)
+                # The protocol feeds EOF to the reader when the client goes away, even though we never read
+                if reader.at_eof():
+                    return
+                version, frame = self.event_frame(hosted, seen, patches)
+                if frame is None:
+                    writer.write(b': heartbeat\n\n')
+                else:
+                    seen = version
+                    writer.write(frame.encode('utf-8'))
+                await writer.drain()
+        finally:
+            server.EVENT_STREAMS.dec()
+
+async def run(server, host, port, reuse_port=False):
+    app = AsyncCounterServer(server)
+    listener = await app.start(host, port, reuse_port)
+    print(f' * Serving OBS counter (asyncio) on http://{host}:{port}')
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        app.stop()
+
+def serve(server, host='127.0.0.1', port=5000, reuse_port=False):
+    try:
+        asyncio.run(run(server, host, port, reuse_port))
+    except KeyboardInterrupt:
+        pass
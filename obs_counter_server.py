@@ -1,18 +1,387 @@
-from flask import Flask, render_template_string, request, jsonify
+import argparse
+import atexit
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+from flask import Flask, Response, abort, g, request, jsonify
+
+from counter_backends import BACKENDS, MemoryBackend, open_backend
+from counter_core import FIELDS, MAX_BATCH, OPS
+from counter_history import DEFAULT_CAPACITY, HistoryRing
+from counter_ipc import SERVER_ADDRESS as CONTROL_ADDRESS, ControlServer
+from counter_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, RateMeter
+from counter_render import CONTENT_TYPES as RENDER_CONTENT_TYPES, RenderUnavailable, render as render_frame
+from counter_stats import DropStats
+from counter_journal import FSYNC_POLICIES, CounterJournal
+
+try:
+    import brotli  # Optional: smaller pages for browsers that accept br
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 
-# Shared state (in-memory, resets when server restarts)
-COUNTER_STATE = {
-    'successes': 0,
-    'attempts': 0,
-    'trackAttempts': True,
-    'showButtons': True,
-    'label': 'Mounts Dropped:',
-    'fontFamily': 'Arial',
-    'fontSize': 48,
-    'fontColor': '#FF0000',
-}
+# Seconds between SSE comment frames so proxies and OBS don't drop idle streams
+HEARTBEAT_INTERVAL = 15
+# Longest a GET /state?since=N long-poll is held open before answering 304
+LONG_POLL_TIMEOUT = 25
+
+# Named counters, each with its own Counter (so its own lock and version), waiters and journal,
+# so a busy counter never blocks another. The unprefixed routes (/state, /display, ...) serve 'default',
+# /c/<name>/state, /c/<name>/display, ... serve the others; a counter is created on first use.
+DEFAULT_COUNTER = 'default'
+COUNTER_NAME = re.compile(r'[A-Za-z0-9_-]{1,64}')
+MAX_COUNTERS = 1000
+COUNTERS = {}
+# Only taken to create counters; lookups are plain dict reads
+_counters_lock = threading.Lock()
+# (directory, fsync, fsync_interval_ms) while persistence is enabled, see enable_persistence
+PERSISTENCE = None
+# Where counter state lives; see use_backend and counter_backends
+BACKEND = MemoryBackend()
+# Seconds between a worker's checks for changes other workers made to a shared backend
+SYNC_INTERVAL = 0.01
+# Op history rings live in this directory, one file per counter, or in anonymous memory when None
+HISTORY_DIR = None
+# Records per counter's history ring (24 bytes each) before the oldest are overwritten
+HISTORY_CAPACITY = DEFAULT_CAPACITY
+# Changes remembered per counter for patch events (GET /events?patch=1); a client further behind gets the full state
+PATCH_HISTORY = 64
+# Callables run with (counter name, new version) on every change (with that counter's lock held), e.g. the async server's wakeup
+CHANGE_LISTENERS = []
+
+def apply_record(counter, record):
+    # Replays one journal record onto a Counter
+    if 'set' in record:
+        counter.update(record['set'])
+    elif 'op' in record:
+        counter.apply(record['op'])
+    else:
+        counter.apply_batch(parse_batch(record['batch']), record)
+
+def restore_fields(counter, state):
+    # Snapshots from before fields were validated may hold values that no longer pass; keep the rest
+    try:
+        counter.update(state)
+    except ValueError:
+        for name, value in state.items():
+            try:
+                counter.update({name: value})
+            except ValueError as e:
+                print(f'Ignoring saved {e}')
+
+class HostedCounter:
+    # A Counter plus what serving it takes: a Condition for SSE/long-poll waiters, the last
+    # serialized state and, when persistence is on, its own journal
+    __slots__ = ('name', 'counter', 'changed', 'journal', 'stats', '_history', '_payload', '_fields', '_changes', '_patch',
+                 '_replaying')
+
+    def __init__(self, name, counter=None):
+        self.name = name
+        self.counter = counter if counter is not None else BACKEND.counter(name)
+        self.changed = threading.Condition(self.counter.lock)
+        self.journal = None
+        self.stats = DropStats(self.counter)
+        # HistoryRing, opened on first use so counters nobody changes cost nothing
+        self._history = None
+        # (version, JSON body), shared by every reader of this counter
+        self._payload = (None, None)
+        # Wire fields as of the latest change, and (from version, to version, changed field names)
+        # for the latest changes, from which patch events are built
+        self._fields = (self.counter.version, self.counter.to_dict())
+        self._changes = deque(maxlen=PATCH_HISTORY)
+        # (since, version, JSON body) of the latest patch, shared like _payload
+        self._patch = (None, None, None)
+        # True while open_journal replays changes that were already logged and counted before a restart
+        self._replaying = False
+        self.counter.subscribe(self.on_change)
+
+    def state_payload(self):
+        # Call with `changed` held; serializes at most once per version
+        counter = self.counter
+        if self._payload[0] != counter.version:
+            state = dict(counter.to_dict(), version=counter.version, stats=self.stats.snapshot())
+            self._payload = (counter.version, json.dumps(state))
+        return self._payload
+
+    def patch_payload(self, since):
+        # Call with `changed` held; JSON of only the fields changed after version `since`, or None
+        # when those changes are no longer remembered
+        counter = self.counter
+        version = counter.version
+        if self._patch[:2] == (since, version):
+            return self._patch[2]
+        if since is None or not self._changes or self._changes[-1][1] != version:
+            return None
+        names = set()
+        for start, end, changed in reversed(self._changes):
+            if end <= since:
+                return None
+            names.update(changed)
+            if start == since:
+                break
+        else:
+            return None
+        fields = self._fields[1]
+        patch = {name: fields[name] for name in FIELDS if name in names}
+        patch['version'] = version
+        if names & {'successes', 'attempts', 'trackAttempts'}:
+            patch['stats'] = self.stats.snapshot()
+        body = json.dumps(patch)
+        self._patch = (since, version, body)
+        return body
+
+    def event_frame(self, seen, patches=False):
+        # Call with `changed` held; (version, SSE frame) for a client at version `seen`, with no frame
+        # while it is current. With `patches`, a client one or a few changes behind gets a
+        # "patch" event carrying only the changed fields instead of the whole state.
+        version = self.counter.version
+        if version == seen:
+            return version, None
+        if patches:
+            body = self.patch_payload(seen)
+            if body is not None:
+                return version, f'id: {version}\nevent: patch\ndata: {body}\n\n'
+        version, body = self.state_payload()
+        return version, f'id: {version}\ndata: {body}\n\n'
+
+    def on_change(self, counter, record):
+        # Counter subscriber: journal the change, log what ops did to the counts, then wake this counter's waiters only
+        if self._replaying:
+            # Only the stats are rebuilt; history and metrics already have these ops, and nobody waits yet
+            self.stats.update(counter, record)
+            return
+        if self.journal is not None and self.journal.append(counter.version, record):
+            self.journal.snapshot(counter.to_dict(), counter.version)
+        # Settings edits aren't ops, and changes synced from other workers were logged by the worker that made them
+        if 'op' in record or 'batch' in record:
+            if counter.delta != (0, 0):
+                self.history().append(*counter.delta)
+            ops = 1 if 'op' in record else batch_op_count(record['batch'])
+            OPS_APPLIED.inc(ops)
+            OPS_RATE.add(ops)
+        self.stats.update(counter, record)
+        fields = counter.to_dict()
+        previous_version, previous = self._fields
+        self._changes.append((previous_version, counter.version,
+                              frozenset(name for name, value in fields.items() if previous[name] != value)))
+        self._fields = (counter.version, fields)
+        self.changed.notify_all()
+        for listener in CHANGE_LISTENERS:
+            listener(self.name, counter.version)
+
+    # Transport-neutral state changes, shared by the Flask views and obs_counter_async
+    def apply_changes(self, changes):
+        # Returns the new version; raises ValueError for unknown fields. The read-only version and
+        # stats a client may echo back from GET /state are ignored.
+        if not isinstance(changes, dict):
+            raise ValueError('expected a JSON object')
+        changes = dict(changes)
+        changes.pop('version', None)
+        changes.pop('stats', None)
+        return self.counter.update(changes)
+
+    def patch_changes(self, changes):
+        # PATCH /state: sets just the given fields. Returns (version, fields that changed); fields
+        # already at their value are dropped, and a patch that changes nothing doesn't bump the
+        # version, so displays don't repaint for it. Raises ValueError for unknown fields or bad values.
+        if not isinstance(changes, dict):
+            raise ValueError('expected a JSON object')
+        return self.counter.patch(changes)
+
+    def apply_op(self, name):
+        # Returns (version, successes, attempts); raises KeyError for an unknown op
+        counter = self.counter
+        with counter.lock:
+            version = counter.apply(name)
+            return version, counter.successes, counter.attempts
+
+    def apply_batch(self, items):
+        # Returns (version, successes, attempts); raises ValueError (before applying anything) for a bad batch
+        if not isinstance(items, list):
+            raise ValueError('expected a list of ops')
+        steps = parse_batch(items)
+        counter = self.counter
+        # One critical section and one version bump, so displays repaint once per batch
+        with counter.lock:
+            version = counter.apply_batch(steps, {'batch': items})
+            return version, counter.successes, counter.attempts
+
+    def history(self):
+        if self._history is None:
+            with self.counter.lock:
+                if self._history is None:
+                    path = None if HISTORY_DIR is None else os.path.join(HISTORY_DIR, f'{self.name}.ring')
+                    self._history = HistoryRing(path, HISTORY_CAPACITY, BACKEND.shared)
+        return self._history
+
+    def history_report(self, start=None, end=None, bucket=None):
+        # Net successes/attempts per `bucket` seconds from `start` to `end` (Unix times); by default
+        # from the oldest logged op to now, as a single bucket
+        history = self.history()
+        now = time.time_ns()
+        bounds = history.bounds()
+        start = int(start * 1e9) if start is not None else (bounds[0] if bounds else now)
+        end = int(end * 1e9) if end is not None else max(now, start)
+        bucket = int(bucket * 1e9) if bucket is not None else max(end - start, 1)
+        buckets = history.query(start, end, bucket)
+        return {
+            'from': start / 1e9,
+            'to': end / 1e9,
+            'bucket': bucket / 1e9,
+            'buckets': [{'start': s / 1e9, 'successes': successes, 'attempts': attempts}
+                        for s, successes, attempts in buckets],
+        }
+
+    def render(self, kind):
+        # (body, ETag) of the counter drawn as kind 'png' or 'svg'; raises RenderUnavailable for PNG without Pillow
+        counter = self.counter
+        with counter.lock:
+            text = counter.display_text()
+            style = (counter.font_family, counter.font_size, counter.font_color)
+        frame, hit = render_frame(kind, text, *style)
+        RENDERED_FRAMES.labels('hit' if hit else 'miss').inc()
+        return frame
+
+    def open_journal(self, directory, fsync='interval', fsync_interval_ms=50):
+        # Restores the counter from its last snapshot plus journal tail, then journals every change
+        journal = CounterJournal(directory, fsync=fsync, fsync_interval_ms=fsync_interval_ms)
+        snapshot, version, records = journal.recover()
+        counter = self.counter
+        with self.changed:
+            self._replaying = True
+            try:
+                if snapshot is not None:
+                    restore_fields(counter, snapshot)
+                for version, record in records:
+                    try:
+                        apply_record(counter, record)
+                    except ValueError as e:
+                        # Written before fields were validated
+                        print(f'Skipping journal record {version} for counter {self.name!r}: {e}')
+            finally:
+                self._replaying = False
+            counter.version = version
+            # Patch events and cached bodies start over at the restored version
+            self._fields = (version, counter.to_dict())
+            self._changes.clear()
+            self._payload = (None, None)
+            self._patch = (None, None, None)
+            self.journal = journal
+            # Fold the replayed tail into a fresh snapshot so the next start replays nothing
+            if records:
+                journal.snapshot(counter.to_dict(), counter.version)
+
+    def close_journal(self):
+        with self.changed:
+            if self.journal is None:
+                return
+            self.journal.snapshot(self.counter.to_dict(), self.counter.version)
+            self.journal.close()
+            self.journal = None
+
+def counter_directory(directory, name):
+    # The default counter keeps the data dir itself, so data from before named counters still loads
+    if name == DEFAULT_COUNTER:
+        return directory
+    return os.path.join(directory, 'counters', name)
+
+def get_counter(name):
+    # Returns the named HostedCounter, creating it on first use; None for a bad name or once MAX_COUNTERS exist
+    hosted = COUNTERS.get(name)
+    if hosted is not None or not COUNTER_NAME.fullmatch(name):
+        return hosted
+    with _counters_lock:
+        hosted = COUNTERS.get(name)
+        if hosted is None and len(COUNTERS) < MAX_COUNTERS:
+            hosted = HostedCounter(name)
+            if PERSISTENCE is not None:
+                directory, fsync, fsync_interval_ms = PERSISTENCE
+                hosted.open_journal(counter_directory(directory, name), fsync, fsync_interval_ms)
+            COUNTERS[name] = hosted
+        return hosted
+
+def use_backend(backend):
+    # Call at startup, before serving: puts every counter (and any the store already holds) on
+    # `backend`; shared backends also get a thread pulling in the other workers' changes
+    global BACKEND, COUNTER
+    with _counters_lock:
+        BACKEND = backend
+        for name in set(COUNTERS) | set(backend.names()):
+            COUNTERS[name] = HostedCounter(name)
+        COUNTER = COUNTERS[DEFAULT_COUNTER].counter
+    if backend.shared:
+        threading.Thread(target=sync_from_backend, args=(backend,), daemon=True).start()
+
+def sync_from_backend(backend):
+    # Refreshes local counters (waking their displays) whenever the store's change token moves
+    seen = None
+    while True:
+        time.sleep(SYNC_INTERVAL)
+        try:
+            token = backend.change_token()
+            if token == seen:
+                continue
+            seen = token
+            for name in backend.names():
+                hosted = get_counter(name)
+                if hosted is not None:
+                    hosted.counter.refresh()
+        except Exception as e:
+            print(f'Backend sync error: {e!r}')
+
+COUNTERS[DEFAULT_COUNTER] = HostedCounter(DEFAULT_COUNTER)
+# The default counter's state; run in-process with the Tk overlay, both can share this one Counter
+COUNTER = COUNTERS[DEFAULT_COUNTER].counter
+
+# GET /metrics (counter_metrics). Route labels fold counter and op names away, so every label set is small and fixed.
+METRIC_ROUTES = ('/', '/display', '/state', '/op', '/batch', '/events', '/history', '/counters', '/metrics',
+                 '/render.png', '/render.svg')
+METRIC_METHODS = ('GET', 'HEAD', 'POST', 'PATCH')
+REQUESTS = REGISTRY.counter('obs_counter_http_requests_total', 'HTTP requests answered', ('route', 'method', 'code'))
+REQUEST_SECONDS = REGISTRY.histogram('obs_counter_http_request_duration_seconds',
+                                     'Time to answer an HTTP request; ?since= long-polls include their wait, event streams are not timed',
+                                     ('route', 'method'))
+DISPLAY_CLIENTS = REGISTRY.gauge('obs_counter_display_clients', 'Open event streams and waiting long-polls', ('transport',))
+EVENT_STREAMS = DISPLAY_CLIENTS.labels('sse')
+LONG_POLLS = DISPLAY_CLIENTS.labels('long_poll')
+RENDERED_FRAMES = REGISTRY.counter('obs_counter_render_frames_total', 'Images requested from /render.*, by frame cache result', ('cache',))
+OPS_APPLIED = REGISTRY.counter('obs_counter_ops_total', 'Counter ops applied by this process, each op of a batch counted').labels()
+OPS_RATE = RateMeter()
+REGISTRY.callback('obs_counter_ops_per_second', 'Ops applied per second by this process over the last few seconds',
+                  lambda: [((), OPS_RATE.rate())])
+REGISTRY.callback('obs_counter_version', 'State version of each counter',
+                  lambda: [((name,), COUNTERS[name].counter.version) for name in sorted(list(COUNTERS))], ('counter',))
+
+def batch_op_count(items):
+    # Ops in a journaled /batch body (op names, {"op", "count"} and {"set"} items)
+    return sum(1 if isinstance(item, str) else item.get('count', 1) if 'op' in item else 0 for item in items)
+
+def metrics_route(path):
+    if path.startswith('/c/'):
+        path = '/' + path[len('/c/'):].partition('/')[2]
+    if path.startswith('/op/'):
+        return '/op'
+    return path if path in METRIC_ROUTES else 'other'
+
+def observe_request(path, method, status, seconds, long_poll=False):
+    route = metrics_route(path)
+    if long_poll and route == '/state':
+        route = '/state?since'
+    if method not in METRIC_METHODS:
+        method = 'other'
+    REQUESTS.labels(route, method, status).inc()
+    if route != '/events':
+        REQUEST_SECONDS.labels(route, method).observe(seconds)
 
 HTML_CONTROL = '''
 <!DOCTYPE html>
@@ -80,26 +449,77 @@ HTML_CONTROL = '''
     <div id="counter"></div>
     <div id="buttons"></div>
     <script>
+        // '' for the default counter, '/c/<name>' for a named one
+        const BASE = location.pathname.replace(/\/(display)?$/, '');
+        // Edits wait this long for more keystrokes, then go out together as one PATCH
+        const EDIT_DEBOUNCE_MS = 300;
         let state = {};
+        let polling = false;
+        let pollGeneration = 0;
+        let pendingEdits = {};
+        let editTimer = null;
+        let editInFlight = false;
+        function applyState(s) {
+            // Edits not sent yet win over the server's (older) values
+            state = { ...s, ...pendingEdits };
+            // Don't clobber the field the user is typing in with an echo of their own edit
+            const labelInput = document.getElementById('labelText');
+            if (document.activeElement !== labelInput) labelInput.value = s.label;
+            document.getElementById('fontFamily').value = s.fontFamily;
+            document.getElementById('fontSize').value = s.fontSize;
+            document.getElementById('fontColor').value = s.fontColor;
+            document.getElementById('trackAttempts').checked = s.trackAttempts;
+            document.getElementById('showButtons').checked = s.showButtons;
+            updateDisplay();
+            updateStyle();
+            renderButtons();
+        }
         function fetchState() {
-            fetch('/state').then(r => r.json()).then(s => {
-                state = s;
-                document.getElementById('labelText').value = s.label;
-                document.getElementById('fontFamily').value = s.fontFamily;
-                document.getElementById('fontSize').value = s.fontSize;
-                document.getElementById('fontColor').value = s.fontColor;
-                document.getElementById('trackAttempts').checked = s.trackAttempts;
-                document.getElementById('showButtons').checked = s.showButtons;
-                updateDisplay();
-                updateStyle();
-                renderButtons();
-            });
+            fetch(BASE + '/state').then(r => r.json()).then(applyState);
+        }
+        function longPoll(generation) {
+            if (!polling || generation !== pollGeneration) return;
+            fetch(BASE + '/state?since=' + (state.version ?? -1))
+                .then(r => r.status === 304 ? null : r.json())
+                .then(s => { if (s) applyState(s); longPoll(generation); })
+                .catch(() => setTimeout(() => longPoll(generation), 1000));
+        }
+        function startPolling() {
+            if (polling) return;
+            polling = true;
+            longPoll(++pollGeneration);
+        }
+        function stopPolling() {
+            polling = false;
         }
-        function postState() {
-            fetch('/state', {
-                method: 'POST',
+        function queueEdit(fields, delay) {
+            // Counts are only changed through /op so concurrent controllers can't overwrite each other
+            Object.assign(pendingEdits, fields);
+            clearTimeout(editTimer);
+            editTimer = setTimeout(sendEdits, delay);
+        }
+        function sendEdits() {
+            // One PATCH at a time with only the fields edited since the last one
+            if (editInFlight || !Object.keys(pendingEdits).length) return;
+            const fields = pendingEdits;
+            pendingEdits = {};
+            editInFlight = true;
+            fetch(BASE + '/state', {
+                method: 'PATCH',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(state)
+                body: JSON.stringify(fields)
+            }).catch(() => {}).finally(() => {
+                editInFlight = false;
+                if (Object.keys(pendingEdits).length) editTimer = setTimeout(sendEdits, EDIT_DEBOUNCE_MS);
+            });
+        }
+        function sendOp(name) {
+            fetch(BASE + '/op/' + name, { method: 'POST' }).then(r => r.json()).then(res => {
+                if (res.version <= state.version) return;
+                state.successes = res.successes;
+                state.attempts = res.attempts;
+                state.version = res.version;
+                updateDisplay();
             });
         }
         function updateDisplay() {
@@ -128,63 +548,56 @@ HTML_CONTROL = '''
             const btnSuccessPlus = document.createElement('button');
             btnSuccessPlus.textContent = 'Success +';
             btnSuccessPlus.className = 'btn btn-success';
-            btnSuccessPlus.onclick = () => {
-                state.successes++;
-                if (state.trackAttempts) state.attempts++;
-                postState();
-                updateDisplay();
-            };
+            btnSuccessPlus.onclick = () => sendOp('success_inc');
             btns.appendChild(btnSuccessPlus);
             // Success -
             const btnSuccessMinus = document.createElement('button');
             btnSuccessMinus.textContent = 'Success -';
             btnSuccessMinus.className = 'btn';
-            btnSuccessMinus.onclick = () => {
-                if (state.successes > 0) state.successes--;
-                postState();
-                updateDisplay();
-            };
+            btnSuccessMinus.onclick = () => sendOp('success_dec');
             btns.appendChild(btnSuccessMinus);
             if (state.trackAttempts) {
                 // Attempt +
                 const btnAttemptPlus = document.createElement('button');
                 btnAttemptPlus.textContent = 'Attempt +';
                 btnAttemptPlus.className = 'btn btn-attempt';
-                btnAttemptPlus.onclick = () => {
-                    state.attempts++;
-                    postState();
-                    updateDisplay();
-                };
+                btnAttemptPlus.onclick = () => sendOp('attempt_inc');
                 btns.appendChild(btnAttemptPlus);
                 // Attempt -
                 const btnAttemptMinus = document.createElement('button');
                 btnAttemptMinus.textContent = 'Attempt -';
                 btnAttemptMinus.className = 'btn';
-                btnAttemptMinus.onclick = () => {
-                    if (state.attempts > 0) state.attempts--;
-                    postState();
-                    updateDisplay();
-                };
+                btnAttemptMinus.onclick = () => sendOp('attempt_dec');
                 btns.appendChild(btnAttemptMinus);
             }
         }
         function toggleAttempts() {
             state.trackAttempts = document.getElementById('trackAttempts').checked;
-            postState();
+            queueEdit({ trackAttempts: state.trackAttempts }, 0);
             updateDisplay();
             renderButtons();
         }
         function toggleButtons() {
             state.showButtons = document.getElementById('showButtons').checked;
-            postState();
+            queueEdit({ showButtons: state.showButtons }, 0);
             renderButtons();
         }
-        document.getElementById('labelText').addEventListener('input', function() { state.label = this.value; postState(); updateDisplay(); });
-        document.getElementById('fontFamily').addEventListener('change', function() { state.fontFamily = this.value; postState(); updateStyle(); });
-        document.getElementById('fontSize').addEventListener('change', function() { state.fontSize = this.value; postState(); updateStyle(); });
-        document.getElementById('fontColor').addEventListener('change', function() { state.fontColor = this.value; postState(); updateStyle(); });
-        // Initial fetch
+        document.getElementById('labelText').addEventListener('input', function() { state.label = this.value; queueEdit({ label: this.value }, EDIT_DEBOUNCE_MS); updateDisplay(); });
+        document.getElementById('labelText').addEventListener('blur', sendEdits);
+        document.getElementById('fontFamily').addEventListener('change', function() { state.fontFamily = this.value; queueEdit({ fontFamily: this.value }, 0); updateStyle(); });
+        document.getElementById('fontSize').addEventListener('change', function() { state.fontSize = Number(this.value); queueEdit({ fontSize: state.fontSize }, 0); updateStyle(); });
+        document.getElementById('fontColor').addEventListener('change', function() { state.fontColor = this.value; queueEdit({ fontColor: this.value }, 0); updateStyle(); });
+        // Initial fetch, then follow pushed updates (poll only while the stream is down)
         fetchState();
+        if (window.EventSource) {
+            const source = new EventSource(BASE + '/events?patch=1');
+            source.onopen = stopPolling;
+            source.onmessage = e => applyState(JSON.parse(e.data));
+            source.addEventListener('patch', e => applyState({ ...state, ...JSON.parse(e.data) }));
+            source.onerror = startPolling;
+        } else {
+            startPolling();
+        }
     </script>
 </body>
 </html>
@@ -211,24 +624,66 @@ HTML_DISPLAY = '''
 <body>
     <div id="counter"></div>
     <script>
+        const BASE = location.pathname.replace(/\/(display)?$/, '');
+        const counter = document.getElementById('counter');
+        const TEXT_FIELDS = ['label', 'successes', 'attempts', 'trackAttempts'];
+        let state = {};
         function fetchState() {
-            return fetch('/state').then(r => r.json());
+            return fetch(BASE + '/state').then(r => r.json());
         }
-        function updateDisplay(s) {
-            const counter = document.getElementById('counter');
-            if (s.trackAttempts) {
-                counter.textContent = `${s.label} ${s.successes}/${s.attempts}`;
+        function renderText() {
+            if (state.trackAttempts) {
+                counter.textContent = `${state.label} ${state.successes}/${state.attempts}`;
             } else {
-                counter.textContent = `${s.label} ${s.successes}`;
+                counter.textContent = `${state.label} ${state.successes}`;
             }
+        }
+        function updateDisplay(s) {
+            state = s;
+            version = s.version;
+            renderText();
             counter.style.fontFamily = s.fontFamily;
             counter.style.fontSize = s.fontSize + 'px';
             counter.style.color = s.fontColor;
         }
-        // Poll for changes every 200ms
-        setInterval(() => {
-            fetchState().then(updateDisplay);
-        }, 200);
+        function applyPatch(p) {
+            // Only the changed fields: the text for counts and label, one style property per style field
+            Object.assign(state, p);
+            version = p.version;
+            if (TEXT_FIELDS.some(name => name in p)) renderText();
+            if ('fontFamily' in p) counter.style.fontFamily = p.fontFamily;
+            if ('fontSize' in p) counter.style.fontSize = p.fontSize + 'px';
+            if ('fontColor' in p) counter.style.color = p.fontColor;
+        }
+        let version = -1;
+        let polling = false;
+        let pollGeneration = 0;
+        // Fallback while the event stream is unavailable: long-poll until the version moves on
+        function longPoll(generation) {
+            if (!polling || generation !== pollGeneration) return;
+            fetch(BASE + '/state?since=' + version)
+                .then(r => r.status === 304 ? null : r.json())
+                .then(s => { if (s) updateDisplay(s); longPoll(generation); })
+                .catch(() => setTimeout(() => longPoll(generation), 1000));
+        }
+        function startPolling() {
+            if (polling) return;
+            polling = true;
+            longPoll(++pollGeneration);
+        }
+        function stopPolling() {
+            polling = false;
+        }
+        // Pushed updates; EventSource reconnects by itself and resumes with Last-Event-ID
+        if (window.EventSource) {
+            const source = new EventSource(BASE + '/events?patch=1');
+            source.onopen = stopPolling;
+            source.onmessage = e => updateDisplay(JSON.parse(e.data));
+            source.addEventListener('patch', e => applyPatch(JSON.parse(e.data)));
+            source.onerror = startPolling;
+        } else {
+            startPolling();
+        }
         // Initial render
         fetchState().then(updateDisplay);
     </script>
@@ -236,21 +691,391 @@ HTML_DISPLAY = '''
 </html>
 '''
 
-@app.route('/')
-def index():
-    return render_template_string(HTML_CONTROL)
+# The pages have no template variables, so they are encoded and compressed once at import.
+# OBS re-requests browser sources on every scene switch; revalidation then costs a 304.
+PAGE_CACHE_CONTROL = 'no-cache'
+
+def build_page(html):
+    body = html.encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()[:16]
+    variants = {'identity': body, 'gzip': gzip.compress(body, 9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    # Strong ETags are per representation, since each encoding is different bytes
+    return {encoding: (data, f'"{digest}-{encoding}"') for encoding, data in variants.items()}
+
+PAGES = {
+    '/': build_page(HTML_CONTROL),
+    '/display': build_page(HTML_DISPLAY),
+}
+
+def etag_matches(if_none_match, etags):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') in etags for tag in if_none_match.split(','))
+
+def accepted_encodings(accept_encoding):
+    accepted = set()
+    for token in (accept_encoding or '').split(','):
+        name, _, params = token.partition(';')
+        q = params.strip()
+        if q.startswith('q=') and q[2:].strip() in ('0', '0.0', '0.00', '0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+def serve_page(path, accept_encoding, if_none_match):
+    # Returns (status, body, headers) for a prebuilt page, negotiating br > gzip > identity
+    page = PAGES[path]
+    accepted = accepted_encodings(accept_encoding)
+    encoding = next((e for e in ('br', 'gzip') if e in page and e in accepted), 'identity')
+    body, etag = page[encoding]
+    headers = [('ETag', etag), ('Cache-Control', PAGE_CACHE_CONTROL), ('Vary', 'Accept-Encoding')]
+    # Any representation's tag means the client already has this version of the page
+    if etag_matches(if_none_match, {tag for _, tag in page.values()}):
+        return 304, b'', headers
+    if encoding != 'identity':
+        headers.append(('Content-Encoding', encoding))
+    return 200, body, headers
+
+def page_response(path):
+    status, body, headers = serve_page(path, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'))
+    return Response(body, status=status, headers=headers, content_type='text/html; charset=utf-8')
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    observe_request(request.path, request.method, response.status_code, time.perf_counter() - g.started, 'since' in request.args)
+    return response
+
+def counter_or_404(name):
+    hosted = get_counter(name)
+    if hosted is None:
+        abort(404)
+    return hosted
 
-@app.route('/display')
-def display():
-    return render_template_string(HTML_DISPLAY)
+@app.route('/', defaults={'name': DEFAULT_COUNTER})
+@app.route('/c/<name>/')
+def index(name):
+    counter_or_404(name)
+    return page_response('/')
 
-@app.route('/state', methods=['GET', 'POST'])
-def state():
-    global COUNTER_STATE
+@app.route('/display', defaults={'name': DEFAULT_COUNTER})
+@app.route('/c/<name>/display')
+def display(name):
+    counter_or_404(name)
+    return page_response('/display')
+
+def long_poll_timeout(value):
+    # ?timeout= seconds for a ?since= long-poll, clamped to [0, LONG_POLL_TIMEOUT]; missing, bad or
+    # non-finite values (nan would never time out) get LONG_POLL_TIMEOUT
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        return LONG_POLL_TIMEOUT
+    if not math.isfinite(timeout):
+        return LONG_POLL_TIMEOUT
+    return min(max(timeout, 0.0), LONG_POLL_TIMEOUT)
+
+@app.route('/state', methods=['GET', 'POST', 'PATCH'], defaults={'name': DEFAULT_COUNTER})
+@app.route('/c/<name>/state', methods=['GET', 'POST', 'PATCH'])
+def state(name):
+    hosted = counter_or_404(name)
+    if request.method == 'PATCH':
+        try:
+            version, changed = hosted.patch_changes(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify(success=False, error=str(e)), 400
+        return jsonify(success=True, version=version, changed=sorted(changed))
     if request.method == 'POST':
-        COUNTER_STATE.update(request.json)
-        return jsonify(success=True)
-    return jsonify(COUNTER_STATE)
+        try:
+            version = hosted.apply_changes(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify(success=False, error=str(e)), 400
+        return jsonify(success=True, version=version)
+    # ?since=N long-polls until the version differs from N (a restarted server counts as different)
+    since = request.args.get('since', type=int)
+    with hosted.changed:
+        if since is not None:
+            timeout = long_poll_timeout(request.args.get('timeout'))
+            LONG_POLLS.inc()
+            try:
+                hosted.changed.wait_for(lambda: hosted.counter.version != since, timeout)
+            finally:
+                LONG_POLLS.dec()
+        version, body = hosted.state_payload()
+    if version == since:
+        return Response(status=304, headers={'ETag': f'"{version}"', 'Cache-Control': 'no-cache'})
+    response = Response(body, mimetype='application/json')
+    response.set_etag(str(version))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/op/<op_name>', methods=['POST'], defaults={'name': DEFAULT_COUNTER})
+@app.route('/c/<name>/op/<op_name>', methods=['POST'])
+def op(name, op_name):
+    try:
+        version, successes, attempts = counter_or_404(name).apply_op(op_name)
+    except KeyError:
+        abort(404)
+    return jsonify(success=True, version=version, successes=successes, attempts=attempts)
+
+@app.route('/render.<kind>', defaults={'name': DEFAULT_COUNTER})
+@app.route('/c/<name>/render.<kind>')
+def render_image(name, kind):
+    hosted = counter_or_404(name)
+    if kind not in RENDER_CONTENT_TYPES:
+        abort(404)
+    try:
+        body, etag = hosted.render(kind)
+    except RenderUnavailable as e:
+        return jsonify(success=False, error=str(e)), 501
+    response = Response(body, content_type=RENDER_CONTENT_TYPES[kind], headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+    return response.make_conditional(request)
+
+def parse_batch(items):
+    # Turns a /batch body into Counter.apply_batch steps, or raises ValueError before anything is applied.
+    # Items are an op name, {"op": name, "count": n} or {"set": {field: value, ...}}.
+    steps = []
+    for item in items:
+        if isinstance(item, str):
+            item = {'op': item}
+        if not isinstance(item, dict):
+            raise ValueError(f'bad batch item: {item!r}')
+        if 'set' in item:
+            changes = item['set']
+            if not isinstance(changes, dict):
+                raise ValueError('"set" must be an object')
+            steps.append(changes)
+            continue
+        op = item.get('op')
+        if op not in OPS:
+            raise ValueError(f'unknown op: {op!r}')
+        count = item.get('count', 1)
+        if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= MAX_BATCH:
+            raise ValueError(f'"count" must be an integer from 1 to {MAX_BATCH}')
+        steps.extend([op] * count)
+    return steps
+
+@app.route('/batch', methods=['POST'], defaults={'name': DEFAULT_COUNTER})
+@app.route('/c/<name>/batch', methods=['POST'])
+def batch(name):
+    hosted = counter_or_404(name)
+    body = request.get_json(silent=True)
+    items = body.get('ops') if isinstance(body, dict) else body
+    try:
+        version, successes, attempts = hosted.apply_batch(items)
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    return jsonify(success=True, version=version, successes=successes, attempts=attempts)
+
+@app.route('/events', defaults={'name': DEFAULT_COUNTER})
+@app.route('/c/<name>/events')
+def events(name):
+    hosted = counter_or_404(name)
+    # EventSource sends Last-Event-ID on reconnect; skip the first frame if it is still current
+    try:
+        last_seen = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_seen = None
+    patches = request.args.get('patch') == '1'
+
+    def stream(seen):
+        EVENT_STREAMS.inc()
+        try:
+            yield 'retry: 1000\n\n'
+            while True:
+                with hosted.changed:
+                    if hosted.counter.version == seen:
+                        hosted.changed.wait(HEARTBEAT_INTERVAL)
+                    version, frame = hosted.event_frame(seen, patches)
+                if frame is None:
+                    yield ': heartbeat\n\n'
+                    continue
+                seen = version
+                yield frame
+        finally:
+            # Runs when the server closes the generator after the client went away
+            EVENT_STREAMS.dec()
+
+    return Response(stream(last_seen), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# History timestamps are int64 nanoseconds
+MAX_HISTORY_SECONDS = (2 ** 63 - 1) // 10 ** 9
+
+def history_args(args):
+    # ?from=&to=&bucket= (seconds) as floats or None; raises ValueError
+    values = []
+    for key in ('from', 'to', 'bucket'):
+        value = args.get(key)
+        if value in (None, ''):
+            values.append(None)
+            continue
+        try:
+            value = float(value)
+        except ValueError:
+            value = math.nan
+        if not (math.isfinite(value) and 0 <= value <= MAX_HISTORY_SECONDS):
+            raise ValueError(f'"{key}" must be a number of seconds from 0 to {MAX_HISTORY_SECONDS}')
+        values.append(value)
+    return values
+
+@app.route('/history', defaults={'name': DEFAULT_COUNTER})
+@app.route('/c/<name>/history')
+def history(name):
+    hosted = counter_or_404(name)
+    try:
+        report = hosted.history_report(*history_args(request.args))
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    return jsonify(report)
+
+def counters_payload():
+    # {"counters": {name: state, ...}} for every counter, stitched from each one's cached state JSON;
+    # takes one counter's lock at a time, never all of them
+    parts = []
+    for name in sorted(list(COUNTERS)):
+        hosted = COUNTERS[name]
+        with hosted.changed:
+            _, body = hosted.state_payload()
+        parts.append(f'{json.dumps(name)}: {body}')
+    return '{"counters": {' + ', '.join(parts) + '}}'
+
+@app.route('/counters')
+def counters():
+    return Response(counters_payload(), mimetype='application/json', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE, headers={'Cache-Control': 'no-cache'})
+
+def enable_persistence(directory, fsync='interval', fsync_interval_ms=50):
+    # Restores every counter found under `directory`, then journals each one's changes
+    global PERSISTENCE, HISTORY_DIR
+    with _counters_lock:
+        PERSISTENCE = (directory, fsync, fsync_interval_ms)
+        HISTORY_DIR = os.path.join(directory, 'history')
+        names = set(COUNTERS)
+        counters_dir = os.path.join(directory, 'counters')
+        if os.path.isdir(counters_dir):
+            names.update(name for name in os.listdir(counters_dir) if COUNTER_NAME.fullmatch(name))
+        for name in sorted(names):
+            hosted = COUNTERS.get(name)
+            if hosted is None:
+                hosted = COUNTERS[name] = HostedCounter(name)
+            hosted.open_journal(counter_directory(directory, name), fsync, fsync_interval_ms)
+    atexit.register(disable_persistence)
+
+def raise_fd_limit():
+    # Each persisted counter keeps its journal (and, before Python 3.13, its history map) open, so
+    # MAX_COUNTERS of them need more descriptors than the usual soft limit of 1024
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = MAX_COUNTERS * 3 + 256
+    if hard != resource.RLIM_INFINITY:
+        wanted = min(wanted, hard)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+        except (ValueError, OSError) as e:
+            print(f'Could not raise the open file limit to {wanted} ({e}); lower --max-counters if counters fail to open')
+
+def disable_persistence():
+    global PERSISTENCE
+    with _counters_lock:
+        PERSISTENCE = None
+        for hosted in COUNTERS.values():
+            hosted.close_journal()
+
+def serve_in_background(host='127.0.0.1', port=5000):
+    # Runs the asyncio server on a daemon thread, e.g. next to the Tk overlay sharing COUNTER
+    import obs_counter_async
+    thread = threading.Thread(target=obs_counter_async.serve, args=(sys.modules[__name__], host, port), daemon=True)
+    thread.start()
+    return thread
+
+def serve_control(address=CONTROL_ADDRESS):
+    # Local control socket (counter_ipc) for counterctl.py and scripts; "@name" picks a named counter
+    def lookup(name):
+        hosted = get_counter(name or DEFAULT_COUNTER)
+        return None if hosted is None else hosted.counter
+    try:
+        return ControlServer(lookup, address).start()
+    except OSError as e:
+        # e.g. another worker already has it; that one serves the shared counters for all of them
+        print(f'Control socket {address} not started: {e}')
+        return None
+
+def run_workers(count):
+    # Starts `count` copies of this server sharing one port (SO_REUSEPORT) and one shared backend
+    argv = [sys.executable, os.path.abspath(__file__)] + sys.argv[1:] + ['--workers', '1', '--reuse-port']
+    workers = [subprocess.Popen(argv) for _ in range(count)]
+    try:
+        for worker in workers:
+            worker.wait()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='OBS counter server')
+    parser.add_argument('--data-dir', default='counter_data', help='where the journal and snapshot are kept')
+    parser.add_argument('--in-memory', action='store_true', help="don't persist the counter across restarts")
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default='interval',
+                        help='force the journal to disk after every op, every --fsync-interval-ms, or only on shutdown')
+    parser.add_argument('--fsync-interval-ms', type=int, default=50)
+    parser.add_argument('--serve', choices=('async', 'dev'), default='async',
+                        help='asyncio server for live use, or the Flask/Werkzeug development server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--debug', action='store_true', help='debugger and reloader (--serve dev only)')
+    parser.add_argument('--max-counters', type=int, default=MAX_COUNTERS, help='named counters allowed in this process')
+    parser.add_argument('--backend', choices=BACKENDS, default='memory',
+                        help='keep counters in this process, in <data-dir>/counters.db (SQLite, WAL) or in shared memory')
+    parser.add_argument('--shm-name', default='obs_counter', help='shared memory segment name (--backend shm)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='server processes sharing the port (--serve async with --backend sqlite or shm)')
+    parser.add_argument('--history-size', type=int, default=DEFAULT_CAPACITY,
+                        help='ops kept per counter for GET /history (24 bytes each)')
+    parser.add_argument('--control-socket', default=CONTROL_ADDRESS,
+                        help="socket for counterctl.py (tcp:host:port on Windows); '' turns it off")
+    parser.add_argument('--reuse-port', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000) 
\ No newline at end of file
+    args = parse_args()
+    MAX_COUNTERS = args.max_counters
+    if args.workers > 1:
+        if args.backend == 'memory' or args.serve != 'async':
+            sys.exit('--workers needs --serve async and --backend sqlite or shm, so the workers share one count')
+        run_workers(args.workers)
+        sys.exit()
+    # The debug reloader serves from a child process (WERKZEUG_RUN_MAIN set); only that one owns the journal
+    reloader_parent = args.serve == 'dev' and args.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+    HISTORY_CAPACITY = args.history_size
+    raise_fd_limit()
+    if args.backend != 'memory':
+        # The store is shared by every worker; SQLite persists by itself, shared memory lasts until reboot
+        HISTORY_DIR = os.path.join(args.data_dir, 'history')
+        use_backend(open_backend(args.backend, args.data_dir, args.shm_name, args.fsync, args.max_counters))
+    elif not args.in_memory and not reloader_parent:
+        enable_persistence(args.data_dir, args.fsync, args.fsync_interval_ms)
+    if args.control_socket and not reloader_parent:
+        serve_control(args.control_socket)
+    if args.serve == 'async':
+        import obs_counter_async
+        # Hand over this module itself: as a script it is __main__, not an importable obs_counter_server
+        obs_counter_async.serve(sys.modules[__name__], args.host, args.port, reuse_port=args.reuse_port)
+    else:
+        app.run(debug=args.debug, host=args.host, port=args.port) 
\ No newline at end of file
@@ -0,0 +1,248 @@
+# Replays timestamped hotkey events into FloatingCounter without pynput or a keyboard: a feeder
+# thread calls on_hotkey_press / on_hotkey_release with stand-in keys, exactly as pynput's listener
+# thread does, while the Tk mainloop applies and draws them. Reports the final counts, the time
+# each press spends in on_hotkey_press, hotkey-to-repaint latency and update_label time (the
+# enable_metrics() measurements, kept as raw samples), at the log's own pace or as fast as possible.
+#
+# Event log: JSON lines, "t" in seconds from the start; keys are hotkey ids ('+', 'f9', 'ctrl', ...)
+#   {"t": 0.0, "press": "+"}
+#   {"t": 0.04, "release": "+"}
+#   {"t": 2.5, "set": {"showButtons": false}}     a settings change, as the web page would make it
+#
+# Usage (replaying needs a display; on a headless machine run it under Xvfb):
+#   python replay_hotkeys.py --generate 5000 --rate 20 --toggle-every 500 --save events.jsonl
+#   xvfb-run python replay_hotkeys.py events.jsonl --fast --json results.json
+#   xvfb-run python replay_hotkeys.py --generate 2000 --fast --expect 394/1600
+#   python replay_hotkeys.py --record events.jsonl     # press the hotkeys, Escape stops recording
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+from bench_serving import percentile
+from floating_counter_tkinter import FRAME_INTERVAL_MS, MODIFIER_KEYS, FloatingCounter, hotkey_id, parse_hotkey
+
+# Generated presses: (which hotkey, weight)
+GENERATED_MIX = (('attempt', 6), ('success', 3), ('undo', 1))
+# How long a generated key is held
+HOLD_SECONDS = 0.03
+
+class ReplayKey:
+    # Stands in for a pynput key: hotkey_id() reads the same attributes
+    __slots__ = ('name', 'char', 'vk')
+
+    def __init__(self, key_id):
+        self.name = self.char = self.vk = None
+        if isinstance(key_id, int):
+            self.vk = key_id
+        elif len(key_id) == 1:
+            self.char = key_id
+        else:
+            self.name = key_id
+
+class Samples(list):
+    # A histogram child that keeps every observation
+    def labels(self, *values):
+        return self
+
+    def observe(self, value):
+        self.append(value)
+
+class SampleRegistry:
+    # Hands enable_metrics() Samples instead of bucketed histograms
+    def __init__(self):
+        self.samples = {}
+
+    def histogram(self, name, description, labelnames=(), buckets=None):
+        return self.samples.setdefault(name, Samples())
+
+def load_events(path):
+    with open(path, encoding='utf-8') as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return sorted(events, key=lambda event: event['t'])
+
+def save_events(path, events):
+    with open(path, 'w', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+def chord(key_str):
+    # 'ctrl+shift+f9' -> ['ctrl', 'shift', 'f9']: the keys to press, in order
+    parsed = parse_hotkey(key_str)
+    if parsed is None:
+        return None
+    modifiers, key = parsed
+    return sorted(modifiers or ()) + [key]
+
+def generate_events(count, rate, hotkeys, toggle_every=0, seed=1):
+    # `count` presses of the configured hotkeys at `rate` a second on average (Poisson arrivals),
+    # each held for HOLD_SECONDS; every `toggle_every` presses the buttons are shown or hidden
+    rng = random.Random(seed)
+    chords = {name: chord(key_str) for name, key_str in hotkeys.items()}
+    mix = [(name, weight) for name, weight in GENERATED_MIX if chords.get(name)]
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    events = []
+    t = 0.0
+    show_buttons = True
+    for i in range(count):
+        t += rng.expovariate(rate)
+        keys = chords[rng.choices(names, weights)[0]]
+        hold = min(HOLD_SECONDS, 0.5 / rate)
+        for key in keys:
+            events.append({'t': round(t, 6), 'press': key})
+        for key in reversed(keys):
+            events.append({'t': round(t + hold, 6), 'release': key})
+        if toggle_every and (i + 1) % toggle_every == 0:
+            show_buttons = not show_buttons
+            events.append({'t': round(t + hold, 6), 'set': {'showButtons': show_buttons}})
+    return sorted(events, key=lambda event: event['t'])
+
+def feed(app, events, fast, press_times, done):
+    # Runs on its own thread, like pynput's listener
+    start = time.perf_counter()
+    for event in events:
+        if not fast:
+            delay = start + event['t'] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if 'press' in event:
+            key = ReplayKey(event['press'])
+            began = time.perf_counter()
+            app.on_hotkey_press(key)
+            press_times.append(time.perf_counter() - began)
+        elif 'release' in event:
+            app.on_hotkey_release(ReplayKey(event['release']))
+        elif 'set' in event:
+            app.counter.update(event['set'])
+    done.set()
+
+def replay(app, events, fast):
+    # Returns (seconds, on_hotkey_press times, enable_metrics samples)
+    registry = SampleRegistry()
+    app.enable_metrics(registry)
+    # The table start_hotkeys() would install, without starting a listener
+    app.hotkey_table = app.compile_hotkeys()
+    root = app.root
+    press_times = []
+    done = threading.Event()
+
+    def check_done():
+        # Stop once every event is in and the frame loop has applied and drawn the last of them
+        if done.is_set() and app.pending_ops.empty():
+            root.after(FRAME_INTERVAL_MS * 3, root.quit)
+        else:
+            root.after(FRAME_INTERVAL_MS, check_done)
+    root.update()
+    feeder = threading.Thread(target=feed, args=(app, events, fast, press_times, done), daemon=True)
+    start = time.perf_counter()
+    feeder.start()
+    root.after(FRAME_INTERVAL_MS, check_done)
+    root.mainloop()
+    elapsed = time.perf_counter() - start
+    return elapsed, press_times, registry.samples
+
+def distribution(values, scale, unit):
+    if not values:
+        return 'none'
+    values = sorted(values)
+    return (f'median {percentile(values, 50) * scale:.1f} {unit}, p99 {percentile(values, 99) * scale:.1f} {unit}, '
+            f'max {values[-1] * scale:.1f} {unit} ({len(values)})')
+
+def summary(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return {'count': len(values), 'median': percentile(values, 50), 'p99': percentile(values, 99), 'max': values[-1]}
+
+def record(path, hotkeys):
+    # Logs presses and releases of the configured hotkeys (and modifiers) until Escape; other keys are ignored
+    from pynput import keyboard
+    wanted = {key for key_str in hotkeys.values() for key in (chord(key_str) or ())} | set(MODIFIER_KEYS.values())
+    events = []
+    start = time.perf_counter()
+
+    def log(kind, key):
+        key_id = hotkey_id(key)
+        if key_id == 'esc' and kind == 'press':
+            return False
+        if key_id in wanted or (isinstance(key_id, str) and key_id.lower() in wanted):
+            events.append({'t': round(time.perf_counter() - start, 6), kind: key_id})
+    print('Recording hotkeys; press Escape to stop')
+    with keyboard.Listener(on_press=lambda key: log('press', key), on_release=lambda key: log('release', key)) as listener:
+        listener.join()
+    save_events(path, events)
+    print(f'Saved {len(events)} events to {path}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay hotkey events into FloatingCounter and time it')
+    parser.add_argument('log', nargs='?', help='event log (JSON lines) to replay')
+    parser.add_argument('--generate', type=int, metavar='PRESSES', help='replay generated presses instead of a log')
+    parser.add_argument('--rate', type=float, default=20, help='generated presses per second')
+    parser.add_argument('--toggle-every', type=int, default=0, metavar='PRESSES',
+                        help='generated: show/hide the buttons every this many presses')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', metavar='PATH', help='write the generated events here and exit')
+    parser.add_argument('--record', metavar='PATH', help='record real hotkey presses (pynput) to PATH')
+    parser.add_argument('--fast', action='store_true', help="as fast as possible instead of at the log's pace")
+    parser.add_argument('--expect', metavar='S/A', help='exit 1 unless the final count is S/A (or S)')
+    parser.add_argument('--json', metavar='PATH', help='write the results here as JSON')
+    parser.add_argument('--label', default='Mounts Dropped:')
+    parser.add_argument('--font', default='Arial')
+    parser.add_argument('--size', type=int, default=48)
+    parser.add_argument('--no-attempts', action='store_true', help="don't track attempts")
+    parser.add_argument('--no-buttons', action='store_true')
+    parser.add_argument('--key-success', default='+')
+    parser.add_argument('--key-attempt', default='|')
+    parser.add_argument('--key-undo', default='_')
+    args = parser.parse_args()
+    track_attempts = not args.no_attempts
+    hotkeys = {'success': args.key_success, 'attempt': args.key_attempt if track_attempts else '', 'undo': args.key_undo}
+    if args.record:
+        record(args.record, hotkeys)
+        return
+    if args.generate:
+        events = generate_events(args.generate, args.rate, hotkeys, args.toggle_every, args.seed)
+        if args.save:
+            save_events(args.save, events)
+            print(f'Saved {len(events)} events to {args.save}')
+            return
+    elif args.log:
+        events = load_events(args.log)
+    else:
+        parser.error('give an event log, --generate or --record')
+
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f'No display available ({e}); run under xvfb-run')
+    app = FloatingCounter(root, args.label, args.font, args.size, '#FF0000', track_attempts, hotkeys['success'],
+                          hotkeys['attempt'], hotkeys['undo'], False, not args.no_buttons)
+    elapsed, press_times, samples = replay(app, events, args.fast)
+    counter = app.counter
+    final = f'{counter.successes}/{counter.attempts}' if track_attempts else str(counter.successes)
+    repaints = samples['obs_counter_tk_hotkey_repaint_seconds']
+    updates = samples['obs_counter_tk_update_label_seconds']
+    presses = sum('press' in event for event in events)
+    print(f'replayed {len(events)} events ({presses} presses) in {elapsed:.2f} s{" (fast)" if args.fast else ""}')
+    print(f'final count: {final} ({counter.version} versions), shown as {app.label.cget("text")!r}')
+    print(f'on_hotkey_press: {distribution(press_times, 1e6, "us")}')
+    print(f'hotkey to repaint: {distribution(repaints, 1e3, "ms")}')
+    print(f'update_label: {distribution(updates, 1e6, "us")}')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'events': len(events), 'presses': presses, 'fast': args.fast, 'seconds': elapsed,
+                'successes': counter.successes, 'attempts': counter.attempts, 'versions': counter.version,
+                'onHotkeyPress': summary(press_times), 'hotkeyToRepaint': summary(repaints),
+                'updateLabel': summary(updates),
+            }, f, indent=2)
+    root.destroy()
+    if args.expect and final != args.expect:
+        sys.exit(f'expected {args.expect}, got {final}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+# The resource tracker reports problems on stderr when the process exits, so run in a child
+UNLINK = r'''
+import sys
+from counter_backends import SharedMemoryBackend
+backend = SharedMemoryBackend(sys.argv[1], slots=4)
+backend.counter('test').apply('success_inc')
+backend.close()
+backend.unlink()
+'''
+
+@pytest.mark.skipif(os.name == 'nt', reason='Windows frees the segment with its last handle')
+def test_unlink_removes_the_segment_quietly():
+    name = f'test_backends_{os.getpid()}'
+    result = subprocess.run([sys.executable, '-c', UNLINK, name], cwd=REPO, capture_output=True, text=True)
+    assert result.returncode == 0
+    assert result.stderr == ''
+    assert not os.path.exists(f'/dev/shm/{name}')
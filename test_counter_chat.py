@@ -0,0 +1,69 @@
+import asyncio
+
+from counter_chat import ChatClient, ChatCommands, CounterTarget
+from counter_core import Counter
+
+MOD = {'badges': 'moderator/1', 'user-id': '1'}
+OTHER_MOD = {'badges': 'moderator/1', 'user-id': '2'}
+
+class FlakyTarget:
+    # A CounterTarget that answers "err" while `down` is set, without applying anything
+    def __init__(self, counter):
+        self.target = CounterTarget(counter)
+        self.down = False
+
+    async def apply(self, words):
+        if self.down:
+            return 'err down'
+        return await self.target.apply(words)
+
+    async def track_attempts(self):
+        return await self.target.track_attempts()
+
+def chat(target):
+    return ChatClient('test', target, ChatCommands(dedupe_seconds=0), verbose=False)
+
+def test_undo_skips_ops_that_failed():
+    counter = Counter(successes=5, attempts=50)
+    target = FlakyTarget(counter)
+    client = chat(target)
+
+    async def run():
+        target.down = True
+        client.commands.handle(MOD, '!drop', 0)
+        await client.flush()
+        target.down = False
+        client.commands.handle(OTHER_MOD, '!undo', 1)
+        await client.flush()
+    asyncio.run(run())
+    assert (counter.successes, counter.attempts) == (5, 50)
+
+def test_failed_undo_can_be_retried():
+    counter = Counter(successes=5, attempts=50)
+    target = FlakyTarget(counter)
+    client = chat(target)
+
+    async def run():
+        client.commands.handle(MOD, '!drop', 0)
+        await client.flush()
+        target.down = True
+        client.commands.handle(OTHER_MOD, '!undo', 1)
+        await client.flush()
+        target.down = False
+        client.commands.handle(OTHER_MOD, '!undo', 2)
+        await client.flush()
+    asyncio.run(run())
+    assert (counter.successes, counter.attempts) == (5, 50)
+
+def test_undo_without_attempts_keeps_attempts():
+    counter = Counter(successes=3, attempts=10, track_attempts=False)
+    client = chat(CounterTarget(counter))
+
+    async def run():
+        client.commands.handle(MOD, '!drop', 0)
+        await client.flush()
+        assert (counter.successes, counter.attempts) == (4, 10)
+        client.commands.handle(OTHER_MOD, '!undo', 1)
+        await client.flush()
+    asyncio.run(run())
+    assert (counter.successes, counter.attempts) == (3, 10)
@@ -0,0 +1,68 @@
+import json
+import os
+
+import pytest
+
+from counter_core import Counter
+from counter_journal import CounterJournal
+
+OPS = ['success_inc', 'attempt_inc', 'success_inc']
+
+def write_ops(directory, ops):
+    # Journals `ops` as versions 1..n and returns the state they lead to
+    journal = CounterJournal(str(directory), fsync='always')
+    journal.recover()
+    counter = Counter()
+    for op in ops:
+        journal.append(counter.apply(op), {'op': op})
+    journal.close()
+    return counter
+
+def recovered(directory):
+    # (successes, attempts, version) after recovery, replaying like HostedCounter.open_journal
+    journal = CounterJournal(str(directory), fsync='always')
+    state, version, records = journal.recover()
+    journal.close()
+    counter = Counter()
+    if state is not None:
+        counter.update(state)
+    for version, record in records:
+        counter.apply(record['op'])
+    return counter.successes, counter.attempts, version
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return os.path.join(tmp_path, 'journal.log')
+
+def test_truncated_last_line(tmp_path, journal_path):
+    write_ops(tmp_path, OPS)
+    with open(journal_path, 'rb') as f:
+        data = f.read()
+    # Power loss halfway through writing the last record
+    with open(journal_path, 'wb') as f:
+        f.write(data[:-10])
+    assert recovered(tmp_path) == (1, 2, 2)
+    # The torn tail is cut off, so new records follow the last intact one
+    with open(journal_path, 'rb') as f:
+        assert f.read() == data[:data.rindex(b'\n', 0, len(data) - 1) + 1]
+
+def test_crc_mismatch_on_last_record(tmp_path, journal_path):
+    write_ops(tmp_path, OPS)
+    with open(journal_path, 'rb') as f:
+        lines = f.read().splitlines(keepends=True)
+    # Same length, one flipped digit in the payload
+    crc, _, payload = lines[-1].partition(b' ')
+    assert b'"v":3' in payload
+    lines[-1] = crc + b' ' + payload.replace(b'"v":3', b'"v":4')
+    with open(journal_path, 'wb') as f:
+        f.write(b''.join(lines))
+    assert recovered(tmp_path) == (1, 2, 2)
+
+def test_crash_between_snapshot_and_truncate(tmp_path, journal_path):
+    counter = write_ops(tmp_path, OPS)
+    # The snapshot of version 3 reached the disk but the journal still holds versions 1-3
+    with open(os.path.join(tmp_path, 'snapshot.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': counter.version, 'state': counter.to_dict()}, f)
+    assert os.path.getsize(journal_path) > 0
+    # Replaying them on top of the snapshot would count every op twice
+    assert recovered(tmp_path) == (2, 3, 3)
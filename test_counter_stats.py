@@ -0,0 +1,57 @@
+import time
+
+from counter_core import Counter
+from counter_stats import WINDOWS, DropStats
+
+def tracked(successes=0, attempts=0):
+    counter = Counter(successes=successes, attempts=attempts)
+    stats = DropStats(counter)
+    counter.subscribe(stats.update)
+    return counter, stats
+
+def timed(change):
+    start = time.perf_counter()
+    change()
+    return time.perf_counter() - start
+
+def test_batch_set_resets_instead_of_replaying_attempts():
+    counter, stats = tracked()
+    counter.apply('attempt_inc')
+    assert timed(lambda: counter.apply_batch([{'attempts': 10 ** 9}], {'batch': [{'set': {'attempts': 10 ** 9}}]})) < 0.5
+    assert stats.dry_streak == 0
+    assert all(not window.outcomes for window in stats.windows)
+
+def test_sync_resets():
+    counter, stats = tracked()
+    counter.apply('attempt_inc')
+    counter.attempts, counter.delta = 10 ** 9, (0, 10 ** 9 - 1)
+    assert timed(lambda: stats.update(counter, {'sync': 2})) < 0.5
+    assert stats.dry_streak == 0
+
+def test_huge_deltas_take_bounded_time():
+    counter, stats = tracked()
+    counter.delta = (0, 10 ** 9)
+    assert timed(lambda: stats.update(counter, {'batch': []})) < 0.5
+    assert stats.dry_streak == 10 ** 9
+    assert [len(window.outcomes) for window in stats.windows] == list(WINDOWS)
+    counter.delta = (10 ** 6, 10 ** 6)
+    assert timed(lambda: stats.update(counter, {'batch': []})) < 0.5
+    assert (stats.dry_streak, stats.longest_dry_streak) == (0, 10 ** 9)
+    assert all(window.successes == window.outcomes.maxlen for window in stats.windows)
+    counter.delta = (0, 10 ** 9)
+    stats.update(counter, {'batch': []})
+    counter.delta = (10, 10)
+    stats.update(counter, {'batch': []})
+    # Taking back those ten successes and all but one of the misses before them
+    counter.delta = (-10, -(10 ** 9 + 9))
+    assert timed(lambda: stats.update(counter, {'batch': []})) < 0.5
+    assert (stats.dry_streak, stats.longest_dry_streak) == (1, 10 ** 9)
+
+def test_small_deltas_keep_exact_streaks():
+    counter, stats = tracked()
+    counter.apply_batch(['attempt_inc'] * 5 + ['success_inc'], {'batch': [{'op': 'attempt_inc', 'count': 5}, 'success_inc']})
+    counter.apply('attempt_inc')
+    assert (stats.dry_streak, stats.longest_dry_streak) == (1, 5)
+    counter.apply('success_and_attempt_dec')
+    counter.apply('attempt_dec')
+    assert (stats.dry_streak, stats.longest_dry_streak) == (5, 5)
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+import obs_counter_async
+import obs_counter_server
+
+# Requests both servers must answer alike: (method, path)
+PARITY = [
+    ('GET', '/state'), ('HEAD', '/state'), ('PUT', '/state'),
+    ('GET', '/c/parity/state'), ('HEAD', '/c/parity/state'),
+    ('HEAD', '/'), ('HEAD', '/display'), ('HEAD', '/counters'), ('HEAD', '/metrics'),
+    ('HEAD', '/history'), ('HEAD', '/render.svg'), ('HEAD', '/events'),
+    ('GET', '/batch'), ('GET', '/op/success_inc'), ('POST', '/history'),
+    ('GET', '/c/junk/favicon.ico'), ('POST', '/c/junk/nothing'), ('GET', '/c/junk/render.gif'),
+]
+
+async def fetch_all(requests):
+    app = obs_counter_async.AsyncCounterServer(obs_counter_server)
+    listener = await app.start('127.0.0.1', 0)
+    port = listener.sockets[0].getsockname()[1]
+    responses = []
+    try:
+        for method, path in requests:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'{method} {path} HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n'.encode())
+            await writer.drain()
+            head, _, body = (await reader.read()).partition(b'\r\n\r\n')
+            writer.close()
+            status_line, *header_lines = head.decode('latin-1').split('\r\n')
+            headers = dict(line.split(': ', 1) for line in header_lines)
+            responses.append((int(status_line.split()[1]), headers, body))
+    finally:
+        listener.close()
+        app.stop()
+    return responses
+
+@pytest.fixture(scope='module')
+def async_responses():
+    return dict(zip(PARITY, asyncio.run(fetch_all(PARITY))))
+
+def test_unknown_paths_create_no_counter(async_responses):
+    assert async_responses[('GET', '/c/junk/favicon.ico')][0] == 404
+    assert 'junk' not in obs_counter_server.COUNTERS
+
+@pytest.mark.parametrize('method, path', PARITY)
+def test_async_server_matches_flask(async_responses, method, path):
+    status, headers, body = async_responses[(method, path)]
+    expected = obs_counter_server.app.test_client().open(path, method=method)
+    assert status == expected.status_code
+    if method == 'HEAD':
+        assert body == b''
+        assert headers.get('Content-Type') == expected.headers.get('Content-Type')
+
+def test_nan_timeout_long_poll_returns(monkeypatch):
+    monkeypatch.setattr(obs_counter_server, 'LONG_POLL_TIMEOUT', 0.2)
+    [(status, _, _)] = asyncio.run(asyncio.wait_for(fetch_all([('GET', '/c/polltest/state?since=0&timeout=nan')]), 5))
+    assert status == 304
@@ -0,0 +1,130 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import obs_counter_server
+from counter_core import MAX_BATCH, Counter
+from counter_ipc import execute, parse_batch_words
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter with persistence in argv[1]; exits without shutting down cleanly
+# after `ops` ops, like a crash, and prints /history and the ops metric as JSON
+CHILD = r'''
+import json, os, sys
+import obs_counter_server as server
+server.enable_persistence(sys.argv[1], fsync='always')
+client = server.app.test_client()
+for _ in range(int(sys.argv[2])):
+    client.post('/op/success_inc')
+history = client.get('/history').get_json()
+metrics = client.get('/metrics').get_data(as_text=True)
+ops = next(line for line in metrics.splitlines() if line.startswith('obs_counter_ops_total '))
+state = client.get('/state').get_json()
+print(json.dumps({'history': history['buckets'], 'ops': float(ops.split()[1]), 'state': state}))
+sys.stdout.flush()
+os._exit(0)
+'''
+
+def run_child(data_dir, ops):
+    result = subprocess.run([sys.executable, '-c', CHILD, str(data_dir), str(ops)], cwd=REPO,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def history_totals(buckets):
+    return sum(b['successes'] for b in buckets), sum(b['attempts'] for b in buckets)
+
+def test_restart_from_journal_does_not_relog_history(tmp_path):
+    first = run_child(tmp_path, 5)
+    assert history_totals(first['history']) == (5, 5)
+    assert first['ops'] == 5
+    # Restarts from the journal tail (no clean-shutdown snapshot) and applies nothing new
+    second = run_child(tmp_path, 0)
+    assert (second['state']['successes'], second['state']['attempts']) == (5, 5)
+    assert second['state']['version'] == first['state']['version']
+    assert history_totals(second['history']) == (5, 5)
+    assert second['ops'] == 0
+
+@pytest.fixture
+def hosted():
+    return obs_counter_server.HostedCounter('test', Counter())
+
+def test_replayed_changes_leave_no_patch_history(tmp_path, hosted):
+    # The ops stay in the journal tail (no close_journal snapshot), so they are replayed
+    hosted.open_journal(str(tmp_path), fsync='always')
+    hosted.apply_op('success_inc')
+    hosted.apply_op('attempt_inc')
+    restored = obs_counter_server.HostedCounter('test', Counter())
+    restored.open_journal(str(tmp_path))
+    with restored.changed:
+        assert restored.counter.version == 2
+        assert (restored.counter.successes, restored.counter.attempts) == (1, 2)
+        assert restored.patch_payload(0) is None
+    restored.close_journal()
+    hosted.journal.close()
+
+@pytest.mark.parametrize('count', [True, 0, -1, MAX_BATCH + 1, 2.0])
+def test_batch_count_out_of_range_is_rejected(count):
+    response = obs_counter_server.app.test_client().post('/c/batchtest/batch', json=[{'op': 'success_inc', 'count': count}])
+    assert response.status_code == 400
+    assert obs_counter_server.get_counter('batchtest').counter.version == 0
+
+@pytest.mark.parametrize('word', ['success+*0', f'success+*{MAX_BATCH + 1}'])
+def test_batch_word_count_out_of_range_is_rejected(word):
+    with pytest.raises(ValueError):
+        parse_batch_words([word])
+
+@pytest.mark.parametrize('body', [[1], 'label', 5, None])
+def test_post_state_rejects_non_objects(body):
+    response = obs_counter_server.app.test_client().post('/c/posttest/state', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'expected a JSON object'
+
+def test_patch_and_control_socket_set_skip_unchanged_fields(hosted):
+    assert hosted.patch_changes({'label': hosted.counter.label}) == (0, {})
+    assert execute(hosted.counter, 'set', '{"fontSize": 48}') == '0 0 0'
+    assert hosted.patch_changes({'label': 'Shinies:', 'fontSize': 48}) == (1, {'label': 'Shinies:'})
+    assert execute(hosted.counter, 'set', '{"label": "Deaths:"}') == '2 0 0'
+
+# 1000 persisted counters with history under the common soft fd limit, then the atexit snapshot
+MANY_COUNTERS = r'''
+import os, resource, sys
+import obs_counter_server as server
+soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+resource.setrlimit(resource.RLIMIT_NOFILE, (min(1024, hard), hard))
+server.raise_fd_limit()
+server.enable_persistence(sys.argv[1], fsync='shutdown')
+client = server.app.test_client()
+before = len(os.listdir('/proc/self/fd'))
+for i in range(server.MAX_COUNTERS - len(server.COUNTERS)):
+    assert client.post(f'/c/c{i}/op/success_inc').status_code == 200
+print((len(os.listdir('/proc/self/fd')) - before) / server.MAX_COUNTERS)
+server.disable_persistence()
+'''
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='counts descriptors in /proc')
+def test_max_counters_fit_the_default_fd_limit(tmp_path):
+    result = subprocess.run([sys.executable, '-c', MANY_COUNTERS, str(tmp_path)], cwd=REPO,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr[-2000:]
+    # The journal, plus the history map's own descriptor before Python 3.13
+    assert float(result.stdout.split()[-1]) <= 2
+
+@pytest.mark.parametrize('query', ['from=inf', 'to=1e300', 'bucket=nan', 'from=-1', 'to=x', 'bucket=-inf'])
+def test_history_rejects_out_of_range_times(query):
+    response = obs_counter_server.app.test_client().get(f'/c/historytest/history?{query}')
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('value, timeout', [(None, 25), ('x', 25), ('nan', 25), ('inf', 25), ('-inf', 25),
+                                            ('-3', 0), ('0.5', 0.5), ('99', 25)])
+def test_long_poll_timeout_is_finite_and_clamped(value, timeout, monkeypatch):
+    monkeypatch.setattr(obs_counter_server, 'LONG_POLL_TIMEOUT', 25)
+    assert obs_counter_server.long_poll_timeout(value) == timeout
+
+def test_nan_timeout_long_poll_returns(monkeypatch):
+    monkeypatch.setattr(obs_counter_server, 'LONG_POLL_TIMEOUT', 0.2)
+    response = obs_counter_server.app.test_client().get('/c/polltest/state?since=0&timeout=nan')
+    assert response.status_code == 304